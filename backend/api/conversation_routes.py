@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import JSONResponse, StreamingResponse
 from ..services.autogen_service import AutoGenService
-from ..services.cosmos_service import CosmosDBService
+from ..services.async_cosmos_service import AsyncCosmosDBService
+from ..services.service_registry import service_registry
 from ..models.entity import Entity
 from autogen_core import CancellationToken
 import logging
@@ -13,12 +14,12 @@ import asyncio
 router = APIRouter(prefix="/api/conversations", tags=["conversations"])
 logger = logging.getLogger(__name__)
 
-# 服务依赖
+# 服务依赖(应用级单例)
 def get_autogen_service():
-    return AutoGenService()
+    return service_registry.autogen_service
 
-def get_cosmos_service():
-    return CosmosDBService()
+async def get_cosmos_service():
+    return service_registry.async_cosmos_service
 
 # 存储活跃对话
 active_conversations = {}
@@ -31,21 +32,17 @@ async def start_conversation(
     query: str,
     background_tasks: BackgroundTasks,
     autogen_service: AutoGenService = Depends(get_autogen_service),
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """开始一个新的对话"""
     try:
         # 生成对话ID
         conversation_id = str(uuid.uuid4())
         
-        # 获取实体
-        entities = []
-        for entity_id in entity_ids:
-            entity = cosmos_service.get_entity(entity_id)
-            if entity:
-                entities.append(entity)
-            else:
-                logger.warning(f"实体 {entity_id} 不存在")
+        # 批量获取实体
+        entities, missing_ids = await cosmos_service.get_entities(entity_ids)
+        if missing_ids:
+            logger.warning(f"实体 {', '.join(missing_ids)} 不存在")
         
         if not entities:
             raise HTTPException(status_code=400, detail="未找到有效实体")
@@ -98,7 +95,7 @@ async def add_message(
     message: str,
     background_tasks: BackgroundTasks,
     autogen_service: AutoGenService = Depends(get_autogen_service),
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """向现有对话添加新消息"""
     if conversation_id not in active_conversations:
@@ -121,12 +118,8 @@ async def add_message(
         "content": message
     })
     
-    # 获取实体
-    entities = []
-    for entity_id in conversation["entity_ids"]:
-        entity = cosmos_service.get_entity(entity_id)
-        if entity:
-            entities.append(entity)
+    # 批量获取实体
+    entities, _ = await cosmos_service.get_entities(conversation["entity_ids"])
     
     # 获取历史消息
     history = [msg["content"] for msg in conversation["messages"]]
@@ -156,7 +149,7 @@ async def stream_conversation(
     conversation_id: str,
     query: str,
     autogen_service: AutoGenService = Depends(get_autogen_service),
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """流式处理对话"""
     if conversation_id not in active_conversations:
@@ -164,12 +157,8 @@ async def stream_conversation(
     
     conversation = active_conversations[conversation_id]
     
-    # 获取实体
-    entities = []
-    for entity_id in conversation["entity_ids"]:
-        entity = cosmos_service.get_entity(entity_id)
-        if entity:
-            entities.append(entity)
+    # 批量获取实体
+    entities, _ = await cosmos_service.get_entities(conversation["entity_ids"])
     
     # 获取历史消息
     history = [msg["content"] for msg in conversation["messages"]]
@@ -1,40 +1,106 @@
-from fastapi import APIRouter, HTTPException, Depends
-from ..services.cosmos_service import CosmosDBService
-from ..services.ai_search_service import AISearchService
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from ..services.async_cosmos_service import AsyncCosmosDBService
+from ..services.cosmos_service import build_select_clause
+from ..services.entity_filters import EntityFilter, FilterOperator, compile_odata_filter
+from ..services.search_backend import SearchBackend
+from ..services.service_registry import service_registry
 from ..models.entity import Entity, Relationship
+from ..config.settings import ENTITY_MAX_PAGE_SIZE, ENTITY_PAGE_SIZE
 import logging
+import json
 from typing import List, Dict, Any, Optional
 
 router = APIRouter(prefix="/api/entities", tags=["entities"])
 logger = logging.getLogger(__name__)
 
-# 服务依赖
-def get_cosmos_service():
-    return CosmosDBService()
+# 服务依赖(应用级单例)
+async def get_cosmos_service():
+    # 在事件循环中创建，异步客户端需绑定当前循环
+    return service_registry.async_cosmos_service
 
 def get_search_service():
-    return AISearchService()
+    return service_registry.search_service
+
+def build_entity_filters(
+    domain: Optional[str] = None,
+    country: Optional[str] = None,
+    position: Optional[str] = None,
+    research_field: Optional[str] = None,
+    skill: Optional[str] = None
+) -> List[EntityFilter]:
+    """将查询参数转换为实体过滤条件"""
+    filters = []
+    for field, value in (("domain", domain), ("country", country), ("position", position)):
+        if value:
+            filters.append(EntityFilter(field=field, op=FilterOperator.EQ, value=value))
+    if research_field:
+        filters.append(EntityFilter(field="researchFields", op=FilterOperator.CONTAINS, value=research_field))
+    if skill:
+        filters.append(EntityFilter(field="skills", op=FilterOperator.CONTAINS, value=skill))
+    return filters
 
 @router.get("/")
 async def list_entities(
     search_text: Optional[str] = None,
-    domain: Optional[str] = None,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service),
-    search_service: AISearchService = Depends(get_search_service)
+    filters: List[EntityFilter] = Depends(build_entity_filters),
+    page_size: Optional[int] = Query(None, ge=1, le=ENTITY_MAX_PAGE_SIZE),
+    continuation: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service),
+    search_service: SearchBackend = Depends(get_search_service)
 ):
-    """获取实体列表，支持搜索和过滤"""
+    """获取实体列表，支持搜索和过滤
+    
+    - domain/country/position: 精确匹配; research_field/skill: 列表包含
+    - page_size/continuation: 分页读取，响应中的continuation用于获取下一页
+    - fields: 逗号分隔的投影字段，如 name,domain,position
+    - stream: 以NDJSON逐条流式返回全部匹配实体，中途出错时最后一行为 {"error": ...}
+    """
     try:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        
         if search_text:
-            # 使用AI Search搜索
-            filter_condition = f"domain eq '{domain}'" if domain else None
+            # 使用搜索后端(AI Search或本地索引)搜索
+            filter_condition = compile_odata_filter(filters)
             entities = search_service.search_entities(search_text, filter_condition)
-        else:
-            # 直接从Cosmos DB获取
-            query_filter = f"c.domain = '{domain}'" if domain else None
-            entity_models = cosmos_service.list_entities(query_filter)
-            entities = [entity.dict() for entity in entity_models]
+            return {"entities": entities, "count": len(entities)}
+        
+        # 直接从Cosmos DB获取，过滤条件以参数化查询下推到服务端
+        if stream:
+            # 在开始流式响应前校验字段，避免响应头发出后才报错
+            if field_list:
+                build_select_clause(field_list)
+            
+            async def ndjson_generator():
+                try:
+                    async for item in cosmos_service.iter_entities(
+                        filters, field_list, page_size or ENTITY_PAGE_SIZE
+                    ):
+                        yield json.dumps(item, ensure_ascii=False) + "\n"
+                except Exception as e:
+                    # 响应头已发出，无法再改状态码；以最后一行错误对象告知客户端结果不完整
+                    logger.error(f"流式列出实体失败: {str(e)}")
+                    yield json.dumps({"error": f"获取实体列表失败: {str(e)}"}, ensure_ascii=False) + "\n"
+            
+            return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
         
+        if page_size or continuation or field_list:
+            page = await cosmos_service.list_entities_page(
+                filters, page_size or ENTITY_PAGE_SIZE, continuation, field_list
+            )
+            return {
+                "entities": page["items"],
+                "count": len(page["items"]),
+                "continuation": page["continuation"]
+            }
+        
+        entity_models = await cosmos_service.list_entities(filters)
+        entities = [entity.dict() for entity in entity_models]
         return {"entities": entities, "count": len(entities)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"列出实体失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取实体列表失败: {str(e)}")
@@ -42,15 +108,20 @@ async def list_entities(
 @router.get("/{entity_id}")
 async def get_entity(
     entity_id: str,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """获取单个实体的详细信息"""
     try:
-        entity = cosmos_service.get_entity(entity_id)
+        entity = await cosmos_service.get_entity(entity_id)
         if not entity:
             raise HTTPException(status_code=404, detail=f"实体 {entity_id} 不存在")
         
-        return entity.dict()
+        # 关系存放在关系容器中，合并出边以保持响应结构不变(未迁移的实体保留内嵌关系)
+        entity_dict = entity.dict()
+        edges = await cosmos_service.get_relationship_edges(entity_id)
+        if edges:
+            entity_dict["relationships"] = [edge.to_relationship().dict() for edge in edges]
+        return entity_dict
     except HTTPException:
         raise
     except Exception as e:
@@ -60,11 +131,11 @@ async def get_entity(
 @router.post("/")
 async def create_entity(
     entity: Entity,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """创建新实体"""
     try:
-        result = cosmos_service.create_entity(entity)
+        result = await cosmos_service.create_entity(entity)
         return {"id": result["id"], "message": "实体创建成功"}
     except Exception as e:
         logger.error(f"创建实体失败: {str(e)}")
@@ -74,11 +145,11 @@ async def create_entity(
 async def update_entity(
     entity_id: str,
     entity_data: Dict[str, Any],
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """更新实体信息"""
     try:
-        result = cosmos_service.update_entity(entity_id, entity_data)
+        result = await cosmos_service.update_entity(entity_id, entity_data)
         return {"id": result["id"], "message": "实体更新成功"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -89,11 +160,11 @@ async def update_entity(
 @router.delete("/{entity_id}")
 async def delete_entity(
     entity_id: str,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """删除实体"""
     try:
-        cosmos_service.delete_entity(entity_id)
+        await cosmos_service.delete_entity(entity_id)
         return {"message": f"实体 {entity_id} 删除成功"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -101,15 +172,31 @@ async def delete_entity(
         logger.error(f"删除实体失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"删除实体失败: {str(e)}")
 
+@router.get("/{entity_id}/duplicates")
+async def get_entity_duplicates(entity_id: str):
+    """获取导入时实体消解记录的疑似重复实体(得分介于关联阈值和合并阈值之间)"""
+    try:
+        return {"entity_id": entity_id, "duplicates": service_registry.entity_index.links(entity_id)}
+    except Exception as e:
+        logger.error(f"获取疑似重复实体失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取疑似重复实体失败: {str(e)}")
+
 @router.get("/{entity_id}/relationships")
 async def get_entity_relationships(
     entity_id: str,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    direction: str = Query("out", pattern="^(out|in|both)$"),
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
-    """获取实体的关系列表"""
+    """获取实体的关系列表，direction为out(出边)、in(入边)或both"""
     try:
-        relationships = cosmos_service.get_relationships(entity_id)
-        return {"entity_id": entity_id, "relationships": [r.dict() for r in relationships]}
+        result = {"entity_id": entity_id}
+        if direction in ("out", "both"):
+            relationships = await cosmos_service.get_relationships(entity_id)
+            result["relationships"] = [r.dict() for r in relationships]
+        if direction in ("in", "both"):
+            incoming = await cosmos_service.get_incoming_relationship_edges(entity_id)
+            result["incoming_relationships"] = [edge.dict() for edge in incoming]
+        return result
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -120,11 +207,11 @@ async def get_entity_relationships(
 async def add_entity_relationship(
     entity_id: str,
     relationship: Relationship,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service)
 ):
     """添加实体关系"""
     try:
-        result = cosmos_service.add_relationship(entity_id, relationship)
+        result = await cosmos_service.add_relationship(entity_id, relationship)
         return {"entity_id": entity_id, "message": "关系添加成功"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
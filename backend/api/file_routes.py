@@ -1,8 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
 from ..services.file_processor import FileProcessor
-from ..services.cosmos_service import CosmosDBService
-from ..services.openai_service import OpenAIService
+from ..services.async_cosmos_service import AsyncCosmosDBService
+from ..services.content_index import ContentHashIndex
+from ..services.job_store import JobStore
+from ..services.ingestion_pipeline import staging_path
+from ..config.settings import LLM_EXTRACTION_MODE, LLM_TIERED_EXTRACTION
+from ..services.service_registry import service_registry
 from ..models.entity import Entity, Relationship
 import logging
 from typing import List, Dict, Any, Optional
@@ -13,28 +17,32 @@ import os
 router = APIRouter(prefix="/api/files", tags=["files"])
 logger = logging.getLogger(__name__)
 
-# 服务依赖
+# 服务依赖(应用级单例)
 def get_file_processor():
-    return FileProcessor()
+    return service_registry.file_processor
 
-def get_cosmos_service():
-    return CosmosDBService()
+async def get_cosmos_service():
+    return service_registry.async_cosmos_service
 
-def get_openai_service():
-    return OpenAIService()
+def get_content_index():
+    return service_registry.content_index
 
-# 处理状态跟踪
-processing_jobs = {}
+def get_job_store():
+    return service_registry.job_store
 
 @router.post("/upload")
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    force: bool = Query(False, description="忽略内容去重，强制重新处理"),
+    use_cache: bool = Query(True, description="是否使用模型响应缓存"),
+    extraction_mode: str = Query(LLM_EXTRACTION_MODE, pattern="^(two_pass|single_pass)$",
+                                 description="文档提取模式: two_pass 或 single_pass"),
+    tiered: bool = Query(LLM_TIERED_EXTRACTION, description="是否先用GPT-4o-mini筛选不含人物的文本"),
     file_processor: FileProcessor = Depends(get_file_processor),
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service),
-    openai_service: OpenAIService = Depends(get_openai_service)
+    job_store: JobStore = Depends(get_job_store),
+    content_index: ContentHashIndex = Depends(get_content_index)
 ):
-    """上传文件并处理"""
+    """上传文件并创建处理任务，由工作进程(backend.worker)领取处理"""
     try:
         # 生成唯一job_id
         job_id = str(uuid.uuid4())
@@ -42,25 +50,49 @@ async def upload_file(
         # 创建文件名
         file_name = f"{job_id}_{file.filename}"
         
-        # 初始化处理状态
-        processing_jobs[job_id] = {
-            "status": "processing",
+        # 上传内容写入暂存目录，同时计算内容哈希
+        path = staging_path(job_id, file.filename)
+        content_hash = await file_processor.save_to_disk(file, path)
+        
+        # 相同内容之前处理过时直接复用结果
+        previous = None if force else content_index.get(content_hash)
+        if previous is not None:
+            os.remove(path)
+            job_store.create(job_id, {
+                "progress": 100,
+                "file_name": file.filename,
+                "entities": [],
+                "message": "文件内容与之前的上传相同，已复用处理结果",
+                "content_hash": content_hash,
+                "deduplicated": True,
+                "file_url": previous["file_url"],
+                "entity_count": len(previous["entity_ids"])
+            }, {}, status="completed")
+            job_store.add_entity_ids(job_id, previous["entity_ids"])
+            return {
+                "job_id": job_id,
+                "status": "completed",
+                "deduplicated": True,
+                "message": "文件内容与之前的上传相同，已复用处理结果"
+            }
+        
+        # 创建处理任务，等待工作进程领取
+        job_store.create(job_id, {
             "progress": 0,
             "file_name": file.filename,
             "entities": [],
-            "message": "文件已上传，正在处理中..."
-        }
-        
-        # 异步处理文件
-        background_tasks.add_task(
-            process_file_background,
-            job_id,
-            file,
-            file_name,
-            file_processor,
-            cosmos_service,
-            openai_service
-        )
+            "message": "文件已上传，等待处理...",
+            "content_hash": content_hash,
+            "extraction_mode": extraction_mode,
+            "tiered": tiered
+        }, {
+            "path": path,
+            "filename": file.filename,
+            "blob_name": file_name,
+            "use_cache": use_cache,
+            "extraction_mode": extraction_mode,
+            "tiered": tiered
+        })
         
         return {"job_id": job_id, "status": "processing", "message": "文件上传成功，开始处理..."}
     except Exception as e:
@@ -68,106 +100,37 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
 @router.get("/status/{job_id}")
-async def get_processing_status(job_id: str):
+async def get_processing_status(
+    job_id: str,
+    job_store: JobStore = Depends(get_job_store)
+):
     """获取文件处理状态"""
-    if job_id not in processing_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="处理任务不存在")
     
-    return processing_jobs[job_id]
+    job["entity_ids"] = job_store.entity_ids(job_id)
+    return job
 
 @router.get("/entities/{job_id}")
 async def get_job_entities(
     job_id: str,
-    cosmos_service: CosmosDBService = Depends(get_cosmos_service)
+    cosmos_service: AsyncCosmosDBService = Depends(get_cosmos_service),
+    job_store: JobStore = Depends(get_job_store)
 ):
     """获取处理任务的实体列表"""
-    if job_id not in processing_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="处理任务不存在")
     
-    job = processing_jobs[job_id]
-    
     if job["status"] != "completed":
         return {"status": job["status"], "message": "处理尚未完成", "entities": []}
     
-    entity_ids = job.get("entity_ids", [])
-    entities = []
+    entity_ids = job_store.entity_ids(job_id)
+    entities, missing_ids = await cosmos_service.get_entities(entity_ids)
     
-    for entity_id in entity_ids:
-        entity = cosmos_service.get_entity(entity_id)
-        if entity:
-            entities.append(entity.dict())
-    
-    return {"status": "completed", "entities": entities}
-
-# 后台处理任务
-async def process_file_background(
-    job_id: str,
-    file: UploadFile,
-    file_name: str,
-    file_processor: FileProcessor,
-    cosmos_service: CosmosDBService,
-    openai_service: OpenAIService
-):
-    """后台处理文件任务"""
-    try:
-        # 处理文件
-        processing_jobs[job_id]["progress"] = 10
-        processing_jobs[job_id]["message"] = "正在解析文件..."
-        
-        entities, file_url, content_type = await file_processor.process_file(file, file_name)
-        
-        processing_jobs[job_id]["progress"] = 30
-        processing_jobs[job_id]["message"] = "文件解析完成，正在提取实体..."
-        
-        # 如果是文档类型，需要使用OpenAI提取实体
-        if content_type == "document":
-            # 读取文档内容
-            with open(file_url, "r", encoding="utf-8") as f:
-                text_content = f.read()
-            
-            # 分析文档，提取实体和关系
-            processing_jobs[job_id]["progress"] = 50
-            processing_jobs[job_id]["message"] = "正在使用AI分析文档..."
-            
-            analysis_result = await openai_service.analyze_entity_document(text_content)
-            
-            # 从分析结果中获取实体
-            raw_entities = analysis_result.get("entities", [])
-            relationships = analysis_result.get("relationships", [])
-            
-            # 创建实体对象
-            for entity_data in raw_entities:
-                entity = Entity(
-                    name=entity_data.get("name", "未命名"),
-                    **{k: v for k, v in entity_data.items() if k != "name"}
-                )
-                entities.append(entity.dict())
-        
-        # 保存实体到Cosmos DB
-        processing_jobs[job_id]["progress"] = 70
-        processing_jobs[job_id]["message"] = "正在保存实体到数据库..."
-        
-        entity_ids = []
-        for entity_data in entities:
-            if isinstance(entity_data, dict) and "name" in entity_data:
-                entity = Entity(**entity_data)
-                result = cosmos_service.create_entity(entity)
-                entity_ids.append(result["id"])
-        
-        # 处理关系(如果存在)
-        processing_jobs[job_id]["progress"] = 90
-        processing_jobs[job_id]["message"] = "正在处理实体关系..."
-        
-        # TODO: 处理关系逻辑
-        
-        # 完成处理
-        processing_jobs[job_id]["status"] = "completed"
-        processing_jobs[job_id]["progress"] = 100
-        processing_jobs[job_id]["message"] = "处理完成"
-        processing_jobs[job_id]["entity_ids"] = entity_ids
-        processing_jobs[job_id]["entity_count"] = len(entity_ids)
-        
-    except Exception as e:
-        logger.error(f"处理文件失败: {str(e)}")
-        processing_jobs[job_id]["status"] = "failed"
-        processing_jobs[job_id]["message"] = f"处理失败: {str(e)}" 
\ No newline at end of file
+    return {
+        "status": "completed",
+        "entities": [entity.dict() for entity in entities],
+        "missing_ids": missing_ids
+    }
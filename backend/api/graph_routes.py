@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from ..services.graph_service import RelationshipGraph
+from ..services.service_registry import service_registry
+from ..config.settings import GRAPH_MAX_NODES
+import logging
+from typing import Optional
+
+router = APIRouter(prefix="/api/graph", tags=["graph"])
+logger = logging.getLogger(__name__)
+
+# 服务依赖(应用级单例)
+def get_relationship_graph():
+    graph = service_registry.relationship_graph
+    if not graph.ready:
+        raise HTTPException(status_code=503, detail="关系图正在加载，请稍后重试")
+    return graph
+
+@router.get("/stats")
+async def get_graph_stats():
+    """获取关系图规模和加载状态"""
+    return service_registry.relationship_graph.stats()
+
+@router.get("/neighborhood/{entity_id}")
+async def get_neighborhood(
+    entity_id: str,
+    depth: int = Query(1, ge=1, le=6),
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+    type: Optional[str] = Query(None, pattern="^(STRONG|WEAK)$"),
+    direction: str = Query("both", pattern="^(out|in|both)$"),
+    max_nodes: int = Query(1000, ge=1, le=GRAPH_MAX_NODES),
+    graph: RelationshipGraph = Depends(get_relationship_graph)
+):
+    """获取实体k跳以内的关系子图"""
+    try:
+        return graph.neighborhood(entity_id, depth, min_confidence, type, direction, max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"获取关系子图失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取关系子图失败: {str(e)}")
+
+@router.get("/path/{source_id}/{target_id}")
+async def get_shortest_path(
+    source_id: str,
+    target_id: str,
+    max_depth: int = Query(6, ge=1, le=12),
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+    type: Optional[str] = Query(None, pattern="^(STRONG|WEAK)$"),
+    direction: str = Query("both", pattern="^(out|in|both)$"),
+    graph: RelationshipGraph = Depends(get_relationship_graph)
+):
+    """获取两个人物之间的最短关系路径"""
+    try:
+        path = graph.shortest_path(source_id, target_id, max_depth, min_confidence, type, direction)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"查找最短路径失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"查找最短路径失败: {str(e)}")
+    
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"{max_depth} 跳内未找到 {source_id} 到 {target_id} 的路径")
+    return {"source_id": source_id, "target_id": target_id, **path}
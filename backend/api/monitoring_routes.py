@@ -0,0 +1,65 @@
+from fastapi import APIRouter, HTTPException
+from ..services.service_registry import service_registry
+from ..config.settings import SEARCH_BACKEND
+import logging
+
+router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
+logger = logging.getLogger(__name__)
+
+@router.get("/llm-cache")
+async def get_llm_cache_stats():
+    """获取模型响应缓存的命中、未命中、跳过次数和容量"""
+    cache = service_registry.llm_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.delete("/llm-cache")
+async def clear_llm_cache():
+    """清空模型响应缓存"""
+    cache = service_registry.llm_cache
+    if cache is None:
+        raise HTTPException(status_code=404, detail="模型响应缓存未启用")
+    try:
+        cache.clear()
+        return {"message": "模型响应缓存已清空"}
+    except Exception as e:
+        logger.error(f"清空模型响应缓存失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"清空模型响应缓存失败: {str(e)}")
+
+@router.get("/llm-scheduler")
+async def get_llm_scheduler_stats():
+    """获取模型调用调度器各部署的队列深度、等待时间、合并和限流次数"""
+    scheduler = service_registry.llm_scheduler
+    if scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, "deployments": scheduler.stats()}
+
+@router.get("/jobs")
+async def get_job_stats():
+    """获取文件处理任务的排队、处理中、完成和失败数量"""
+    return service_registry.job_store.stats()
+
+@router.get("/entity-resolution")
+async def get_entity_resolution_stats():
+    """获取实体消解索引中的实体数、分块键数和疑似重复对数"""
+    if service_registry.entity_resolver is None:
+        return {"enabled": False}
+    return {"enabled": True, **service_registry.entity_index.stats()}
+
+@router.get("/search-indexing")
+async def get_search_indexing_stats():
+    """获取搜索索引推送队列的积压、批次、重试和失败数；本地后端同时返回段数、文档数和磁盘占用"""
+    queue = service_registry.search_index_queue
+    stats = {"mode": "push", **queue.stats()} if queue is not None else {"mode": "pull"}
+    if SEARCH_BACKEND == "local":
+        stats["local_index"] = service_registry.search_service.stats()
+    return stats
+
+@router.get("/change-feed")
+async def get_change_feed_stats():
+    """获取变更源处理器持有的分区、已处理的批次和文档数"""
+    processors = service_registry.change_feed_processors()
+    if not processors:
+        return {"enabled": False}
+    return {"enabled": True, "processors": {processor.name: processor.stats() for processor in processors}}
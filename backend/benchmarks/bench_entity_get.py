@@ -0,0 +1,88 @@
+"""GET /api/entities/{id} 吞吐量基准测试
+
+对比两种服务依赖方式的每秒请求数:
+- per-request: 每个请求新建服务实例(旧实现)
+- singleton: 使用应用级服务注册表中的共享实例
+
+后端为本地桩服务，构造时模拟客户端初始化开销(账户元数据请求、TLS握手)，
+查询时模拟一次数据库往返。
+
+运行方式:
+    python -m backend.benchmarks.bench_entity_get --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from ..main import app
+from ..api import entity_routes
+from ..models.entity import Entity
+
+
+class StubCosmosService:
+    """模拟CosmosDBService的本地桩服务"""
+
+    def __init__(self, bootstrap_ms: float, query_ms: float):
+        # 模拟CosmosClient构造时读取数据库账户信息的网络往返
+        time.sleep(bootstrap_ms / 1000)
+        self.query_ms = query_ms
+        self.entity = Entity(id="bench-entity", name="张三", domain="人工智能")
+
+    async def get_entity(self, entity_id: str):
+        await asyncio.sleep(self.query_ms / 1000)
+        return self.entity
+
+    async def get_relationship_edges(self, entity_id: str):
+        # 实体详情路由合并关系容器中的出边
+        return []
+
+
+async def run_load(total: int, concurrency: int) -> float:
+    """并发发送请求，返回每秒请求数"""
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request():
+            async with semaphore:
+                response = await client.get("/api/entities/bench-entity")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GET /api/entities/{id} 吞吐量基准测试")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--bootstrap-ms", type=float, default=20.0, help="模拟的客户端初始化耗时")
+    parser.add_argument("--query-ms", type=float, default=2.0, help="模拟的单次查询耗时")
+    args = parser.parse_args()
+
+    # 旧实现: 每个请求构造新的服务实例
+    app.dependency_overrides[entity_routes.get_cosmos_service] = (
+        lambda: StubCosmosService(args.bootstrap_ms, args.query_ms)
+    )
+    before = asyncio.run(run_load(args.requests, args.concurrency))
+
+    # 新实现: 复用应用级单例
+    shared_service = StubCosmosService(args.bootstrap_ms, args.query_ms)
+    app.dependency_overrides[entity_routes.get_cosmos_service] = lambda: shared_service
+    after = asyncio.run(run_load(args.requests, args.concurrency))
+
+    app.dependency_overrides.clear()
+
+    print(f"请求数: {args.requests}, 并发: {args.concurrency}")
+    print(f"per-request 构造: {before:.1f} req/s")
+    print(f"singleton 复用:   {after:.1f} req/s")
+    print(f"提升: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""文档提取模式基准测试: two_pass 与 single_pass，以及是否启用GPT-4o-mini分级筛选
+
+用 httpx.MockTransport 充当回放录制响应的本地模型端点: 按系统提示判断请求类型
+(实体提取 / 关系提取 / 合并提取 / 分类)返回录制结果，分类结果按文本中是否出现人物决定，
+token用量按请求文本估算，单次耗时 = 固定开销 + 每千个输入token的耗时(mini按比例折算)。
+文档中 --filler-ratio 比例的段落不提及人物，对比各组合的耗时、调用次数和各模型token用量。
+
+运行方式:
+    python -m backend.benchmarks.bench_extraction_modes --paragraphs 400 --latency-ms 300 --filler-ratio 0.5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from ..services.openai_service import OpenAIService
+from ..services.text_chunker import estimate_tokens
+
+ENDPOINT = "https://bench.openai.azure.com/"
+ENTITIES = [
+    {"name": "张三", "position": "研究员", "country": "中国"},
+    {"name": "李四", "position": "教授", "country": "中国"}
+]
+RELATIONSHIPS = [{
+    "source_name": "张三",
+    "target_name": "李四",
+    "relationship_type": "STRONG",
+    "relationship_description": "师生",
+    "confidence": 0.9
+}]
+# 录制的响应，按系统提示开头的角色描述区分；分类响应按文本内容生成
+CLASSIFIER = "文本分类助手"
+RECORDED = {
+    CLASSIFIER: None,
+    "信息和关系提取助手": {"entities": ENTITIES, "relationships": RELATIONSHIPS},
+    "关系提取助手": {"relationships": RELATIONSHIPS},
+    "信息提取助手": {"entities": ENTITIES}
+}
+# gpt-4o-mini 相对 gpt-4o 的单次耗时比例
+MINI_LATENCY_RATIO = 0.3
+
+
+def make_service(base_latency: float, latency_per_1k: float) -> OpenAIService:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        system_prompt = body["messages"][0]["content"]
+        user_text = body["messages"][1]["content"]
+        marker = next(marker for marker in RECORDED if marker in system_prompt)
+        result = RECORDED[marker]
+        if result is None:
+            result = {"has_people": "张三" in user_text, "has_relationships": "师从" in user_text}
+        content = json.dumps(result, ensure_ascii=False)
+        prompt_tokens = estimate_tokens(system_prompt + user_text)
+        completion_tokens = estimate_tokens(content)
+        latency = base_latency + latency_per_1k * prompt_tokens / 1000
+        await asyncio.sleep(latency * MINI_LATENCY_RATIO if marker == CLASSIFIER else latency)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    service = OpenAIService(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    # 指向本地替身端点，与真实配置无关
+    service.client = service.client.with_options(api_key="bench", base_url=f"{ENDPOINT}openai/deployments/gpt-4o")
+    return service
+
+
+def make_document(paragraphs: int, filler_ratio: float) -> str:
+    """前一部分段落提及人物，其余为不含人物的说明文字(如附录、表格说明)"""
+    people = max(1, int(paragraphs * (1 - filler_ratio)))
+    return "\n".join(
+        f"第{i}段: 张三是一名研究员，毕业于清华大学，师从李四教授，主要研究方向为自然语言处理和知识图谱。"
+        if i < people else
+        f"第{i}段: 本节说明数据采集流程，包括样本来源、字段定义、清洗规则以及质量评估的各项指标。"
+        for i in range(paragraphs)
+    )
+
+
+async def run_mode(service: OpenAIService, text: str, mode: str, tiered: bool) -> dict:
+    start = time.perf_counter()
+    result = await service.analyze_entity_document(text, use_cache=False, mode=mode, tiered=tiered)
+    elapsed = time.perf_counter() - start
+    assert [entity["name"] for entity in result["entities"]] == ["张三", "李四"]
+    assert len(result["relationships"]) == 1
+    return {"seconds": elapsed, "chunks": len(result["chunks"]), "routing": result["routing"], **result["usage"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档提取模式基准测试")
+    parser.add_argument("--paragraphs", type=int, default=400, help="合成文档的段落数")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="模拟的单次调用固定开销")
+    parser.add_argument("--latency-per-1k-ms", type=float, default=50.0, help="每千个输入token增加的耗时")
+    parser.add_argument("--filler-ratio", type=float, default=0.5, help="不提及人物的段落比例")
+    args = parser.parse_args()
+
+    text = make_document(args.paragraphs, args.filler_ratio)
+    print(f"文档 {len(text)} 字符, 约 {estimate_tokens(text)} tokens")
+    for mode in ("two_pass", "single_pass"):
+        for tiered in (False, True):
+            service = make_service(args.latency_ms / 1000, args.latency_per_1k_ms / 1000)
+            stats = asyncio.run(run_mode(service, text, mode, tiered))
+            label = f"{mode}{'+tiered' if tiered else ''}"
+            print(f"{label:18s}: {stats['seconds']:6.2f}s, {stats['chunks']} 个窗口, {stats['calls']} 次调用, "
+                  f"输入 {stats['prompt_tokens']} / 输出 {stats['completion_tokens']} / 合计 {stats['total_tokens']} tokens")
+            for model, tier in stats["by_model"].items():
+                print(f"    {model:12s}: {tier['calls']} 次调用, {tier['total_tokens']} tokens, 累计 {tier['seconds']:.2f}s")
+            if tiered:
+                routing = stats["routing"]
+                print(f"    分级: {routing['extracted']} 个窗口交给gpt-4o, 跳过 {routing['skipped']} 个")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""本地搜索后端基准测试: 合成人物语料的建索引吞吐、段合并、查询延迟和重新打开索引的耗时
+
+合成语料按中文姓名、领域、国家、职位、技能和一段描述生成实体，以 index_documents 分批写入临时目录
+(每批成为一个段，达到合并因子时合并)。随后分别测量姓名查询、描述短语查询、带过滤的查询和只过滤的查询，
+以及推送队列典型的小批量更新；最后用新实例重新打开索引，段以内存映射方式加载，不需要重建。
+
+运行方式:
+    python -m backend.benchmarks.bench_local_search --entities 1000000 --batch-size 20000 --queries 200
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from ..services.entity_filters import EntityFilter, FilterOperator, compile_odata_filter
+from ..services.local_search import LocalSearchBackend
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢"
+GIVEN_NAMES = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬燕彬鹏辉斌宇浩凯健俊帆帅"
+DOMAINS = ["人工智能", "金融", "医疗", "能源", "教育", "制造", "传媒", "法律", "航空航天", "生物技术"]
+COUNTRIES = ["中国", "美国", "英国", "德国", "日本", "法国", "新加坡", "加拿大", "澳大利亚", "韩国"]
+POSITIONS = ["教授", "研究员", "工程师", "总经理", "董事", "分析师", "医生", "律师", "记者", "投资人"]
+SKILLS = ["Python", "机器学习", "数据分析", "项目管理", "谈判", "深度学习", "财务建模", "临床研究",
+          "供应链", "市场营销", "芯片设计", "自然语言处理", "风险控制", "云计算", "知识产权"]
+ORGANIZATIONS = ["清华大学", "北京大学", "复旦大学", "中国科学院", "华为", "腾讯", "阿里巴巴", "高盛",
+                 "麻省理工学院", "斯坦福大学", "国家电网", "协和医院"]
+
+
+def make_entity(index: int, rng: random.Random) -> dict:
+    name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2)))
+    organization = rng.choice(ORGANIZATIONS)
+    domain = rng.choice(DOMAINS)
+    position = rng.choice(POSITIONS)
+    return {
+        "id": f"entity-{index}",
+        "name": name,
+        "domain": domain,
+        "country": rng.choice(COUNTRIES),
+        "position": position,
+        "email": f"user{index}@example.com",
+        "skills": rng.sample(SKILLS, 3),
+        "personalDescription": f"{name}现任{organization}{position}，长期从事{domain}领域工作。",
+        "workExperience": f"曾在{rng.choice(ORGANIZATIONS)}任职"
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(backend: LocalSearchBackend, label: str, queries: list) -> None:
+    latencies = []
+    hits = 0
+    for search_text, filter_condition in queries:
+        start = time.perf_counter()
+        hits += len(backend.search_entities(search_text, filter_condition))
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{label}: {len(queries)} 次, p50 {statistics.median(latencies):.1f}ms, "
+          f"p95 {percentile(latencies, 0.95):.1f}ms, 平均命中 {hits / len(queries):.1f} 个")
+
+
+def run(entities: int, batch_size: int, queries: int, merge_factor: int, seed: int) -> None:
+    rng = random.Random(seed)
+    path = tempfile.mkdtemp()
+    try:
+        backend = LocalSearchBackend(path, merge_factor)
+        start = time.perf_counter()
+        for offset in range(0, entities, batch_size):
+            backend.index_documents([make_entity(index, rng) for index in range(offset, min(offset + batch_size, entities))], [])
+        elapsed = time.perf_counter() - start
+        stats = backend.stats()
+        print(f"建索引: {entities} 个实体, {elapsed:.1f}s, {entities / elapsed:.0f} 个/秒, "
+              f"段 {stats['segments']} 个, 合并 {stats['merges']} 次, 磁盘 {stats['disk_bytes'] / 1024 / 1024:.0f}MB")
+
+        names = [make_entity(rng.randrange(entities), rng)["name"] for _ in range(queries)]
+        domain_filter = lambda: compile_odata_filter([
+            EntityFilter(field="domain", value=rng.choice(DOMAINS)),
+            EntityFilter(field="skills", op=FilterOperator.CONTAINS, value=rng.choice(SKILLS))
+        ])
+        measure(backend, "姓名查询", [(name, None) for name in names])
+        measure(backend, "短语查询", [(f"{rng.choice(ORGANIZATIONS)}{rng.choice(POSITIONS)}", None) for _ in range(queries)])
+        measure(backend, "查询+过滤", [(name, domain_filter()) for name in names])
+        measure(backend, "仅过滤", [("*", domain_filter()) for _ in range(queries)])
+
+        # 推送队列的典型写入: 每批500个更新
+        start = time.perf_counter()
+        for _ in range(20):
+            backend.index_documents([make_entity(rng.randrange(entities), rng) for _ in range(500)], [])
+        elapsed = time.perf_counter() - start
+        print(f"增量更新: 20 批 x 500 个, 平均每批 {elapsed / 20 * 1000:.0f}ms")
+        backend.close()
+
+        start = time.perf_counter()
+        reopened = LocalSearchBackend(path, merge_factor)
+        reopened.initialize_search_service()
+        reopened.search_entities(names[0])
+        print(f"重新打开索引并完成首次查询: {(time.perf_counter() - start) * 1000:.0f}ms, "
+              f"文档 {reopened.stats()['documents']} 个")
+        reopened.close()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地搜索后端基准测试")
+    parser.add_argument("--entities", type=int, default=1000000, help="合成实体数")
+    parser.add_argument("--batch-size", type=int, default=20000, help="每次写入的实体数(每批一个段)")
+    parser.add_argument("--queries", type=int, default=200, help="每类查询的次数")
+    parser.add_argument("--merge-factor", type=int, default=10, help="段合并因子")
+    parser.add_argument("--seed", type=int, default=7, help="随机种子")
+    args = parser.parse_args()
+
+    run(args.entities, args.batch_size, args.queries, args.merge_factor, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""并发模型调用基准测试
+
+用 httpx.MockTransport 充当本地OpenAI端点(每次请求固定耗时)，同时发起N次实体提取:
+- blocking: 在async函数中调用同步 AzureOpenAI 客户端(旧实现)，请求依次阻塞事件循环，约N倍延迟
+- async: OpenAIService 使用 AsyncAzureOpenAI 和共享的 httpx.AsyncClient，约1倍延迟
+
+运行方式:
+    python -m backend.benchmarks.bench_openai_concurrency --requests 20 --latency-ms 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from openai import AzureOpenAI
+
+from ..services.openai_service import OpenAIService
+
+ENDPOINT = "https://bench.openai.azure.com/"
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": json.dumps({"entities": [{"name": "张三"}]})}
+    }],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+}
+
+
+def make_async_service(latency: float) -> OpenAIService:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=COMPLETION)
+
+    service = OpenAIService(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    # 指向本地替身端点，与真实配置无关
+    service.client = service.client.with_options(api_key="bench", base_url=f"{ENDPOINT}openai/deployments/gpt-4o")
+    return service
+
+
+def make_blocking_client(latency: float) -> AzureOpenAI:
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return httpx.Response(200, json=COMPLETION)
+
+    return AzureOpenAI(
+        api_key="bench",
+        api_version="2024-02-01",
+        azure_endpoint=ENDPOINT,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+
+async def run_blocking(client: AzureOpenAI, total: int) -> float:
+    async def extract():
+        client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": "张三是一名研究员"}],
+            response_format={"type": "json_object"}
+        )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(extract() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def run_async(service: OpenAIService, total: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        service.extract_entities_from_text("张三是一名研究员") for _ in range(total)
+    ))
+    elapsed = time.perf_counter() - start
+    assert all(result == [{"name": "张三"}] for result in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发模型调用基准测试")
+    parser.add_argument("--requests", type=int, default=20, help="同时发起的提取数量")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="模拟的单次模型调用耗时")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    blocking_time = asyncio.run(run_blocking(make_blocking_client(latency), args.requests))
+    async_time = asyncio.run(run_async(make_async_service(latency), args.requests))
+
+    print(f"{args.requests} 个并发提取, 单次 {args.latency_ms:.0f}ms")
+    print(f"blocking: {blocking_time:6.2f}s ({blocking_time / latency:.1f}x 单次延迟)")
+    print(f"async:    {async_time:6.2f}s ({async_time / latency:.1f}x 单次延迟)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""流式上传与CSV分块解析基准测试
+
+使用本地Blob替身(模拟每个块的暂存耗时，不保留数据)上传一个大CSV文件，
+上传过程中同时用CsvChunker解析，测量吞吐量和进程峰值内存。
+
+运行方式:
+    python -m backend.benchmarks.bench_streaming_upload --size-mb 1024 [--convert] [--legacy]
+
+--convert 同时把每个数据块转换为实体字典；--legacy 在流式测试之后运行旧实现
+(整文件读入内存后 pd.read_csv)，对比峰值内存。
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+from io import BytesIO
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from ..config.settings import BLOB_BLOCK_SIZE, BLOB_MAX_CONCURRENCY
+from ..services.file_processor import CsvChunker, FileProcessor, dataframe_to_entities
+from .bench_table_ingestion import generate_csv
+
+# 合成名单每行的平均字节数，用于按目标大小估算行数
+AVERAGE_ROW_BYTES = 225
+
+
+class LocalBlobClient:
+    """Blob替身: 每个块模拟一次固定耗时的网络往返"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.url = "http://127.0.0.1:10000/devstoreaccount1/documents/bench.csv"
+        self.staged_bytes = 0
+        self.committed_blocks = 0
+
+    async def stage_block(self, block_id, data, length=None):
+        await asyncio.sleep(self.latency)
+        self.staged_bytes += len(data)
+
+    async def commit_block_list(self, block_list):
+        self.committed_blocks = len(block_list)
+
+
+class LocalContainerClient:
+    def __init__(self, latency_ms: float):
+        self.blob_client = LocalBlobClient(latency_ms)
+
+    def get_blob_client(self, blob):
+        return self.blob_client
+
+
+def peak_rss_mb() -> float:
+    # Linux下ru_maxrss单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_streaming(path: str, latency_ms: float, convert: bool) -> dict:
+    processor = FileProcessor.__new__(FileProcessor)
+    processor.async_container_client = LocalContainerClient(latency_ms)
+    chunker = CsvChunker()
+    stats = {"rows": 0, "entities": 0}
+
+    def consume(chunks):
+        for chunk in chunks:
+            stats["rows"] += len(chunk)
+            if convert:
+                stats["entities"] += len(dataframe_to_entities(chunk))
+
+    async def on_block(block: bytes):
+        consume(await asyncio.to_thread(chunker.feed, block))
+
+    with open(path, "rb") as f:
+        upload = UploadFile(file=f, size=os.path.getsize(path), filename="bench.csv")
+        await processor.stream_upload(upload, "bench.csv", on_block)
+    consume(chunker.close())
+
+    blob_client = processor.async_container_client.blob_client
+    stats["uploaded_bytes"] = blob_client.staged_bytes
+    stats["blocks"] = blob_client.committed_blocks
+    return stats
+
+
+def run_legacy(path: str) -> int:
+    """旧实现: 整个文件读入内存，再整表解析"""
+    with open(path, "rb") as f:
+        content = f.read()
+    return len(pd.read_csv(BytesIO(content)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式上传与CSV分块解析基准测试")
+    parser.add_argument("--size-mb", type=int, default=1024, help="合成CSV文件大小(MB)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟的单个块暂存耗时")
+    parser.add_argument("--convert", action="store_true", help="同时转换为实体字典")
+    parser.add_argument("--legacy", action="store_true", help="流式测试后运行旧实现对比峰值内存")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "roster.csv")
+        generate_csv(path, args.size_mb * 1024 * 1024 // AVERAGE_ROW_BYTES)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        baseline = peak_rss_mb()
+        print(f"文件大小 {size_mb:.0f} MB, 块大小 {BLOB_BLOCK_SIZE // 1024} KB, "
+              f"并发块数 {BLOB_MAX_CONCURRENCY}, 基线峰值内存 {baseline:.0f} MB")
+
+        start = time.perf_counter()
+        stats = asyncio.run(run_streaming(path, args.latency_ms, args.convert))
+        elapsed = time.perf_counter() - start
+        assert stats["uploaded_bytes"] == os.path.getsize(path)
+        print(f"流式: {elapsed:.1f}s, {size_mb / elapsed:.0f} MB/s, {stats['rows']} 行, "
+              f"{stats['blocks']} 个块, 峰值内存 {peak_rss_mb():.0f} MB")
+
+        if args.legacy:
+            start = time.perf_counter()
+            rows = run_legacy(path)
+            elapsed = time.perf_counter() - start
+            print(f"旧实现: {elapsed:.1f}s, {rows} 行, 峰值内存 {peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
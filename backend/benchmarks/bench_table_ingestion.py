@@ -0,0 +1,97 @@
+"""表格导入基准测试
+
+在合成CSV上对比逐行(iterrows)转换与按列向量化转换 dataframe_to_entities 的耗时。
+
+运行方式:
+    python -m backend.benchmarks.bench_table_ingestion --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from ..models.entity import Entity
+from ..services.file_processor import TEXT_COLUMN_DTYPES, dataframe_to_entities
+
+DOMAINS = ["人工智能", "材料科学", "生物医药", "金融", "能源"]
+COUNTRIES = ["中国", "美国", "德国", "日本", "英国"]
+SKILLS = ["机器学习", "数据挖掘", "Python", "项目管理", "统计分析", "深度学习"]
+
+
+def generate_csv(path: str, rows: int, seed: int = 42) -> None:
+    """生成包含列表、复杂和社交账号列的合成人员名单"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,domain,country,position,phone,email,researchFields,skills,workExperience,socialAccounts\n")
+        for i in range(rows):
+            skills = ", ".join(rng.sample(SKILLS, 2))
+            f.write(
+                f"人员{i},{rng.choice(DOMAINS)},{rng.choice(COUNTRIES)},研究员,"
+                f"{13800000000 + i},user{i}@example.com,\"{rng.choice(DOMAINS)}, {rng.choice(DOMAINS)}\","
+                f"\"{skills}\",\"公司A 2010-2015; 公司B 2015-2020\","
+                f"\"微博:weibo.com/u{i}; 领英:linkedin.com/in/u{i}\"\n"
+            )
+
+
+def legacy_dataframe_to_entities(df: pd.DataFrame) -> list:
+    """旧实现: 逐行逐单元格转换并逐个构造Entity(仅用于对比)"""
+    entities = []
+    for _, row in df.iterrows():
+        entity_data = {}
+        for column in df.columns:
+            if pd.notna(row[column]):
+                if column in ['researchFields', 'skills', 'languages', 'personalHonors',
+                              'relatedPersons', 'relatedUrls']:
+                    entity_data[column] = [item.strip() for item in str(row[column]).split(',')]
+                elif column in ['workExperience', 'educationExperience', 'volunteerExperience',
+                                'publications', 'patents', 'projects', 'academicAchievements',
+                                'socialActivities']:
+                    entity_data[column] = [{"description": item.strip()} for item in str(row[column]).split(';')]
+                elif column == 'socialAccounts':
+                    accounts = {}
+                    for account in str(row[column]).split(';'):
+                        if ':' in account:
+                            platform, url = account.split(':', 1)
+                            accounts[platform.strip()] = url.strip()
+                    entity_data[column] = accounts
+                else:
+                    entity_data[column] = str(row[column])
+        if 'name' in entity_data:
+            entities.append(Entity(**entity_data).dict())
+    return entities
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="表格导入基准测试")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="逗号分隔的行数")
+    parser.add_argument("--legacy-max-rows", type=int, default=100000,
+                        help="超过该行数时跳过旧实现(逐行转换过慢)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in [int(size) for size in args.sizes.split(",")]:
+            path = os.path.join(tmp_dir, f"roster_{rows}.csv")
+            generate_csv(path, rows)
+            df = pd.read_csv(path, dtype=TEXT_COLUMN_DTYPES)
+            
+            vectorized_time, entities = timed(dataframe_to_entities, df)
+            line = f"{rows:>9} 行: 向量化 {vectorized_time:8.2f}s ({rows / vectorized_time:,.0f} 行/s)"
+            
+            if rows <= args.legacy_max_rows:
+                legacy_time, legacy_entities = timed(legacy_dataframe_to_entities, df)
+                assert len(legacy_entities) == len(entities)
+                line += f" | 逐行 {legacy_time:8.2f}s | 提升 {legacy_time / vectorized_time:.1f}x"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
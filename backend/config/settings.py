@@ -10,6 +10,31 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_GPT4O_DEPLOYMENT_NAME = os.getenv("AZURE_GPT4O_DEPLOYMENT_NAME")
 AZURE_GPT4O_MINI_DEPLOYMENT_NAME = os.getenv("AZURE_GPT4O_MINI_DEPLOYMENT_NAME")
+# 单次模型调用的超时秒数(读取响应)和建立连接的超时秒数
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+# 长文档分块提取: 每个窗口的估算token上限、相邻窗口的重叠token数和并发请求数上限
+LLM_CHUNK_MAX_TOKENS = int(os.getenv("LLM_CHUNK_MAX_TOKENS", "6000"))
+LLM_CHUNK_OVERLAP_TOKENS = int(os.getenv("LLM_CHUNK_OVERLAP_TOKENS", "300"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# 默认的文档提取模式: two_pass(实体、关系分两次调用) 或 single_pass(一次调用)
+LLM_EXTRACTION_MODE = os.getenv("LLM_EXTRACTION_MODE", "two_pass")
+# 分级提取: 先用GPT-4o-mini判断窗口是否提及人物，只把提及人物的窗口交给GPT-4o
+LLM_TIERED_EXTRACTION = os.getenv("LLM_TIERED_EXTRACTION", "false").lower() == "true"
+# 模型调用调度: 每个部署每分钟的token配额(TPM)和请求配额(RPM)，0表示不限制；429时的最大重新排队次数
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+LLM_GPT4O_TPM = int(os.getenv("LLM_GPT4O_TPM", "150000"))
+LLM_GPT4O_RPM = int(os.getenv("LLM_GPT4O_RPM", "900"))
+LLM_GPT4O_MINI_TPM = int(os.getenv("LLM_GPT4O_MINI_TPM", "200000"))
+LLM_GPT4O_MINI_RPM = int(os.getenv("LLM_GPT4O_MINI_RPM", "1200"))
+LLM_SCHEDULER_MAX_RETRIES = int(os.getenv("LLM_SCHEDULER_MAX_RETRIES", "5"))
+# 按部署名索引；未配置部署名的条目跳过，避免两个None键互相覆盖
+LLM_DEPLOYMENT_LIMITS = {
+    name: limits for name, limits in (
+        (AZURE_GPT4O_DEPLOYMENT_NAME, {"tpm": LLM_GPT4O_TPM, "rpm": LLM_GPT4O_RPM}),
+        (AZURE_GPT4O_MINI_DEPLOYMENT_NAME, {"tpm": LLM_GPT4O_MINI_TPM, "rpm": LLM_GPT4O_MINI_RPM})
+    ) if name
+}
 
 # Azure Cosmos DB配置
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
@@ -17,16 +42,95 @@ COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DATABASE = os.getenv("COSMOS_DATABASE")
 COSMOS_ENTITIES_CONTAINER = os.getenv("COSMOS_ENTITIES_CONTAINER")
 COSMOS_RELATIONSHIPS_CONTAINER = os.getenv("COSMOS_RELATIONSHIPS_CONTAINER")
+# 实体id→分区键(name)路由索引的最大条目数
+COSMOS_PARTITION_INDEX_SIZE = int(os.getenv("COSMOS_PARTITION_INDEX_SIZE", "200000"))
+# 批量读取实体时并发点读的最大请求数
+COSMOS_MAX_CONCURRENCY = int(os.getenv("COSMOS_MAX_CONCURRENCY", "16"))
+# 批量写入: 每个事务批次的最大操作数(Cosmos上限100)和被限流(429)时的最大重试次数
+COSMOS_BATCH_SIZE = int(os.getenv("COSMOS_BATCH_SIZE", "100"))
+COSMOS_MAX_RETRIES = int(os.getenv("COSMOS_MAX_RETRIES", "5"))
+# 分页列出实体时的默认和最大页大小
+ENTITY_PAGE_SIZE = int(os.getenv("ENTITY_PAGE_SIZE", "100"))
+ENTITY_MAX_PAGE_SIZE = int(os.getenv("ENTITY_MAX_PAGE_SIZE", "1000"))
 
 # Azure AI Search配置
 AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_KEY = os.getenv("AZURE_SEARCH_KEY")
 AZURE_SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")
 AZURE_SEARCH_SKILLSET_NAME = os.getenv("AZURE_SEARCH_SKILLSET_NAME")
+# 搜索后端: azure 为Azure AI Search，local 为进程内的本地索引(离线部署和测试使用，写入总是推送模式)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "azure").lower()
+# 索引方式: push 由实体写入变更实时推送到索引，pull 由索引器定期从Cosmos DB全量拉取
+SEARCH_INDEXING_MODE = os.getenv("SEARCH_INDEXING_MODE", "push").lower()
+# 推送批次的文档数和字节数上限、最长攒批秒数，队列积压上限(达到后写入方等待)和失败重试次数
+SEARCH_PUSH_BATCH_SIZE = int(os.getenv("SEARCH_PUSH_BATCH_SIZE", "500"))
+SEARCH_PUSH_BATCH_BYTES = int(os.getenv("SEARCH_PUSH_BATCH_BYTES", str(8 * 1024 * 1024)))
+SEARCH_PUSH_FLUSH_INTERVAL = float(os.getenv("SEARCH_PUSH_FLUSH_INTERVAL", "1"))
+SEARCH_PUSH_MAX_PENDING = int(os.getenv("SEARCH_PUSH_MAX_PENDING", "10000"))
+SEARCH_PUSH_MAX_RETRIES = int(os.getenv("SEARCH_PUSH_MAX_RETRIES", "5"))
 
 # Azure Blob Storage配置
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER")
+# 分块上传: 每块字节数、同时在途的块数，以及临时文件转存磁盘前的内存上限
+BLOB_BLOCK_SIZE = int(os.getenv("BLOB_BLOCK_SIZE", str(4 * 1024 * 1024)))
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+UPLOAD_SPOOL_MAX_SIZE = int(os.getenv("UPLOAD_SPOOL_MAX_SIZE", str(16 * 1024 * 1024)))
+
+# 本地数据目录(SQLite索引等)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(__file__), '..', '..', 'data'))
+# 上传文件内容哈希索引，用于重复上传去重
+CONTENT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", os.path.join(DATA_DIR, "content_index.db"))
+
+# 模型提取结果缓存: 目录、容量上限(字节)和过期秒数(0表示不过期)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(DATA_DIR, "llm_cache"))
+LLM_CACHE_SIZE_LIMIT = int(os.getenv("LLM_CACHE_SIZE_LIMIT", str(1024 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600))) or None
+
+# 表格文件分块导入时每块的行数
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+# 文件处理任务队列: 任务库路径、上传文件暂存目录
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(DATA_DIR, "jobs.db"))
+JOB_STAGING_DIR = os.getenv("JOB_STAGING_DIR", os.path.join(DATA_DIR, "uploads"))
+# 任务租约秒数(工作进程超过该时间未心跳视为崩溃)、最大领取次数和空闲时的轮询间隔
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# 工作进程数、每个进程同时处理的任务数；JOB_EMBEDDED_WORKER为true时Web进程内也运行一个工作协程(开发用)
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_EMBEDDED_WORKER = os.getenv("JOB_EMBEDDED_WORKER", "false").lower() == "true"
+
+# 实体消解: 导入时按姓名、邮箱、电话、证件号分块匹配已有实体，得分达到合并阈值时合并，
+# 达到关联阈值时记录为疑似重复；每个分块键最多比较的候选数
+ENTITY_RESOLUTION_ENABLED = os.getenv("ENTITY_RESOLUTION_ENABLED", "true").lower() == "true"
+ENTITY_INDEX_PATH = os.getenv("ENTITY_INDEX_PATH", os.path.join(DATA_DIR, "entity_index.db"))
+ENTITY_MATCH_THRESHOLD = float(os.getenv("ENTITY_MATCH_THRESHOLD", "0.8"))
+ENTITY_LINK_THRESHOLD = float(os.getenv("ENTITY_LINK_THRESHOLD", "0.5"))
+ENTITY_BLOCK_LIMIT = int(os.getenv("ENTITY_BLOCK_LIMIT", "200"))
+
+# 变更源处理器: 启用后派生视图(搜索索引、消解索引、关系图)由Cosmos DB变更源驱动，
+# 工作进程的写入也能同步到Web进程；租约库路径、租约秒数、每批文档数和读到末尾后的轮询间隔。
+# JOB_EMBEDDED_WORKER为false(上传由独立工作进程处理)时，Web进程总是从变更源更新关系图和分区路由缓存
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "false").lower() == "true"
+CHANGE_FEED_LEASE_PATH = os.getenv("CHANGE_FEED_LEASE_PATH", os.path.join(DATA_DIR, "change_feed_leases.db"))
+CHANGE_FEED_LEASE_SECONDS = float(os.getenv("CHANGE_FEED_LEASE_SECONDS", "30"))
+CHANGE_FEED_BATCH_SIZE = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "100"))
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "1"))
+
+# 本地搜索后端: 索引目录，存活文档数同一量级的段达到合并因子个时合并
+SEARCH_LOCAL_PATH = os.getenv("SEARCH_LOCAL_PATH", os.path.join(DATA_DIR, "search_index"))
+SEARCH_LOCAL_MERGE_FACTOR = int(os.getenv("SEARCH_LOCAL_MERGE_FACTOR", "10"))
+
+# HTTP连接池配置(所有Azure SDK客户端共享)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "100"))
+
+# 关系图配置
+GRAPH_PRELOAD = os.getenv("GRAPH_PRELOAD", "true").lower() == "true"
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "5000"))
 
 # 人物实体字段映射
 ENTITY_FIELDS = [
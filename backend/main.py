@@ -1,8 +1,7 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from .api import entity_routes, file_routes, conversation_routes
-from .services.cosmos_service import CosmosDBService
-from .services.ai_search_service import AISearchService
+from .api import entity_routes, file_routes, conversation_routes, graph_routes, monitoring_routes
+from .services.service_registry import service_registry
 import logging
 import uvicorn
 
@@ -33,30 +32,20 @@ app.add_middleware(
 app.include_router(entity_routes.router)
 app.include_router(file_routes.router)
 app.include_router(conversation_routes.router)
-
-# 依赖项
-def get_cosmos_service():
-    return CosmosDBService()
-
-def get_search_service():
-    return AISearchService()
+app.include_router(graph_routes.router)
+app.include_router(monitoring_routes.router)
 
 # 应用启动事件
 @app.on_event("startup")
 async def startup_event():
-    # 初始化数据库
-    cosmos_service = get_cosmos_service()
-    if cosmos_service.initialize_database():
-        logger.info("Cosmos DB 初始化成功")
-    else:
-        logger.error("Cosmos DB 初始化失败")
-    
-    # 初始化搜索服务
-    search_service = get_search_service()
-    if search_service.initialize_search_service():
-        logger.info("AI Search 初始化成功")
-    else:
-        logger.error("AI Search 初始化失败")
+    # 创建应用级共享服务并初始化数据库和搜索服务
+    await service_registry.startup()
+
+# 应用关闭事件
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 释放服务客户端和共享连接池
+    await service_registry.shutdown()
 
 # 健康检查端点
 @app.get("/health")
@@ -9,6 +9,41 @@ class Relationship(BaseModel):
     relationship_description: str = Field(description="关系描述")
     confidence: float = Field(description="关系置信度", ge=0.0, le=1.0)
 
+class RelationshipEdge(BaseModel):
+    """关系容器中的边文档，按source_id分区，每条边一个文档"""
+    id: str
+    source_id: str
+    source_name: Optional[str] = None
+    target_id: str
+    target_name: str
+    relationship_type: str = Field(description="关系类型: STRONG或WEAK")
+    relationship_description: str = Field(description="关系描述")
+    confidence: float = Field(description="关系置信度", ge=0.0, le=1.0)
+    
+    @staticmethod
+    def edge_id(source_id: str, target_id: str) -> str:
+        """由源和目标ID确定的边ID，同一对实体只保留一条边，写入即覆盖"""
+        return f"{source_id}:{target_id}"
+    
+    @classmethod
+    def from_relationship(cls, source_id: str, relationship: Relationship,
+                          source_name: Optional[str] = None) -> "RelationshipEdge":
+        return cls(
+            id=cls.edge_id(source_id, relationship.target_id),
+            source_id=source_id,
+            source_name=source_name,
+            **relationship.dict()
+        )
+    
+    def to_relationship(self) -> Relationship:
+        return Relationship(
+            target_id=self.target_id,
+            target_name=self.target_name,
+            relationship_type=self.relationship_type,
+            relationship_description=self.relationship_description,
+            confidence=self.confidence
+        )
+
 class Entity(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     domain: Optional[str] = None
@@ -1,5 +1,5 @@
 from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.indexes import SearchIndexClient, SearchIndexerClient
 from azure.search.documents.indexes.models import (
     SearchIndex, 
     SimpleField, 
@@ -16,6 +16,8 @@ from azure.search.documents.indexes.models import (
     WebApiSkill
 )
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents import IndexDocumentsBatch
 from ..config.settings import (
     AZURE_SEARCH_ENDPOINT, 
     AZURE_SEARCH_KEY,
@@ -25,32 +27,137 @@ from ..config.settings import (
     COSMOS_KEY,
     COSMOS_DATABASE,
     COSMOS_ENTITIES_CONTAINER,
-    ENTITY_FIELDS
+    ENTITY_FIELDS,
+    SEARCH_INDEXING_MODE
 )
+import json
 import logging
 from typing import List, Dict, Any
+from .search_backend import SearchBackend
 
 logger = logging.getLogger(__name__)
 
-class AISearchService:
-    def __init__(self):
+def build_index_fields() -> list:
+    """搜索索引的字段定义
+    
+    SearchableField 和 ComplexField 不使用type参数，集合字段须以collection=True声明
+    (否则为单值的Edm.String，集合字段的any过滤无法使用)。
+    """
+    return [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
+        SearchableField(name="name", type=SearchFieldDataType.String, filterable=True, sortable=True),
+        SearchableField(name="domain", type=SearchFieldDataType.String, filterable=True),
+        SearchableField(name="gender", type=SearchFieldDataType.String, filterable=True),
+        SearchableField(name="birthDate", type=SearchFieldDataType.String),
+        SearchableField(name="country", type=SearchFieldDataType.String, filterable=True),
+        SearchableField(name="position", type=SearchFieldDataType.String, filterable=True),
+        SearchableField(name="address", type=SearchFieldDataType.String),
+        SearchableField(name="phone", type=SearchFieldDataType.String),
+        SearchableField(name="email", type=SearchFieldDataType.String),
+        SearchableField(name="fax", type=SearchFieldDataType.String),
+        SearchableField(name="idCard", type=SearchFieldDataType.String),
+        SearchableField(name="passportNumber", type=SearchFieldDataType.String),
+        SearchableField(name="researchFields", collection=True, filterable=True),
+        SearchableField(name="personalDescription", type=SearchFieldDataType.String),
+        SearchableField(name="weiboUrl", type=SearchFieldDataType.String),
+        SearchableField(name="socialAccounts", type=SearchFieldDataType.String),
+        SearchableField(name="familyStatus", type=SearchFieldDataType.String),
+        SearchableField(name="socialRelationships", type=SearchFieldDataType.String),
+        SearchableField(name="workExperience", type=SearchFieldDataType.String),
+        SearchableField(name="educationExperience", type=SearchFieldDataType.String),
+        SearchableField(name="skills", collection=True, filterable=True),
+        SearchableField(name="volunteerExperience", type=SearchFieldDataType.String),
+        SearchableField(name="languages", collection=True, filterable=True),
+        SearchableField(name="personalHonors", collection=True),
+        SearchableField(name="publications", type=SearchFieldDataType.String),
+        SearchableField(name="patents", type=SearchFieldDataType.String),
+        SearchableField(name="projects", type=SearchFieldDataType.String),
+        SearchableField(name="certificates", collection=True),
+        SearchableField(name="relatedPersons", collection=True, filterable=True),
+        SearchableField(name="academicAchievements", type=SearchFieldDataType.String),
+        SearchableField(name="politicalStance", type=SearchFieldDataType.String, filterable=True),
+        SearchableField(name="socialActivities", type=SearchFieldDataType.String),
+        SearchableField(name="chinaRelated", type=SearchFieldDataType.String),
+        SearchableField(name="relatedUrls", collection=True),
+        SearchableField(name="notes", type=SearchFieldDataType.String),
+        ComplexField(name="relationships", collection=True, fields=[
+            SimpleField(name="target_id", type=SearchFieldDataType.String),
+            SearchableField(name="target_name", type=SearchFieldDataType.String, filterable=True),
+            SimpleField(name="relationship_type", type=SearchFieldDataType.String, filterable=True),
+            SearchableField(name="relationship_description", type=SearchFieldDataType.String),
+            SimpleField(name="confidence", type=SearchFieldDataType.Double, filterable=True, sortable=True)
+        ])
+    ]
+
+# 索引字段名 → 类型，推送文档时按类型转换字段值
+INDEX_FIELD_TYPES = {field.name: field.type for field in build_index_fields()}
+STRING_COLLECTION = SearchFieldDataType.Collection(SearchFieldDataType.String)
+RELATIONSHIP_KEYS = ["target_id", "target_name", "relationship_type", "relationship_description", "confidence"]
+
+def to_search_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """把实体文档转换为索引文档
+    
+    只保留索引中的字段，字符串字段中的列表和字典序列化为JSON；
+    缺失的字段显式置空，merge_or_upload 时清除索引中的旧值。
+    """
+    result = {}
+    for name, field_type in INDEX_FIELD_TYPES.items():
+        value = document.get(name)
+        if value is None:
+            result[name] = None
+            continue
+        if name == "relationships":
+            value = [{key: item.get(key) for key in RELATIONSHIP_KEYS} for item in value if isinstance(item, dict)]
+        elif field_type == STRING_COLLECTION:
+            value = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+                     for item in (value if isinstance(value, list) else [value])]
+        elif field_type == SearchFieldDataType.String and not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        result[name] = value
+    return result
+
+class AISearchService(SearchBackend):
+    def __init__(self, transport=None):
         self.credential = AzureKeyCredential(AZURE_SEARCH_KEY)
+        client_kwargs = {"transport": transport} if transport else {}
         self.index_client = SearchIndexClient(
             endpoint=AZURE_SEARCH_ENDPOINT,
-            credential=self.credential
+            credential=self.credential,
+            **client_kwargs
+        )
+        # 数据源、技能组和索引器由 SearchIndexerClient 管理
+        self.indexer_client = SearchIndexerClient(
+            endpoint=AZURE_SEARCH_ENDPOINT,
+            credential=self.credential,
+            **client_kwargs
         )
         self.search_client = SearchClient(
             endpoint=AZURE_SEARCH_ENDPOINT,
             credential=self.credential,
-            index_name=AZURE_SEARCH_INDEX_NAME
+            index_name=AZURE_SEARCH_INDEX_NAME,
+            **client_kwargs
         )
     
+    def close(self):
+        """关闭搜索客户端"""
+        self.search_client.close()
+        self.index_client.close()
+        self.indexer_client.close()
+    
     def initialize_search_service(self):
-        """初始化Azure AI Search服务"""
+        """初始化Azure AI Search服务
+        
+        SEARCH_INDEXING_MODE为push时实体变更由 SearchIndexQueue 推送到索引，只创建索引并删除旧的索引器；
+        为pull时由索引器定期从Cosmos DB全量拉取。
+        """
         try:
             # 1. 创建索引
             self._create_index()
             
+            if SEARCH_INDEXING_MODE == "push":
+                self._delete_indexer()
+                return True
+            
             # 2. 创建数据源连接
             self._create_data_source()
             
@@ -68,52 +175,7 @@ class AISearchService:
     def _create_index(self):
         """创建或更新索引"""
         try:
-            # 定义索引字段
-            fields = [
-                SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
-                SearchableField(name="name", type=SearchFieldDataType.String, filterable=True, sortable=True),
-                SearchableField(name="domain", type=SearchFieldDataType.String, filterable=True),
-                SearchableField(name="gender", type=SearchFieldDataType.String, filterable=True),
-                SearchableField(name="birthDate", type=SearchFieldDataType.String),
-                SearchableField(name="country", type=SearchFieldDataType.String, filterable=True),
-                SearchableField(name="position", type=SearchFieldDataType.String, filterable=True),
-                SearchableField(name="address", type=SearchFieldDataType.String),
-                SearchableField(name="phone", type=SearchFieldDataType.String),
-                SearchableField(name="email", type=SearchFieldDataType.String),
-                SearchableField(name="fax", type=SearchFieldDataType.String),
-                SearchableField(name="idCard", type=SearchFieldDataType.String),
-                SearchableField(name="passportNumber", type=SearchFieldDataType.String),
-                SearchableField(name="researchFields", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True),
-                SearchableField(name="personalDescription", type=SearchFieldDataType.String),
-                SearchableField(name="weiboUrl", type=SearchFieldDataType.String),
-                SearchableField(name="socialAccounts", type=SearchFieldDataType.String),
-                SearchableField(name="familyStatus", type=SearchFieldDataType.String),
-                SearchableField(name="socialRelationships", type=SearchFieldDataType.String),
-                SearchableField(name="workExperience", type=SearchFieldDataType.String),
-                SearchableField(name="educationExperience", type=SearchFieldDataType.String),
-                SearchableField(name="skills", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True),
-                SearchableField(name="volunteerExperience", type=SearchFieldDataType.String),
-                SearchableField(name="languages", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True),
-                SearchableField(name="personalHonors", type=SearchFieldDataType.Collection(SearchFieldDataType.String)),
-                SearchableField(name="publications", type=SearchFieldDataType.String),
-                SearchableField(name="patents", type=SearchFieldDataType.String),
-                SearchableField(name="projects", type=SearchFieldDataType.String),
-                SearchableField(name="certificates", type=SearchFieldDataType.Collection(SearchFieldDataType.String)),
-                SearchableField(name="relatedPersons", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True),
-                SearchableField(name="academicAchievements", type=SearchFieldDataType.String),
-                SearchableField(name="politicalStance", type=SearchFieldDataType.String, filterable=True),
-                SearchableField(name="socialActivities", type=SearchFieldDataType.String),
-                SearchableField(name="chinaRelated", type=SearchFieldDataType.String),
-                SearchableField(name="relatedUrls", type=SearchFieldDataType.Collection(SearchFieldDataType.String)),
-                SearchableField(name="notes", type=SearchFieldDataType.String),
-                ComplexField(name="relationships", fields=[
-                    SimpleField(name="target_id", type=SearchFieldDataType.String),
-                    SearchableField(name="target_name", type=SearchFieldDataType.String, filterable=True),
-                    SimpleField(name="relationship_type", type=SearchFieldDataType.String, filterable=True),
-                    SearchableField(name="relationship_description", type=SearchFieldDataType.String),
-                    SimpleField(name="confidence", type=SearchFieldDataType.Double, filterable=True, sortable=True)
-                ])
-            ]
+            fields = build_index_fields()
             
             # 创建索引定义
             index = SearchIndex(name=AZURE_SEARCH_INDEX_NAME, fields=fields)
@@ -135,7 +197,7 @@ class AISearchService:
                 container={"name": COSMOS_ENTITIES_CONTAINER}
             )
             
-            self.index_client.create_or_update_data_source_connection(data_source_connection)
+            self.indexer_client.create_or_update_data_source_connection(data_source_connection)
             logger.info(f"数据源连接 {data_source_connection.name} 创建或更新成功")
         except Exception as e:
             logger.error(f"创建数据源连接失败: {str(e)}")
@@ -221,7 +283,7 @@ class AISearchService:
                 skills=skills
             )
             
-            self.index_client.create_or_update_skillset(skillset)
+            self.indexer_client.create_or_update_skillset(skillset)
             logger.info(f"技能组 {AZURE_SEARCH_SKILLSET_NAME} 创建或更新成功")
         except Exception as e:
             logger.error(f"创建技能组失败: {str(e)}")
@@ -267,12 +329,30 @@ class AISearchService:
                 }
             )
             
-            self.index_client.create_or_update_indexer(indexer)
+            self.indexer_client.create_or_update_indexer(indexer)
             logger.info(f"索引器 {indexer.name} 创建或更新成功")
         except Exception as e:
             logger.error(f"创建索引器失败: {str(e)}")
             raise
     
+    def _delete_indexer(self):
+        """删除拉取模式的索引器，避免与推送重复写入"""
+        try:
+            self.indexer_client.delete_indexer(f"{AZURE_SEARCH_INDEX_NAME}-indexer")
+            logger.info("已删除拉取模式的索引器")
+        except ResourceNotFoundError:
+            pass
+    
+    def index_documents(self, uploads: List[Dict[str, Any]], deletes: List[str]) -> list:
+        """在一次请求中推送文档(merge_or_upload)和删除文档，返回逐项的IndexingResult"""
+        batch = IndexDocumentsBatch()
+        if uploads:
+            batch.add_merge_or_upload_actions(uploads)
+        if deletes:
+            batch.add_delete_actions([{"id": entity_id} for entity_id in deletes])
+        # 部分失败时返回207而不抛出异常，由调用方按逐项结果重试；请求过大时SDK自动对半拆分
+        return self.search_client.index_documents(batch)
+    
     def search_entities(self, search_text: str, filter_condition: str = None, top: int = 50) -> List[Dict[str, Any]]:
         """搜索实体"""
         try:
@@ -0,0 +1,468 @@
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
+from ..config.settings import (
+    COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE,
+    COSMOS_ENTITIES_CONTAINER, COSMOS_RELATIONSHIPS_CONTAINER,
+    COSMOS_MAX_CONCURRENCY, COSMOS_MAX_RETRIES, ENTITY_PAGE_SIZE
+)
+from ..models.entity import Entity, Relationship, RelationshipEdge
+from .cosmos_service import (
+    PartitionKeyIndex, build_entity_query, strip_system_fields,
+    group_into_batches, retry_delay, bulk_result
+)
+from .entity_filters import EntityFilter
+from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator, Callable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AsyncCosmosDBService:
+    """基于 azure.cosmos.aio 的异步数据访问层
+    
+    供 async 路由直接 await，避免同步SDK调用阻塞事件循环；
+    关系边、批量写入和分页查询只在此实现，CosmosDBService 仅负责建库建容器和实体的基本读写。
+    """
+    
+    def __init__(self, transport=None):
+        # transport为共享的aiohttp传输层，由服务注册表统一创建
+        client_kwargs = {"transport": transport} if transport else {}
+        self.client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY, **client_kwargs)
+        self.database = self.client.get_database_client(COSMOS_DATABASE)
+        self.entities_container = self.database.get_container_client(COSMOS_ENTITIES_CONTAINER)
+        self.relationships_container = self.database.get_container_client(COSMOS_RELATIONSHIPS_CONTAINER)
+        self.partition_index = PartitionKeyIndex()
+        self._change_listeners: List[Callable[[str, Dict[str, Any]], Any]] = []
+    
+    def add_change_listener(self, listener: Callable[[str, Dict[str, Any]], Any]) -> None:
+        """注册写入变更监听器
+        
+        监听器以 (事件, 文档) 调用，事件为 entity_upserted、entity_deleted、
+        edge_upserted、edge_deleted 之一；可以是普通函数或协程函数。
+        """
+        self._change_listeners.append(listener)
+    
+    async def _notify(self, event: str, document: Dict[str, Any]) -> None:
+        for listener in self._change_listeners:
+            try:
+                result = listener(event, document)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"变更监听器处理 {event} 失败: {str(e)}")
+    
+    async def close(self):
+        """关闭客户端"""
+        await self.client.close()
+    
+    async def initialize_database(self):
+        """初始化数据库和容器"""
+        try:
+            self.database = await self.client.create_database_if_not_exists(COSMOS_DATABASE)
+            self.entities_container = await self.database.create_container_if_not_exists(
+                id=COSMOS_ENTITIES_CONTAINER,
+                partition_key=PartitionKey(path="/name")
+            )
+            self.relationships_container = await self.database.create_container_if_not_exists(
+                id=COSMOS_RELATIONSHIPS_CONTAINER,
+                partition_key=PartitionKey(path="/source_id")
+            )
+            return True
+        except Exception as e:
+            logger.error(f"初始化数据库失败: {str(e)}")
+            return False
+    
+    async def create_entity(self, entity: Entity) -> Dict[str, Any]:
+        """创建一个新的实体"""
+        try:
+            result = await self.entities_container.create_item(entity.dict())
+            self.partition_index.put(result["id"], result["name"])
+            await self._notify("entity_upserted", result)
+            return result
+        except Exception as e:
+            logger.error(f"创建实体失败: {str(e)}")
+            raise
+    
+    async def _execute_batch(self, container, partition_key: str, documents: List[Dict[str, Any]],
+                             indexes: List[int], results: List[Optional[Dict[str, Any]]]) -> None:
+        """以事务批次upsert同一分区的文档，结果按下标写入results
+        
+        批次中某个操作失败时整批回滚，记录该文档的错误后重新提交其余文档；
+        被限流(429)时按服务端建议的间隔退避重试，请求过大(413)时对半拆分。
+        container为实体容器或关系容器，写入成功的文档分别以entity_upserted、edge_upserted通知监听器。
+        """
+        is_entity = container is self.entities_container
+        pending = list(indexes)
+        attempt = 0
+        while pending:
+            operations = [("upsert", (documents[index],)) for index in pending]
+            try:
+                responses = await container.execute_item_batch(operations, partition_key=partition_key)
+            except exceptions.CosmosBatchOperationError as e:
+                if e.status_code == 429 and attempt < COSMOS_MAX_RETRIES:
+                    await asyncio.sleep(retry_delay(e, attempt))
+                    attempt += 1
+                    continue
+                failed = pending.pop(e.error_index)
+                results[failed] = bulk_result(documents[failed], e.status_code, e.message)
+                continue
+            except exceptions.CosmosHttpResponseError as e:
+                if e.status_code == 429 and attempt < COSMOS_MAX_RETRIES:
+                    await asyncio.sleep(retry_delay(e, attempt))
+                    attempt += 1
+                    continue
+                if e.status_code == 413 and len(pending) > 1:
+                    half = len(pending) // 2
+                    await self._execute_batch(container, partition_key, documents, pending[:half], results)
+                    await self._execute_batch(container, partition_key, documents, pending[half:], results)
+                    return
+                for index in pending:
+                    results[index] = bulk_result(documents[index], e.status_code, e.message)
+                return
+            
+            for index, response in zip(pending, responses):
+                results[index] = bulk_result(documents[index], int(response["statusCode"]))
+                if is_entity:
+                    self.partition_index.put(documents[index]["id"], partition_key)
+                await self._notify("entity_upserted" if is_entity else "edge_upserted",
+                                   response.get("resourceBody") or documents[index])
+            return
+    
+    async def bulk_upsert_entities(self, documents: List[Dict[str, Any]],
+                                   max_concurrency: int = COSMOS_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+        """批量upsert已校验的实体文档
+        
+        文档按分区键分组为事务批次，最多max_concurrency个批次同时在途。
+        返回与输入顺序一致的逐项结果(id、status_code、success、error)。
+        """
+        try:
+            results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+            semaphore = asyncio.Semaphore(max_concurrency)
+            
+            async def run(partition_key: str, indexes: List[int]):
+                async with semaphore:
+                    await self._execute_batch(self.entities_container, partition_key, documents, indexes, results)
+            
+            await asyncio.gather(*(run(partition_key, indexes)
+                                   for partition_key, indexes in group_into_batches(documents)))
+            return results
+        except Exception as e:
+            logger.error(f"批量写入实体失败: {str(e)}")
+            raise
+    
+    async def _query_item(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """通过跨分区查询按ID获取实体文档(分区键未知时的回退路径)"""
+        query = "SELECT * FROM c WHERE c.id = @id"
+        params = [{"name": "@id", "value": entity_id}]
+        async for item in self.entities_container.query_items(query=query, parameters=params):
+            return item
+        return None
+    
+    async def _read_item(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取实体文档，优先使用id+分区键点读"""
+        partition_key = self.partition_index.get(entity_id)
+        if partition_key is not None:
+            try:
+                return await self.entities_container.read_item(item=entity_id, partition_key=partition_key)
+            except exceptions.CosmosResourceNotFoundError:
+                # 索引已过期(实体被删除或改名)，回退到查询并修正索引
+                self.partition_index.discard(entity_id)
+        
+        item = await self._query_item(entity_id)
+        if item:
+            self.partition_index.put(item["id"], item["name"])
+        return item
+    
+    async def get_entity(self, entity_id: str) -> Optional[Entity]:
+        """根据ID获取实体"""
+        try:
+            item = await self._read_item(entity_id)
+            if item:
+                return Entity(**item)
+            return None
+        except Exception as e:
+            logger.error(f"获取实体失败: {str(e)}")
+            raise
+    
+    async def _query_items_by_ids(self, entity_ids: List[str]) -> List[Dict[str, Any]]:
+        """用一次IN查询批量获取实体文档"""
+        query = "SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+        params = [{"name": "@ids", "value": entity_ids}]
+        items = []
+        async for item in self.entities_container.query_items(query=query, parameters=params):
+            self.partition_index.put(item["id"], item["name"])
+            items.append(item)
+        return items
+    
+    async def get_entities(self, entity_ids: List[str]) -> Tuple[List[Entity], List[str]]:
+        """批量获取实体，按输入顺序返回找到的实体和不存在的ID列表
+        
+        分区键已知的ID以有限并发点读获取，其余ID(及点读未命中的ID)合并为一次IN查询。
+        """
+        try:
+            unique_ids = list(dict.fromkeys(entity_ids))
+            if not unique_ids:
+                return [], []
+            
+            found: Dict[str, Dict[str, Any]] = {}
+            semaphore = asyncio.Semaphore(COSMOS_MAX_CONCURRENCY)
+            
+            async def point_read(entity_id: str, partition_key: str):
+                async with semaphore:
+                    try:
+                        found[entity_id] = await self.entities_container.read_item(
+                            item=entity_id, partition_key=partition_key
+                        )
+                    except exceptions.CosmosResourceNotFoundError:
+                        self.partition_index.discard(entity_id)
+            
+            routed = [(entity_id, self.partition_index.get(entity_id)) for entity_id in unique_ids]
+            await asyncio.gather(*(
+                point_read(entity_id, partition_key)
+                for entity_id, partition_key in routed if partition_key is not None
+            ))
+            
+            unresolved = [entity_id for entity_id in unique_ids if entity_id not in found]
+            if unresolved:
+                for item in await self._query_items_by_ids(unresolved):
+                    found[item["id"]] = item
+            
+            entities = [Entity(**found[entity_id]) for entity_id in unique_ids if entity_id in found]
+            missing = [entity_id for entity_id in unique_ids if entity_id not in found]
+            return entities, missing
+        except Exception as e:
+            logger.error(f"批量获取实体失败: {str(e)}")
+            raise
+    
+    async def _replace_document(self, item_dict: Dict[str, Any], old_partition_key: str) -> Dict[str, Any]:
+        """保存实体文档；分区键(name)变化时删除旧分区中的文档"""
+        result = await self.entities_container.upsert_item(item_dict)
+        if result["name"] != old_partition_key:
+            await self.entities_container.delete_item(result["id"], partition_key=old_partition_key)
+        self.partition_index.put(result["id"], result["name"])
+        await self._notify("entity_upserted", result)
+        return result
+    
+    async def update_entity(self, entity_id: str, entity_data: Dict[str, Any]) -> Dict[str, Any]:
+        """更新实体信息"""
+        try:
+            item = await self.get_entity(entity_id)
+            if not item:
+                raise ValueError(f"实体 {entity_id} 不存在")
+            
+            item_dict = item.dict()
+            item_dict.update(entity_data)
+            
+            return await self._replace_document(item_dict, item.name)
+        except Exception as e:
+            logger.error(f"更新实体失败: {str(e)}")
+            raise
+    
+    async def delete_entity(self, entity_id: str) -> None:
+        """删除实体"""
+        try:
+            item = await self._read_item(entity_id)
+            if not item:
+                raise ValueError(f"实体 {entity_id} 不存在")
+            
+            await self.entities_container.delete_item(item["id"], partition_key=item["name"])
+            self.partition_index.discard(entity_id)
+            await self.delete_relationship_edges(entity_id)
+            await self._notify("entity_deleted", item)
+        except Exception as e:
+            logger.error(f"删除实体失败: {str(e)}")
+            raise
+    
+    async def list_entities(self, filters: Optional[List[EntityFilter]] = None) -> List[Entity]:
+        """列出所有实体，可选过滤条件"""
+        try:
+            query, parameters = build_entity_query(filters)
+            entities = []
+            async for item in self.entities_container.query_items(query=query, parameters=parameters):
+                self.partition_index.put(item["id"], item["name"])
+                entities.append(Entity(**item))
+            return entities
+        except Exception as e:
+            logger.error(f"列出实体失败: {str(e)}")
+            raise
+    
+    def _query_pages(self, filters: Optional[List[EntityFilter]], page_size: int,
+                     continuation: Optional[str], fields: Optional[List[str]]):
+        query, parameters = build_entity_query(filters, fields)
+        return self.entities_container.query_items(
+            query=query,
+            parameters=parameters,
+            max_item_count=page_size
+        ).by_page(continuation)
+    
+    async def list_entities_page(self, filters: Optional[List[EntityFilter]] = None,
+                                 page_size: int = ENTITY_PAGE_SIZE,
+                                 continuation: Optional[str] = None,
+                                 fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """分页列出实体文档，返回当前页和下一页的continuation令牌"""
+        try:
+            pager = self._query_pages(filters, page_size, continuation, fields)
+            
+            items = []
+            async for page in pager:
+                async for item in page:
+                    self.partition_index.put(item["id"], item["name"])
+                    items.append(strip_system_fields(item))
+                break
+            
+            return {"items": items, "continuation": pager.continuation_token}
+        except Exception as e:
+            logger.error(f"分页列出实体失败: {str(e)}")
+            raise
+    
+    async def iter_entities(self, filters: Optional[List[EntityFilter]] = None,
+                            fields: Optional[List[str]] = None,
+                            page_size: int = ENTITY_PAGE_SIZE) -> AsyncGenerator[Dict[str, Any], None]:
+        """逐页流式读取实体文档，内存中最多只保留一页结果"""
+        pager = self._query_pages(filters, page_size, None, fields)
+        async for page in pager:
+            async for item in page:
+                self.partition_index.put(item["id"], item["name"])
+                yield strip_system_fields(item)
+    
+    async def upsert_relationship_edge(self, edge: RelationshipEdge) -> Dict[str, Any]:
+        """写入一条关系边，边ID由源和目标确定，无需先读取"""
+        result = await self.relationships_container.upsert_item(edge.dict())
+        await self._notify("edge_upserted", result)
+        return result
+    
+    async def bulk_upsert_relationship_edges(self, edges: List[RelationshipEdge],
+                                             max_concurrency: int = COSMOS_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+        """批量写入关系边
+        
+        边按源实体(分区键source_id)分组为事务批次，同一实体的出边一次请求写入，
+        最多max_concurrency个批次同时在途。返回与输入顺序一致的逐项结果(id、status_code、success、error)。
+        """
+        try:
+            documents = [edge.dict() for edge in edges]
+            results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+            semaphore = asyncio.Semaphore(max_concurrency)
+            
+            async def run(partition_key: str, indexes: List[int]):
+                async with semaphore:
+                    await self._execute_batch(self.relationships_container, partition_key, documents, indexes, results)
+            
+            await asyncio.gather(*(run(partition_key, indexes)
+                                   for partition_key, indexes in group_into_batches(documents, partition_field="source_id")))
+            return results
+        except Exception as e:
+            logger.error(f"批量写入关系失败: {str(e)}")
+            raise
+    
+    async def find_entity_ids_by_names(self, names: List[str]) -> Dict[str, List[str]]:
+        """按姓名批量查找已有实体，返回 姓名 → 实体ID列表(同名实体可能有多个)"""
+        try:
+            unique_names = list(dict.fromkeys(name for name in names if name))
+            found: Dict[str, List[str]] = {}
+            # 每次查询的姓名数有限，避免参数过大
+            for start in range(0, len(unique_names), 256):
+                items = self.entities_container.query_items(
+                    query="SELECT c.id, c.name FROM c WHERE ARRAY_CONTAINS(@names, c.name)",
+                    parameters=[{"name": "@names", "value": unique_names[start:start + 256]}]
+                )
+                async for item in items:
+                    self.partition_index.put(item["id"], item["name"])
+                    found.setdefault(item["name"], []).append(item["id"])
+            return found
+        except Exception as e:
+            logger.error(f"按姓名查找实体失败: {str(e)}")
+            raise
+    
+    async def add_relationship(self, source_id: str, relationship: Relationship) -> Dict[str, Any]:
+        """添加实体之间的关系"""
+        try:
+            # 检查源实体和目标实体是否存在(点读)
+            source_item, target_item = await asyncio.gather(
+                self._read_item(source_id),
+                self._read_item(relationship.target_id)
+            )
+            if not source_item:
+                raise ValueError(f"源实体 {source_id} 不存在")
+            if not target_item:
+                raise ValueError(f"目标实体 {relationship.target_id} 不存在")
+            
+            # 关系作为独立的边文档写入关系容器，已存在时覆盖
+            edge = RelationshipEdge.from_relationship(source_id, relationship, source_item["name"])
+            return await self.upsert_relationship_edge(edge)
+        except Exception as e:
+            logger.error(f"添加关系失败: {str(e)}")
+            raise
+    
+    async def get_relationship_edges(self, entity_id: str) -> List[RelationshipEdge]:
+        """获取实体的出边(单分区查询)"""
+        items = self.relationships_container.query_items(
+            query="SELECT * FROM c WHERE c.source_id = @id",
+            parameters=[{"name": "@id", "value": entity_id}],
+            partition_key=entity_id
+        )
+        return [RelationshipEdge(**item) async for item in items]
+    
+    async def get_incoming_relationship_edges(self, entity_id: str) -> List[RelationshipEdge]:
+        """获取指向实体的入边(按target_id索引的跨分区查询)"""
+        items = self.relationships_container.query_items(
+            query="SELECT * FROM c WHERE c.target_id = @id",
+            parameters=[{"name": "@id", "value": entity_id}]
+        )
+        return [RelationshipEdge(**item) async for item in items]
+    
+    async def delete_relationship_edges(self, entity_id: str) -> None:
+        """删除实体的所有出边和入边"""
+        outgoing, incoming = await asyncio.gather(
+            self.get_relationship_edges(entity_id),
+            self.get_incoming_relationship_edges(entity_id)
+        )
+        semaphore = asyncio.Semaphore(COSMOS_MAX_CONCURRENCY)
+        
+        async def delete(edge: RelationshipEdge):
+            async with semaphore:
+                try:
+                    await self.relationships_container.delete_item(edge.id, partition_key=edge.source_id)
+                except exceptions.CosmosResourceNotFoundError:
+                    return
+                await self._notify("edge_deleted", edge.dict())
+        
+        await asyncio.gather(*(delete(edge) for edge in outgoing + incoming))
+    
+    async def get_relationships(self, entity_id: str) -> List[Relationship]:
+        """获取实体的所有关系"""
+        try:
+            edges = await self.get_relationship_edges(entity_id)
+            if edges:
+                return [edge.to_relationship() for edge in edges]
+            
+            # 没有边文档时回退到尚未迁移的内嵌关系，同时校验实体是否存在
+            entity = await self.get_entity(entity_id)
+            if not entity:
+                raise ValueError(f"实体 {entity_id} 不存在")
+            return entity.relationships
+        except Exception as e:
+            logger.error(f"获取关系失败: {str(e)}")
+            raise
+    
+    async def iter_relationship_edges(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """遍历关系容器中的所有边(只读取构图所需字段)"""
+        query = "SELECT c.source_id, c.target_id, c.relationship_type, c.confidence FROM c"
+        async for item in self.relationships_container.query_items(query=query):
+            yield item
+    
+    async def iter_embedded_relationships(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """遍历仍带有内嵌关系数组的实体(id、name、relationships)，用于迁移"""
+        query = (
+            "SELECT c.id, c.name, c.relationships FROM c "
+            "WHERE IS_DEFINED(c.relationships) AND ARRAY_LENGTH(c.relationships) > 0"
+        )
+        async for item in self.entities_container.query_items(query=query):
+            yield item
+    
+    async def clear_embedded_relationships(self, entity_id: str, partition_key: str) -> None:
+        """清空实体文档中的内嵌关系数组"""
+        await self.entities_container.patch_item(
+            item=entity_id,
+            partition_key=partition_key,
+            patch_operations=[{"op": "set", "path": "/relationships", "value": []}]
+        )
@@ -21,14 +21,19 @@ from ..config.settings import (
     AZURE_GPT4O_MINI_DEPLOYMENT_NAME
 )
 from ..models.entity import Entity, Relationship
+from .llm_scheduler import LLMScheduler
+from .scheduled_model_client import ScheduledChatCompletionClient
 
 logger = logging.getLogger(__name__)
 
 class AutoGenService:
-    def __init__(self):
+    def __init__(self, scheduler: Optional[LLMScheduler] = None):
+        self._cache = None  # 懒加载缓存
+        self._disk_cache = None
+        # 智能体的模型调用经共享调度器按部署配额排队，优先于批量提取
+        self.scheduler = scheduler
         # 初始化智能体
         self.initialize_agents()
-        self._cache = None  # 懒加载缓存
     
     def _get_or_create_cache(self):
         """懒加载模型缓存"""
@@ -37,20 +42,38 @@ class AutoGenService:
             # 确保缓存目录存在
             cache_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'cache')
             os.makedirs(cache_dir, exist_ok=True)
-            cache_store = DiskCacheStore(Cache(cache_dir))
+            self._disk_cache = Cache(cache_dir)
+            cache_store = DiskCacheStore(self._disk_cache)
             self._cache = cache_store
         return self._cache
     
+    async def close(self):
+        """释放模型客户端和磁盘缓存"""
+        for model in (self.gpt4o_model, self.gpt4o_mini_model):
+            close = getattr(model, "close", None)
+            if close is not None:
+                await close()
+        if self._disk_cache is not None:
+            self._disk_cache.close()
+            self._disk_cache = None
+            self._cache = None
+    
     def initialize_agents(self):
         """初始化智能体组"""
+        # 使用调度器时429由调度器按令牌桶暂停和重新排队，客户端不再各自重试
+        client_options = {"max_retries": 0} if self.scheduler is not None else {}
+        
         # 配置 GPT-4o
         self.gpt4o_model = OpenAIChatCompletionClient(
             model=AZURE_GPT4O_DEPLOYMENT_NAME,
             api_key=AZURE_OPENAI_API_KEY,
             api_base=AZURE_OPENAI_ENDPOINT,
             api_type="azure",
-            api_version=AZURE_OPENAI_API_VERSION
+            api_version=AZURE_OPENAI_API_VERSION,
+            **client_options
         )
+        if self.scheduler is not None:
+            self.gpt4o_model = ScheduledChatCompletionClient(self.gpt4o_model, self.scheduler, AZURE_GPT4O_DEPLOYMENT_NAME)
         
         # 添加缓存支持
         cache_store = self._get_or_create_cache()
@@ -62,8 +85,13 @@ class AutoGenService:
             api_key=AZURE_OPENAI_API_KEY,
             api_base=AZURE_OPENAI_ENDPOINT,
             api_type="azure",
-            api_version=AZURE_OPENAI_API_VERSION
+            api_version=AZURE_OPENAI_API_VERSION,
+            **client_options
         )
+        if self.scheduler is not None:
+            self.gpt4o_mini_model = ScheduledChatCompletionClient(
+                self.gpt4o_mini_model, self.scheduler, AZURE_GPT4O_MINI_DEPLOYMENT_NAME
+            )
         
         # 创建智能体
         self.user_proxy = UserProxyAgent(
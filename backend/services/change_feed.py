@@ -0,0 +1,378 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+import math
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from azure.cosmos import exceptions
+
+from ..config.settings import (
+    CHANGE_FEED_LEASE_PATH, CHANGE_FEED_LEASE_SECONDS, CHANGE_FEED_BATCH_SIZE, CHANGE_FEED_POLL_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# 处理器回调: 以一批变更文档调用，返回后才写入检查点(至少一次投递，处理需幂等)
+ChangeHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+def listener_handler(listener: Callable[[str, Dict[str, Any]], Any], event: str) -> ChangeHandler:
+    """把 add_change_listener 风格的监听器(事件, 文档)包装为批量处理器"""
+    async def handle(documents: List[Dict[str, Any]]) -> None:
+        for document in documents:
+            result = listener(event, document)
+            if asyncio.iscoroutine(result):
+                await result
+    return handle
+
+class LeaseLost(Exception):
+    """分区租约已被其他处理器实例接管"""
+
+class ChangeFeedLeaseStore:
+    """变更源分区租约和检查点(SQLite)
+    
+    每个 (处理器名, 分区) 一条租约，记录续读位置(continuation)和持有者。同一处理器名的多个实例
+    (多个进程)按租约分摊分区，持有者超过 lease_seconds 未续约时租约可被其他实例接管；
+    实例数变化时按 分区数/活跃实例数 重新均衡。
+    """
+    
+    def __init__(self, path: str = CHANGE_FEED_LEASE_PATH, lease_seconds: float = CHANGE_FEED_LEASE_SECONDS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS leases (
+                processor TEXT NOT NULL,
+                feed_range TEXT NOT NULL,
+                continuation TEXT,
+                owner TEXT,
+                expires_at REAL,
+                updated_at REAL,
+                PRIMARY KEY (processor, feed_range)
+            )"""
+        )
+        # 活跃实例，每次领取租约时续期，用于计算均摊份额
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS owners (
+                processor TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (processor, owner)
+            )"""
+        )
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def ensure(self, processor: str, ranges: List[Tuple[str, List[str]]]) -> None:
+        """为新出现的分区创建租约；分区拆分产生的子分区从父分区的检查点继续，父分区租约删除"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = dict(self._conn.execute(
+                    "SELECT feed_range, continuation FROM leases WHERE processor = ?", (processor,)
+                ).fetchall())
+                for feed_range, parents in ranges:
+                    if feed_range in existing:
+                        continue
+                    continuation = next((existing[parent] for parent in parents if existing.get(parent)), None)
+                    self._conn.execute(
+                        "INSERT INTO leases (processor, feed_range, continuation, updated_at) VALUES (?, ?, ?, ?)",
+                        (processor, feed_range, continuation, time.time())
+                    )
+                parents = {parent for _, range_parents in ranges for parent in range_parents}
+                current = {feed_range for feed_range, _ in ranges}
+                for feed_range in parents & set(existing) - current:
+                    self._conn.execute(
+                        "DELETE FROM leases WHERE processor = ? AND feed_range = ?", (processor, feed_range)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"创建变更源租约失败: {str(e)}")
+                raise
+    
+    def acquire(self, processor: str, owner: str) -> Dict[str, Optional[str]]:
+        """续约已持有的租约，并领取空闲或过期的租约直到达到均摊份额，返回持有的 分区 → continuation"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO owners (processor, owner, expires_at) VALUES (?, ?, ?)",
+                    (processor, owner, now + self.lease_seconds)
+                )
+                self._conn.execute("DELETE FROM owners WHERE processor = ? AND expires_at < ?", (processor, now))
+                active = self._conn.execute(
+                    "SELECT COUNT(*) FROM owners WHERE processor = ?", (processor,)
+                ).fetchone()[0]
+                rows = self._conn.execute(
+                    "SELECT feed_range, continuation, owner, expires_at FROM leases WHERE processor = ? ORDER BY feed_range",
+                    (processor,)
+                ).fetchall()
+                share = math.ceil(len(rows) / active) if rows else 0
+                owned = {row[0]: row[1] for row in rows if row[2] == owner}
+                # 超出份额的租约释放给新加入的实例
+                for feed_range in list(owned)[share:]:
+                    self._conn.execute(
+                        "UPDATE leases SET owner = NULL, expires_at = NULL WHERE processor = ? AND feed_range = ?",
+                        (processor, feed_range)
+                    )
+                    del owned[feed_range]
+                for feed_range, continuation, lease_owner, expires_at in rows:
+                    if len(owned) >= share:
+                        break
+                    if lease_owner is None or expires_at is None or expires_at < now:
+                        owned[feed_range] = continuation
+                expires_at = now + self.lease_seconds
+                self._conn.executemany(
+                    "UPDATE leases SET owner = ?, expires_at = ? WHERE processor = ? AND feed_range = ?",
+                    [(owner, expires_at, processor, feed_range) for feed_range in owned]
+                )
+                self._conn.execute("COMMIT")
+                return owned
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"领取变更源租约失败: {str(e)}")
+                raise
+    
+    def checkpoint(self, processor: str, feed_range: str, owner: str, continuation: Optional[str]) -> None:
+        """记录分区的续读位置，同时续约；租约已不属于owner时抛出LeaseLost"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE leases SET continuation = ?, expires_at = ?, updated_at = ? "
+                "WHERE processor = ? AND feed_range = ? AND owner = ?",
+                (continuation, now + self.lease_seconds, now, processor, feed_range, owner)
+            )
+        if cursor.rowcount == 0:
+            raise LeaseLost(f"处理器 {processor} 分区 {feed_range} 的租约已被接管")
+    
+    def release(self, processor: str, owner: str) -> None:
+        """释放owner持有的全部租约(正常停止时)，其他实例可立即接管"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE leases SET owner = NULL, expires_at = NULL WHERE processor = ? AND owner = ?",
+                (processor, owner)
+            )
+            self._conn.execute("DELETE FROM owners WHERE processor = ? AND owner = ?", (processor, owner))
+    
+    def leases(self, processor: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT feed_range, owner, expires_at, updated_at FROM leases WHERE processor = ? ORDER BY feed_range",
+                (processor,)
+            ).fetchall()
+        return [
+            {"feed_range": feed_range, "owner": owner, "expires_at": expires_at, "updated_at": updated_at}
+            for feed_range, owner, expires_at, updated_at in rows
+        ]
+
+class CosmosChangeFeedSource:
+    """Cosmos DB 容器的变更源，按物理分区(partition key range)读取
+    
+    变更源只包含写入后的最新版本，不包含删除；删除仍由 AsyncCosmosDBService 的变更监听器通知。
+    """
+    
+    def __init__(self, container, start_from_beginning: bool = True):
+        self.container = container
+        self.start_from_beginning = start_from_beginning
+    
+    async def feed_ranges(self) -> List[Tuple[str, List[str]]]:
+        """当前的分区及其父分区(拆分后)"""
+        ranges = self.container.client_connection._ReadPartitionKeyRanges(self.container.container_link)
+        return [(item["id"], item.get("parents") or []) async for item in ranges]
+    
+    async def read(self, feed_range: str, continuation: Optional[str],
+                   max_items: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """从continuation处读取一页变更，返回(文档, 新的continuation)"""
+        headers: Dict[str, Any] = {}
+        
+        def hook(response_headers, _):
+            headers.update(response_headers)
+        
+        pager = self.container.query_items_change_feed(
+            partition_key_range_id=feed_range,
+            continuation=continuation,
+            is_start_from_beginning=continuation is None and self.start_from_beginning,
+            max_item_count=max_items,
+            response_hook=hook
+        )
+        items: List[Dict[str, Any]] = []
+        async for page in pager.by_page():
+            items = [item async for item in page]
+            break
+        return items, headers.get("etag") or continuation
+
+class InMemoryChangeFeed:
+    """进程内的变更源替身，与 CosmosChangeFeedSource 接口相同，用于本地开发和基准测试
+    
+    文档按ID哈希到 partitions 个分区，continuation为分区内的偏移量。
+    record 可直接注册为 AsyncCosmosDBService 的变更监听器。
+    """
+    
+    def __init__(self, partitions: int = 4, events: Tuple[str, ...] = ("entity_upserted",),
+                 start_from_beginning: bool = True):
+        self.partitions: List[List[Dict[str, Any]]] = [[] for _ in range(partitions)]
+        self.events = events
+        self.start_from_beginning = start_from_beginning
+    
+    def append(self, document: Dict[str, Any]) -> None:
+        partition = uuid.uuid5(uuid.NAMESPACE_OID, str(document["id"])).int % len(self.partitions)
+        self.partitions[partition].append(dict(document))
+    
+    def record(self, event: str, document: Dict[str, Any]) -> None:
+        """变更监听器: 记录写入事件"""
+        if event in self.events:
+            self.append(document)
+    
+    async def feed_ranges(self) -> List[Tuple[str, List[str]]]:
+        return [(str(index), []) for index in range(len(self.partitions))]
+    
+    async def read(self, feed_range: str, continuation: Optional[str],
+                   max_items: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        partition = self.partitions[int(feed_range)]
+        if continuation is None:
+            offset = 0 if self.start_from_beginning else len(partition)
+        else:
+            offset = int(continuation)
+        items = partition[offset:offset + max_items]
+        return items, str(offset + len(items))
+
+class ChangeFeedProcessor:
+    """按分区并行读取变更源并分批调用处理器
+    
+    每个持有租约的分区一个读取协程: 读取一页变更，依次交给所有处理器，全部成功后写入检查点；
+    处理器出错时退避后从同一位置重读(至少一次投递)。读到末尾时等待 poll_interval 再读。
+    后台协程按租约时长的三分之一周期续约、领取新分区、放弃已被接管的分区。
+    """
+    
+    def __init__(self, name: str, source, lease_store: ChangeFeedLeaseStore,
+                 handlers: Optional[List[ChangeHandler]] = None, owner: Optional[str] = None,
+                 max_items: int = CHANGE_FEED_BATCH_SIZE, poll_interval: float = CHANGE_FEED_POLL_INTERVAL):
+        self.name = name
+        self.source = source
+        self.lease_store = lease_store
+        self.handlers: List[ChangeHandler] = list(handlers or [])
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_items = max_items
+        self.poll_interval = poll_interval
+        self._readers: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        
+        self.batches = 0
+        self.documents = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_batch_at: Optional[float] = None
+    
+    def add_handler(self, handler: ChangeHandler) -> None:
+        self.handlers.append(handler)
+    
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+    
+    def start(self) -> None:
+        """启动租约管理和分区读取"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def close(self) -> None:
+        """停止读取并释放租约"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        readers = list(self._readers.values())
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(self._task, *readers, return_exceptions=True)
+        self._task = None
+        self._readers = {}
+        try:
+            await asyncio.to_thread(self.lease_store.release, self.name, self.owner)
+        except Exception as e:
+            logger.error(f"释放变更源租约失败: {str(e)}")
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._balance()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                logger.error(f"变更源处理器 {self.name} 领取租约失败: {str(e)}")
+            await asyncio.sleep(self.lease_store.lease_seconds / 3)
+    
+    async def _balance(self) -> None:
+        ranges = await self.source.feed_ranges()
+        await asyncio.to_thread(self.lease_store.ensure, self.name, ranges)
+        owned = await asyncio.to_thread(self.lease_store.acquire, self.name, self.owner)
+        for feed_range in list(self._readers):
+            if feed_range not in owned or self._readers[feed_range].done():
+                self._readers.pop(feed_range).cancel()
+        for feed_range, continuation in owned.items():
+            if feed_range not in self._readers:
+                self._readers[feed_range] = asyncio.create_task(self._read(feed_range, continuation))
+    
+    async def _read(self, feed_range: str, continuation: Optional[str]) -> None:
+        attempt = 0
+        while True:
+            try:
+                documents, next_continuation = await self.source.read(feed_range, continuation, self.max_items)
+                for handler in self.handlers:
+                    if documents:
+                        await handler(documents)
+                await asyncio.to_thread(self.lease_store.checkpoint, self.name, feed_range, self.owner, next_continuation)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLost:
+                logger.info(f"变更源处理器 {self.name} 分区 {feed_range} 已被其他实例接管")
+                return
+            except exceptions.CosmosHttpResponseError as e:
+                if e.status_code == 410:
+                    # 分区已拆分，子分区的租约在下一次均衡时创建并从本分区的检查点继续
+                    logger.info(f"变更源分区 {feed_range} 已拆分")
+                    return
+                attempt = await self._backoff(feed_range, e, attempt)
+                continue
+            except Exception as e:
+                attempt = await self._backoff(feed_range, e, attempt)
+                continue
+            attempt = 0
+            continuation = next_continuation
+            if documents:
+                self.batches += 1
+                self.documents += len(documents)
+                self.last_batch_at = time.time()
+            else:
+                await asyncio.sleep(self.poll_interval)
+    
+    async def _backoff(self, feed_range: str, error: Exception, attempt: int) -> int:
+        self.errors += 1
+        self.last_error = str(error)
+        logger.error(f"变更源处理器 {self.name} 处理分区 {feed_range} 失败: {str(error)}")
+        await asyncio.sleep(min(self.poll_interval * 2 ** attempt, 60.0))
+        return attempt + 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """持有的分区、已处理的批次和文档数、错误数"""
+        return {
+            "owner": self.owner,
+            "owned_ranges": sorted(self._readers),
+            "handlers": len(self.handlers),
+            "batches": self.batches,
+            "documents": self.documents,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_batch_at": self.last_batch_at
+        }
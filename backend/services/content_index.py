@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+import json
+import os
+import time
+import logging
+from typing import List, Dict, Any, Optional
+from ..config.settings import CONTENT_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+class ContentHashIndex:
+    """文件内容哈希索引(SQLite)
+    
+    记录 SHA-256 → (Blob URL, 提取出的实体ID, 提取结果)，重复上传相同内容时
+    直接返回上一次的处理结果，不再上传、解析或调用模型。
+    """
+    
+    def __init__(self, path: str = CONTENT_INDEX_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS content_hashes (
+                content_hash TEXT PRIMARY KEY,
+                file_name TEXT,
+                file_url TEXT,
+                content_type TEXT,
+                entity_ids TEXT,
+                extraction_result TEXT,
+                created_at REAL
+            )"""
+        )
+        self._conn.commit()
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """按内容哈希查找之前的处理结果"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_name, file_url, content_type, entity_ids, extraction_result, created_at "
+                "FROM content_hashes WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        file_name, file_url, content_type, entity_ids, extraction_result, created_at = row
+        return {
+            "content_hash": content_hash,
+            "file_name": file_name,
+            "file_url": file_url,
+            "content_type": content_type,
+            "entity_ids": json.loads(entity_ids),
+            "extraction_result": json.loads(extraction_result) if extraction_result else None,
+            "created_at": created_at
+        }
+    
+    def put(self, content_hash: str, file_name: str, file_url: str, content_type: str,
+            entity_ids: List[str], extraction_result: Optional[Dict[str, Any]] = None) -> None:
+        """记录处理结果，相同哈希覆盖旧记录"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        content_hash, file_name, file_url, content_type, json.dumps(entity_ids),
+                        json.dumps(extraction_result, ensure_ascii=False) if extraction_result is not None else None,
+                        time.time()
+                    )
+                )
+                self._conn.commit()
+        except Exception as e:
+            logger.error(f"保存内容哈希索引失败: {str(e)}")
+            raise
@@ -1,20 +1,119 @@
 from azure.cosmos import CosmosClient, exceptions
 from ..config.settings import (
     COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE,
-    COSMOS_ENTITIES_CONTAINER, COSMOS_RELATIONSHIPS_CONTAINER
+    COSMOS_ENTITIES_CONTAINER, COSMOS_RELATIONSHIPS_CONTAINER,
+    COSMOS_PARTITION_INDEX_SIZE, ENTITY_FIELDS,
+    COSMOS_BATCH_SIZE
 )
-from ..models.entity import Entity, Relationship
-from typing import List, Dict, Any, Optional
+from ..models.entity import Entity
+from .entity_filters import EntityFilter, compile_cosmos_filter
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import random
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 可用于列表投影的字段
+PROJECTABLE_FIELDS = ["id"] + ENTITY_FIELDS + ["relationships"]
+
+def build_select_clause(fields: Optional[List[str]] = None) -> str:
+    """构造SELECT子句，将字段投影下推到Cosmos查询
+    
+    字段必须来自PROJECTABLE_FIELDS白名单，id和name始终返回以便定位实体和填充分区索引。
+    """
+    if not fields:
+        return "SELECT * FROM c"
+    
+    unknown = [field for field in fields if field not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}")
+    
+    selected = list(dict.fromkeys(["id", "name"] + list(fields)))
+    return "SELECT " + ", ".join(f"c.{field}" for field in selected) + " FROM c"
+
+def build_entity_query(filters: Optional[List[EntityFilter]] = None,
+                       fields: Optional[List[str]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """构造参数化的实体查询，返回(查询文本, 参数列表)"""
+    query = build_select_clause(fields)
+    condition, parameters = compile_cosmos_filter(filters)
+    if condition:
+        query = f"{query} WHERE {condition}"
+    return query, parameters
+
+def strip_system_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉Cosmos系统字段(_rid、_etag、_ts等)"""
+    return {key: value for key, value in item.items() if not key.startswith("_")}
+
+def group_into_batches(documents: List[Dict[str, Any]], batch_size: int = COSMOS_BATCH_SIZE,
+                       partition_field: str = "name") -> List[Tuple[str, List[int]]]:
+    """按分区键分组并切分为事务批次，返回(分区键, 文档下标列表)
+    
+    实体按name分区，关系边按source_id分区。事务批次只能包含同一逻辑分区的操作，且每批最多100个操作。
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, document in enumerate(documents):
+        groups.setdefault(document[partition_field], []).append(index)
+    return [
+        (partition_key, indexes[start:start + batch_size])
+        for partition_key, indexes in groups.items()
+        for start in range(0, len(indexes), batch_size)
+    ]
+
+def retry_delay(error: exceptions.CosmosHttpResponseError, attempt: int) -> float:
+    """被限流时的等待秒数: 优先使用服务端返回的x-ms-retry-after-ms，否则指数退避加抖动"""
+    retry_after = (error.headers or {}).get("x-ms-retry-after-ms")
+    if retry_after:
+        return float(retry_after) / 1000
+    return min(0.1 * 2 ** attempt, 10.0) * random.uniform(0.5, 1.0)
+
+def bulk_result(document: Dict[str, Any], status_code: int, error: Optional[str] = None) -> Dict[str, Any]:
+    """批量写入中单个文档的结果"""
+    return {"id": document.get("id"), "status_code": status_code, "success": error is None, "error": error}
+
+class PartitionKeyIndex:
+    """实体id→分区键(name)的进程内路由索引
+
+    实体容器按 /name 分区，只有知道分区键才能做点读。索引在创建、列出、
+    读取实体时填充，超过容量时按LRU淘汰；未命中或过期时由调用方回退到查询。
+    """
+    
+    def __init__(self, max_size: int = COSMOS_PARTITION_INDEX_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, entity_id: str) -> Optional[str]:
+        with self._lock:
+            partition_key = self._items.get(entity_id)
+            if partition_key is not None:
+                self._items.move_to_end(entity_id)
+            return partition_key
+    
+    def put(self, entity_id: str, partition_key: str) -> None:
+        with self._lock:
+            self._items[entity_id] = partition_key
+            self._items.move_to_end(entity_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+    
+    def discard(self, entity_id: str) -> None:
+        with self._lock:
+            self._items.pop(entity_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._items)
+
 class CosmosDBService:
-    def __init__(self):
-        self.client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY)
+    def __init__(self, transport=None):
+        # transport为共享的HTTP传输层，由服务注册表统一创建，多个客户端复用连接池
+        client_kwargs = {"transport": transport} if transport else {}
+        self.client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY, **client_kwargs)
         self.database = self.client.get_database_client(COSMOS_DATABASE)
         self.entities_container = self.database.get_container_client(COSMOS_ENTITIES_CONTAINER)
         self.relationships_container = self.database.get_container_client(COSMOS_RELATIONSHIPS_CONTAINER)
+        self.partition_index = PartitionKeyIndex()
     
     def initialize_database(self):
         """初始化数据库和容器"""
@@ -57,28 +156,58 @@ class CosmosDBService:
     def create_entity(self, entity: Entity) -> Dict[str, Any]:
         """创建一个新的实体"""
         try:
-            return self.entities_container.create_item(entity.dict())
+            result = self.entities_container.create_item(entity.dict())
+            self.partition_index.put(result["id"], result["name"])
+            return result
         except Exception as e:
             logger.error(f"创建实体失败: {str(e)}")
             raise
     
+    def _query_item(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """通过跨分区查询按ID获取实体文档(分区键未知时的回退路径)"""
+        query = "SELECT * FROM c WHERE c.id = @id"
+        params = [{"name": "@id", "value": entity_id}]
+        items = list(self.entities_container.query_items(
+            query=query,
+            parameters=params,
+            enable_cross_partition_query=True
+        ))
+        return items[0] if items else None
+    
+    def _read_item(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取实体文档，优先使用id+分区键点读"""
+        partition_key = self.partition_index.get(entity_id)
+        if partition_key is not None:
+            try:
+                return self.entities_container.read_item(item=entity_id, partition_key=partition_key)
+            except exceptions.CosmosResourceNotFoundError:
+                # 索引已过期(实体被删除或改名)，回退到查询并修正索引
+                self.partition_index.discard(entity_id)
+        
+        item = self._query_item(entity_id)
+        if item:
+            self.partition_index.put(item["id"], item["name"])
+        return item
+    
     def get_entity(self, entity_id: str) -> Optional[Entity]:
         """根据ID获取实体"""
         try:
-            query = f"SELECT * FROM c WHERE c.id = @id"
-            params = [{"name": "@id", "value": entity_id}]
-            items = list(self.entities_container.query_items(
-                query=query,
-                parameters=params,
-                enable_cross_partition_query=True
-            ))
-            if items:
-                return Entity(**items[0])
+            item = self._read_item(entity_id)
+            if item:
+                return Entity(**item)
             return None
         except Exception as e:
             logger.error(f"获取实体失败: {str(e)}")
             raise
     
+    def _replace_document(self, item_dict: Dict[str, Any], old_partition_key: str) -> Dict[str, Any]:
+        """保存实体文档；分区键(name)变化时删除旧分区中的文档"""
+        result = self.entities_container.upsert_item(item_dict)
+        if result["name"] != old_partition_key:
+            self.entities_container.delete_item(result["id"], partition_key=old_partition_key)
+        self.partition_index.put(result["id"], result["name"])
+        return result
+    
     def update_entity(self, entity_id: str, entity_data: Dict[str, Any]) -> Dict[str, Any]:
         """更新实体信息"""
         try:
@@ -92,81 +221,23 @@ class CosmosDBService:
             item_dict.update(entity_data)
             
             # 保存更新后的实体
-            return self.entities_container.upsert_item(item_dict)
+            return self._replace_document(item_dict, item.name)
         except Exception as e:
             logger.error(f"更新实体失败: {str(e)}")
             raise
     
-    def delete_entity(self, entity_id: str) -> None:
-        """删除实体"""
-        try:
-            item = self.get_entity(entity_id)
-            if not item:
-                raise ValueError(f"实体 {entity_id} 不存在")
-                
-            self.entities_container.delete_item(item.id, partition_key=item.name)
-        except Exception as e:
-            logger.error(f"删除实体失败: {str(e)}")
-            raise
-    
-    def list_entities(self, query_filter: str = None) -> List[Entity]:
+    def list_entities(self, filters: Optional[List[EntityFilter]] = None) -> List[Entity]:
         """列出所有实体，可选过滤条件"""
         try:
-            if query_filter:
-                query = f"SELECT * FROM c WHERE {query_filter}"
-            else:
-                query = "SELECT * FROM c"
-                
+            query, parameters = build_entity_query(filters)
             items = list(self.entities_container.query_items(
                 query=query,
+                parameters=parameters,
                 enable_cross_partition_query=True
             ))
+            for item in items:
+                self.partition_index.put(item["id"], item["name"])
             return [Entity(**item) for item in items]
         except Exception as e:
             logger.error(f"列出实体失败: {str(e)}")
             raise
-    
-    def add_relationship(self, source_id: str, relationship: Relationship) -> Dict[str, Any]:
-        """添加实体之间的关系"""
-        try:
-            # 更新源实体的关系列表
-            source_entity = self.get_entity(source_id)
-            if not source_entity:
-                raise ValueError(f"源实体 {source_id} 不存在")
-            
-            # 检查目标实体是否存在
-            target_entity = self.get_entity(relationship.target_id)
-            if not target_entity:
-                raise ValueError(f"目标实体 {relationship.target_id} 不存在")
-            
-            # 添加关系到源实体
-            relationships = source_entity.relationships
-            relationship_exists = False
-            
-            for i, rel in enumerate(relationships):
-                if rel.target_id == relationship.target_id:
-                    # 更新现有关系
-                    relationships[i] = relationship
-                    relationship_exists = True
-                    break
-            
-            if not relationship_exists:
-                relationships.append(relationship)
-            
-            # 更新实体
-            source_entity.relationships = relationships
-            return self.update_entity(source_id, {"relationships": [r.dict() for r in relationships]})
-        except Exception as e:
-            logger.error(f"添加关系失败: {str(e)}")
-            raise
-    
-    def get_relationships(self, entity_id: str) -> List[Relationship]:
-        """获取实体的所有关系"""
-        try:
-            entity = self.get_entity(entity_id)
-            if not entity:
-                raise ValueError(f"实体 {entity_id} 不存在")
-            return entity.relationships
-        except Exception as e:
-            logger.error(f"获取关系失败: {str(e)}")
-            raise 
\ No newline at end of file
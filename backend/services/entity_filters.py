@@ -0,0 +1,82 @@
+from pydantic import BaseModel, Field, validator
+from typing import List, Dict, Any, Optional, Tuple
+from enum import Enum
+from ..config.settings import ENTITY_FIELDS
+
+# 列表类型字段(Cosmos中为数组，AI Search中为Collection(Edm.String))
+LIST_FIELDS = [
+    "researchFields", "skills", "languages", "personalHonors",
+    "certificates", "relatedPersons", "relatedUrls"
+]
+
+# 允许过滤的字段
+FILTERABLE_FIELDS = ["id"] + ENTITY_FIELDS
+
+class FilterOperator(str, Enum):
+    EQ = "eq"
+    NE = "ne"
+    CONTAINS = "contains"
+
+class EntityFilter(BaseModel):
+    """实体过滤条件: 字段、运算符、值
+    
+    对列表字段，eq和contains表示数组包含该值，ne表示数组不包含该值；对字符串字段，contains表示子串匹配。
+    """
+    field: str
+    op: FilterOperator = FilterOperator.EQ
+    value: str = Field(description="比较值")
+    
+    @validator("field")
+    def validate_field(cls, value):
+        if value not in FILTERABLE_FIELDS:
+            raise ValueError(f"不支持过滤的字段: {value}")
+        return value
+
+def compile_cosmos_filter(filters: Optional[List[EntityFilter]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """编译为参数化的Cosmos SQL WHERE条件
+    
+    值全部通过参数传递，相同结构的过滤条件生成相同的查询文本，可复用查询计划。
+    返回(条件文本, 参数列表)，无过滤条件时条件文本为空字符串。
+    """
+    clauses = []
+    parameters = []
+    for i, condition in enumerate(filters or []):
+        name = f"@p{i}"
+        path = f"c.{condition.field}"
+        if condition.field in LIST_FIELDS:
+            negate = "NOT " if condition.op == FilterOperator.NE else ""
+            clauses.append(f"{negate}ARRAY_CONTAINS({path}, {name})")
+        elif condition.op == FilterOperator.EQ:
+            clauses.append(f"{path} = {name}")
+        elif condition.op == FilterOperator.NE:
+            clauses.append(f"{path} != {name}")
+        else:
+            clauses.append(f"CONTAINS({path}, {name})")
+        parameters.append({"name": name, "value": condition.value})
+    return " AND ".join(clauses), parameters
+
+def escape_odata_string(value: str) -> str:
+    """转义OData字符串字面量中的单引号"""
+    return value.replace("'", "''")
+
+def escape_lucene_query(value: str) -> str:
+    """转义search.ismatch中Lucene查询语法的特殊字符"""
+    special = set('+-&|!(){}[]^"~*?:\\/')
+    return "".join(f"\\{ch}" if ch in special else ch for ch in value)
+
+def compile_odata_filter(filters: Optional[List[EntityFilter]]) -> Optional[str]:
+    """编译为AI Search的OData过滤表达式"""
+    clauses = []
+    for condition in filters or []:
+        literal = f"'{escape_odata_string(condition.value)}'"
+        if condition.field in LIST_FIELDS:
+            negate = "not " if condition.op == FilterOperator.NE else ""
+            clauses.append(f"{negate}{condition.field}/any(v: v eq {literal})")
+        elif condition.op == FilterOperator.EQ:
+            clauses.append(f"{condition.field} eq {literal}")
+        elif condition.op == FilterOperator.NE:
+            clauses.append(f"{condition.field} ne {literal}")
+        else:
+            pattern = escape_odata_string(escape_lucene_query(condition.value))
+            clauses.append(f"search.ismatch('{pattern}', '{condition.field}')")
+    return " and ".join(clauses) if clauses else None
@@ -0,0 +1,383 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from ..config.settings import (
+    ENTITY_INDEX_PATH, ENTITY_MATCH_THRESHOLD, ENTITY_LINK_THRESHOLD, ENTITY_BLOCK_LIMIT
+)
+from .async_cosmos_service import AsyncCosmosDBService
+from .text_chunker import name_key, merge_into
+
+logger = logging.getLogger(__name__)
+
+# 参与打分的字段，索引中只保存这些字段的摘要，打分时不需要读取完整实体
+PROFILE_FIELDS = [
+    "name", "gender", "birthDate", "country", "position", "domain", "email", "phone",
+    "idCard", "passportNumber", "researchFields", "skills", "languages"
+]
+# 字段一致/不一致时的加减分；邮箱和电话几乎唯一，一致即可合并，姓名不一致不扣分(中英文名、别名)
+FIELD_WEIGHTS = {
+    "name": (0.4, 0.0),
+    "email": (0.8, -0.1),
+    "phone": (0.8, -0.1),
+    "birthDate": (0.3, -1.0),
+    "gender": (0.05, -1.0),
+    "country": (0.05, -0.2),
+    "position": (0.1, 0.0),
+    "domain": (0.05, 0.0)
+}
+# 列表字段按重合比例加分
+OVERLAP_WEIGHTS = {"researchFields": 0.15, "skills": 0.1, "languages": 0.05}
+# 证件号一致即为同一人，不一致即为不同的人
+DOCUMENT_FIELDS = ["idCard", "passportNumber"]
+
+def _normalize_text(value: Any) -> str:
+    return re.sub(r"\s+", "", str(value or "")).casefold()
+
+def normalize_field(field: str, value: Any) -> Optional[str]:
+    """把分块键字段规范化为比较值，无效值返回None"""
+    if value in (None, ""):
+        return None
+    if field == "name":
+        key = name_key(value)
+        return key if key and key != "未命名" else None
+    if field == "email":
+        key = str(value).strip().lower()
+        return key if "@" in key else None
+    if field == "phone":
+        digits = re.sub(r"\D", "", str(value))
+        # 去掉国家代码，+86 138... 与 138... 视为同一号码
+        if len(digits) == 13 and digits.startswith("86"):
+            digits = digits[2:]
+        return digits if len(digits) >= 7 else None
+    if field in DOCUMENT_FIELDS:
+        key = re.sub(r"[^0-9A-Za-z]", "", str(value)).upper()
+        return key if len(key) >= 5 else None
+    return _normalize_text(value) or None
+
+def blocking_keys(entity: Dict[str, Any]) -> List[str]:
+    """实体的分块键(字段:规范化值)，只有共享至少一个分块键的实体才会互相比较"""
+    keys = []
+    for field in ("name", "email", "phone", "idCard", "passportNumber"):
+        value = normalize_field(field, entity.get(field))
+        if value:
+            keys.append(f"{field}:{value}")
+    return keys
+
+def entity_profile(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """实体中参与打分的非空字段"""
+    return {field: entity[field] for field in PROFILE_FIELDS if entity.get(field) not in (None, "", [])}
+
+def _list_values(value: Any) -> Set[str]:
+    if not isinstance(value, list):
+        value = [value]
+    return {_normalize_text(item) for item in value if item}
+
+def score_pair(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """两个实体是同一人的得分(0~1)
+    
+    证件号一致直接判为1，不一致判为0；其余字段一致加分、不一致扣分，
+    出生日期或性别不一致基本排除是同一人，双方缺失的字段不影响得分。
+    """
+    for field in DOCUMENT_FIELDS:
+        x, y = normalize_field(field, a.get(field)), normalize_field(field, b.get(field))
+        if x and y:
+            return 1.0 if x == y else 0.0
+    
+    score = 0.0
+    for field, (agree, disagree) in FIELD_WEIGHTS.items():
+        x, y = normalize_field(field, a.get(field)), normalize_field(field, b.get(field))
+        if x and y:
+            score += agree if x == y else disagree
+    for field, weight in OVERLAP_WEIGHTS.items():
+        x, y = _list_values(a.get(field)), _list_values(b.get(field))
+        if x and y:
+            score += weight * len(x & y) / len(x | y)
+    return max(0.0, min(1.0, score))
+
+class EntityResolutionIndex:
+    """实体分块键索引(SQLite)
+    
+    保存 分块键 → 实体ID 和每个实体的打分摘要，导入时只取出共享分块键的候选实体打分，
+    不做全量两两比较；每个分块键最多取最近写入的 ENTITY_BLOCK_LIMIT 个候选，
+    避免常见姓名形成过大的分块。得分介于关联阈值和合并阈值之间的实体对记录为疑似重复。
+    """
+    
+    def __init__(self, path: str = ENTITY_INDEX_PATH, block_limit: int = ENTITY_BLOCK_LIMIT):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.block_limit = block_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS blocking_keys (
+                key TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                UNIQUE (key, entity_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blocking_keys_entity ON blocking_keys (entity_id)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS profiles (
+                entity_id TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                updated_at REAL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS links (
+                entity_id TEXT NOT NULL,
+                candidate_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                created_at REAL,
+                UNIQUE (entity_id, candidate_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS links_candidate ON links (candidate_id)")
+        self._conn.commit()
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def candidates(self, keys: List[str]) -> Dict[str, List[str]]:
+        """按分块键查找候选实体ID"""
+        result = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                rows = self._conn.execute(
+                    "SELECT entity_id FROM blocking_keys WHERE key = ? ORDER BY rowid DESC LIMIT ?",
+                    (key, self.block_limit)
+                ).fetchall()
+                result[key] = [row[0] for row in rows]
+        return result
+    
+    def profiles(self, entity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """读取实体的打分摘要"""
+        result = {}
+        unique_ids = list(dict.fromkeys(entity_ids))
+        with self._lock:
+            # 分批查询，避免超过SQLite的参数个数上限
+            for start in range(0, len(unique_ids), 500):
+                batch = unique_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT entity_id, profile FROM profiles WHERE entity_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                result.update((entity_id, json.loads(profile)) for entity_id, profile in rows)
+        return result
+    
+    def put(self, entries: List[Tuple[str, List[str], Dict[str, Any]]]) -> None:
+        """写入(实体ID, 分块键, 打分摘要)，已有的分块键保留"""
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blocking_keys (key, entity_id) VALUES (?, ?)",
+                    [(key, entity_id) for entity_id, keys, _ in entries for key in keys]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO profiles (entity_id, profile, updated_at) VALUES (?, ?, ?)",
+                    [(entity_id, json.dumps(profile, ensure_ascii=False), now) for entity_id, _, profile in entries]
+                )
+                self._conn.commit()
+        except Exception as e:
+            logger.error(f"写入实体索引失败: {str(e)}")
+            raise
+    
+    def add_links(self, links: List[Tuple[str, str, float]]) -> None:
+        """记录疑似重复的实体对(实体ID, 候选实体ID, 得分)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO links (entity_id, candidate_id, score, created_at) VALUES (?, ?, ?, ?)",
+                [(entity_id, candidate_id, score, now) for entity_id, candidate_id, score in links]
+            )
+            self._conn.commit()
+    
+    def links(self, entity_id: str) -> List[Dict[str, Any]]:
+        """实体的疑似重复实体，按得分从高到低"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT candidate_id, score FROM links WHERE entity_id = ? "
+                "UNION SELECT entity_id, score FROM links WHERE candidate_id = ? ORDER BY score DESC",
+                (entity_id, entity_id)
+            ).fetchall()
+        return [{"entity_id": candidate_id, "score": round(score, 4)} for candidate_id, score in rows]
+    
+    def forget(self, entity_ids: List[str]) -> None:
+        """删除实体的分块键、摘要和疑似重复记录(实体已删除或不存在时)"""
+        with self._lock:
+            for table, column in (("blocking_keys", "entity_id"), ("profiles", "entity_id"),
+                                  ("links", "entity_id"), ("links", "candidate_id")):
+                self._conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(i,) for i in entity_ids])
+            self._conn.commit()
+    
+    def stats(self) -> Dict[str, int]:
+        """索引中的实体数、分块键数和疑似重复对数"""
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("profiles", "blocking_keys", "links")
+            }
+
+class Resolution:
+    """一批实体的消解结果
+    
+    documents 为需要写入的实体文档(新实体和合并后的已有实体)，
+    id_map 把输入实体ID映射到写入后的实体ID，links 为疑似重复的实体对。
+    """
+    
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.id_map: Dict[str, str] = {}
+        self.keys: Dict[str, Set[str]] = {}
+        self.links: List[Tuple[str, str, float]] = []
+        self.created = 0
+        self.merged = 0
+    
+    def stats(self) -> Dict[str, int]:
+        return {"created": self.created, "merged": self.merged, "linked": len(self.links)}
+
+class EntityResolver:
+    """导入实体的增量消解
+    
+    每个输入实体按分块键从索引取候选，与候选(及同一批中已处理的实体)逐一打分:
+    最高分达到合并阈值时把属性合并到已有实体(标量保留已有值，列表取并集)，
+    达到关联阈值时作为新实体写入并记录疑似重复，否则作为新实体写入。
+    写入成功后调用 commit 把分块键和摘要写回索引，下一批导入即可匹配。
+    并发处理的任务之间不加锁，同时导入的同一人可能各自新建，之后的导入会合并到其中一个。
+    """
+    
+    def __init__(self, index: EntityResolutionIndex, cosmos_service: AsyncCosmosDBService,
+                 match_threshold: float = ENTITY_MATCH_THRESHOLD,
+                 link_threshold: float = ENTITY_LINK_THRESHOLD):
+        self.index = index
+        self.cosmos_service = cosmos_service
+        self.match_threshold = match_threshold
+        self.link_threshold = link_threshold
+    
+    def _plan(self, entities: List[Dict[str, Any]], resolution: Resolution) -> Dict[str, List[Dict[str, Any]]]:
+        """为每个实体选择合并目标，返回需要从数据库读取的已有实体及合并进来的输入实体"""
+        entity_keys = [blocking_keys(entity) for entity in entities]
+        indexed = self.index.candidates([key for keys in entity_keys for key in keys])
+        profiles = self.index.profiles([entity_id for ids in indexed.values() for entity_id in ids])
+        batch_blocks: Dict[str, List[str]] = {}
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        
+        for entity, keys in zip(entities, entity_keys):
+            candidates = dict.fromkeys(
+                candidate_id
+                for key in keys
+                for candidate_id in batch_blocks.get(key, []) + indexed.get(key, [])
+                if candidate_id != entity["id"]
+            )
+            scored = sorted(
+                ((score_pair(entity, profiles[candidate_id]), candidate_id)
+                 for candidate_id in candidates if candidate_id in profiles),
+                reverse=True
+            )
+            if scored and scored[0][0] >= self.match_threshold:
+                target = scored[0][1]
+                if target in resolution.documents:
+                    merge_into(resolution.documents[target], entity)
+                else:
+                    pending.setdefault(target, []).append(entity)
+                merge_into(profiles[target], entity_profile(entity))
+                resolution.id_map[entity["id"]] = target
+                resolution.keys.setdefault(target, set()).update(keys)
+                resolution.merged += 1
+            else:
+                target = entity["id"]
+                resolution.documents[target] = entity
+                resolution.id_map[target] = target
+                resolution.keys.setdefault(target, set()).update(keys)
+                profiles[target] = entity_profile(entity)
+                resolution.created += 1
+                resolution.links.extend(
+                    (target, candidate_id, score) for score, candidate_id in scored if score >= self.link_threshold
+                )
+            for key in keys:
+                blocks = batch_blocks.setdefault(key, [])
+                if target not in blocks:
+                    blocks.append(target)
+        return pending
+    
+    async def resolve(self, entities: List[Dict[str, Any]]) -> Resolution:
+        """消解一批已校验的实体文档(须带ID)"""
+        try:
+            resolution = Resolution()
+            pending = await asyncio.to_thread(self._plan, entities, resolution)
+            if not pending:
+                return resolution
+            
+            existing, missing = await self.cosmos_service.get_entities(list(pending))
+            for entity in existing:
+                document = entity.dict()
+                for source in pending[entity.id]:
+                    merge_into(document, source)
+                resolution.documents[entity.id] = document
+            if missing:
+                # 索引中的实体已被删除: 合并到它的输入实体改为新建，由第一个实体承接其余实体
+                await asyncio.to_thread(self.index.forget, missing)
+                for entity_id in missing:
+                    first, *rest = pending[entity_id]
+                    for source in rest:
+                        merge_into(first, source)
+                    resolution.documents[first["id"]] = first
+                    resolution.keys[first["id"]] = resolution.keys.pop(entity_id)
+                    for source in pending[entity_id]:
+                        resolution.id_map[source["id"]] = first["id"]
+                    resolution.merged -= 1
+                    resolution.created += 1
+            return resolution
+        except Exception as e:
+            logger.error(f"实体消解失败: {str(e)}")
+            raise
+    
+    async def commit(self, resolution: Resolution, saved_ids: List[str]) -> None:
+        """把写入成功的实体的分块键、摘要和疑似重复记录写回索引"""
+        saved = set(saved_ids)
+        entries = [
+            (entity_id, sorted(resolution.keys.get(entity_id, ())), entity_profile(document))
+            for entity_id, document in resolution.documents.items() if entity_id in saved
+        ]
+        links = [link for link in resolution.links if link[0] in saved]
+        await asyncio.to_thread(self.index.put, entries)
+        if links:
+            await asyncio.to_thread(self.index.add_links, links)
+    
+    async def apply_change(self, event: str, document: Dict[str, Any]) -> None:
+        """变更监听器: 实体删除后从索引中移除，避免再被匹配"""
+        if event == "entity_deleted":
+            await asyncio.to_thread(self.index.forget, [document["id"]])
+    
+    async def apply_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """变更源处理器: 实体被修改(如通过API编辑)后刷新索引中的分块键和摘要"""
+        await asyncio.to_thread(self.index.put, [
+            (document["id"], blocking_keys(document), entity_profile(document)) for document in documents
+        ])
+    
+    async def rebuild(self, batch_size: int = 1000) -> int:
+        """从数据库中的全部实体重建索引(首次启用或索引丢失时)，返回实体数"""
+        fields = ["id", *PROFILE_FIELDS]
+        entries = []
+        count = 0
+        async for item in self.cosmos_service.iter_entities(fields=fields):
+            entries.append((item["id"], blocking_keys(item), entity_profile(item)))
+            if len(entries) >= batch_size:
+                await asyncio.to_thread(self.index.put, entries)
+                count += len(entries)
+                entries = []
+        if entries:
+            await asyncio.to_thread(self.index.put, entries)
+            count += len(entries)
+        return count
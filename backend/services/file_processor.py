@@ -1,19 +1,250 @@
 import pandas as pd
 import docx
+import openpyxl
 from io import BytesIO
+import asyncio
+import hashlib
+import os
+import tempfile
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, BinaryIO, Iterator, Callable
+from pydantic import TypeAdapter
 from azure.storage.blob import BlobServiceClient
-from ..config.settings import AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from ..config.settings import (
+    AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER, IMPORT_CHUNK_SIZE,
+    BLOB_BLOCK_SIZE, BLOB_MAX_CONCURRENCY, UPLOAD_SPOOL_MAX_SIZE
+)
 from ..models.entity import Entity
 
 logger = logging.getLogger(__name__)
 
+# 列表类型字段(逗号分隔)
+LIST_COLUMNS = ['researchFields', 'skills', 'languages', 'personalHonors',
+                'relatedPersons', 'relatedUrls']
+# 复杂字段(分号分隔，每项作为一条描述)
+COMPLEX_COLUMNS = ['workExperience', 'educationExperience', 'volunteerExperience',
+                   'publications', 'patents', 'projects', 'academicAchievements',
+                   'socialActivities']
+# 实体模型中的字符串字段
+STRING_COLUMNS = [
+    name for name, field in Entity.model_fields.items()
+    if field.annotation in (str, Optional[str])
+]
+
+# 读取表格时按文本读入的列；证件号、电话等被推断为数值时会丢失精度(float64只有约16位有效数字)
+TEXT_COLUMN_DTYPES = {column: str for column in STRING_COLUMNS + LIST_COLUMNS + COMPLEX_COLUMNS + ['socialAccounts']}
+
+ENTITY_LIST_ADAPTER = TypeAdapter(List[Entity])
+ENTITY_DEFAULTS = {
+    name: field.default for name, field in Entity.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+
+def _normalize_column(column: str, values: pd.Series) -> pd.Series:
+    """按列对非空值做向量化的类型规整"""
+    if column in LIST_COLUMNS:
+        return values.astype(str).str.strip().str.split(r'\s*,\s*')
+    
+    if column in COMPLEX_COLUMNS:
+        items = values.astype(str).str.strip().str.split(r'\s*;\s*')
+        return items.map(lambda parts: [{"description": part} for part in parts])
+    
+    if column == 'socialAccounts':
+        # 只处理字符串单元格，格式为 "平台:地址;平台:地址"
+        text = values[values.map(lambda value: isinstance(value, str))]
+        accounts = {index: {} for index in text.index.tolist()}
+        parts = text.str.split(';').explode()
+        parts = parts[parts.str.contains(':', regex=False, na=False)]
+        pairs = parts.str.split(':', n=1, expand=True)
+        if not pairs.empty:
+            for index, platform, url in zip(pairs.index.tolist(), pairs[0].str.strip().tolist(),
+                                            pairs[1].str.strip().tolist()):
+                accounts[index][platform] = url
+        return pd.Series(accounts, dtype=object)
+    
+    if column in STRING_COLUMNS:
+        return values.astype(str)
+    
+    return values
+
+def dataframe_to_entities(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """将表格按列转换为实体字典列表
+    
+    每列只做一次向量化的空值过滤和类型规整，再按行组装并批量校验，
+    避免逐行逐单元格的Python处理。没有name的行会被跳过。
+    """
+    if 'name' not in df.columns:
+        return []
+    
+    df = df[df['name'].notna()].reset_index(drop=True)
+    columns = [column for column in df.columns if column in Entity.model_fields]
+    
+    records: List[Dict[str, Any]] = [{} for _ in range(len(df))]
+    for column in columns:
+        values = _normalize_column(column, df[column].dropna())
+        for position, value in zip(values.index.tolist(), values.tolist()):
+            records[position][column] = value
+    
+    # 批量校验；各列已规整为模型类型，直接合并默认值和生成的id，省去逐个模型序列化
+    entities = ENTITY_LIST_ADAPTER.validate_python(records)
+    return [
+        {**ENTITY_DEFAULTS, "relationships": [], **record, "id": entity.id}
+        for record, entity in zip(records, entities)
+    ]
+
+def _read_excel_chunks(file_obj: BinaryIO, chunk_size: int) -> Iterator[Tuple[pd.DataFrame, Optional[float]]]:
+    """以只读模式逐行读取xlsx第一个工作表，每 chunk_size 行组成一个DataFrame"""
+    workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(value) if value is not None else f"_unnamed_{i}" for i, value in enumerate(header)]
+        # 按object构建，含空单元格的数值列不被推断为float，单元格保持openpyxl读出的原值
+        # 只读模式下max_row来自工作表的dimension声明，可能缺失
+        total_rows = (sheet.max_row or 0) - 1
+        
+        batch = []
+        read_rows = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                read_rows += len(batch)
+                yield pd.DataFrame(batch, columns=columns, dtype=object), (read_rows / total_rows if total_rows > 0 else None)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object), 1.0
+    finally:
+        workbook.close()
+
+def iter_table_chunks(file_obj: BinaryIO, file_ext: str,
+                      chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[Tuple[pd.DataFrame, Optional[float]]]:
+    """按固定行数分块读取表格文件，产出(数据块, 已读比例)，已读比例未知时为None
+    
+    CSV使用pandas分块读取，xlsx使用openpyxl只读模式逐行读取，内存占用与文件大小无关；
+    旧版xls格式不支持流式读取，整表读入后再分块。
+    """
+    if file_ext == 'csv':
+        file_obj.seek(0, 2)
+        total_bytes = file_obj.tell()
+        file_obj.seek(0)
+        with pd.read_csv(file_obj, chunksize=chunk_size, dtype=TEXT_COLUMN_DTYPES) as reader:
+            for chunk in reader:
+                # 解析器按块缓冲读取，文件位置可近似表示进度
+                yield chunk, (min(file_obj.tell() / total_bytes, 1.0) if total_bytes else None)
+    elif file_ext == 'xlsx':
+        file_obj.seek(0)
+        yield from _read_excel_chunks(file_obj, chunk_size)
+    else:
+        file_obj.seek(0)
+        df = pd.read_excel(file_obj, dtype=TEXT_COLUMN_DTYPES)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size], min((start + chunk_size) / len(df), 1.0)
+
+class CsvChunker:
+    """增量CSV分块器
+    
+    按任意边界喂入字节，只在引号外的换行处切分记录(双引号个数的奇偶性表示是否处于引号内)，
+    完整记录累计到约 chunk_size 行后连同表头交给pandas解析，产出固定行数的数据块。
+    只持有未满一块的记录和最后一条不完整记录，内存占用与文件大小无关。
+    """
+    
+    def __init__(self, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.bytes_fed = 0
+        self._header: Optional[bytes] = None
+        self._records = bytearray()
+        self._partial = bytearray()
+        # self._partial 中双引号个数的奇偶性
+        self._in_quotes = False
+        self._row_estimate = 0
+    
+    def _record_boundary(self, data: bytes) -> int:
+        """返回data中最后一个引号外换行之后的位置，没有时返回-1"""
+        end = data.rfind(b"\n")
+        while end >= 0:
+            in_quotes = self._in_quotes ^ bool(data.count(b'"', 0, end) % 2)
+            if not in_quotes:
+                return end + 1
+            end = data.rfind(b"\n", 0, end)
+        return -1
+    
+    def _take_header(self) -> None:
+        """从累计的记录中取出第一条作为表头"""
+        in_quotes = False
+        start = 0
+        while True:
+            end = self._records.find(b"\n", start)
+            if end < 0:
+                return
+            in_quotes ^= bool(self._records.count(b'"', start, end) % 2)
+            if not in_quotes:
+                self._header = bytes(self._records[:end + 1])
+                del self._records[:end + 1]
+                return
+            start = end + 1
+    
+    def _parse(self) -> List[pd.DataFrame]:
+        if not self._records:
+            return []
+        data = BytesIO(self._header + bytes(self._records))
+        self._records.clear()
+        self._row_estimate = 0
+        with pd.read_csv(data, chunksize=self.chunk_size, dtype=TEXT_COLUMN_DTYPES) as reader:
+            return list(reader)
+    
+    def feed(self, data: bytes) -> List[pd.DataFrame]:
+        """喂入一段字节，返回已凑满的数据块"""
+        self.bytes_fed += len(data)
+        boundary = self._record_boundary(data)
+        if boundary < 0:
+            self._partial += data
+            self._in_quotes ^= bool(data.count(b'"') % 2)
+            return []
+        
+        self._records += self._partial
+        self._records += data[:boundary]
+        self._row_estimate += data.count(b"\n", 0, boundary)
+        self._partial = bytearray(data[boundary:])
+        self._in_quotes = bool(self._partial.count(b'"') % 2)
+        
+        if self._header is None:
+            self._take_header()
+            if self._header is None:
+                return []
+        if self._row_estimate < self.chunk_size:
+            return []
+        return self._parse()
+    
+    def close(self) -> List[pd.DataFrame]:
+        """输入结束，解析剩余记录(包括没有结尾换行的最后一行)"""
+        self._records += self._partial
+        self._partial = bytearray()
+        if self._header is None:
+            if self._records.endswith(b"\n"):
+                self._take_header()
+            else:
+                self._header = bytes(self._records) + b"\n"
+                self._records.clear()
+        return self._parse() if self._header is not None else []
+
 class FileProcessor:
-    def __init__(self):
+    def __init__(self, transport=None, async_transport=None):
         # 初始化Blob Storage客户端
-        self.blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+        client_kwargs = {"transport": transport} if transport else {}
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            AZURE_STORAGE_CONNECTION_STRING, **client_kwargs
+        )
         self.container_client = self.blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER)
+        # 异步客户端用于上传，传输期间不阻塞事件循环
+        async_client_kwargs = {"transport": async_transport} if async_transport else {}
+        self.async_blob_service_client = AsyncBlobServiceClient.from_connection_string(
+            AZURE_STORAGE_CONNECTION_STRING, **async_client_kwargs
+        )
+        self.async_container_client = self.async_blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER)
         
         # 确保容器存在
         try:
@@ -24,89 +255,140 @@ class FileProcessor:
             logger.error(f"初始化Blob Storage失败: {str(e)}")
             raise
     
-    async def process_file(self, file, file_name: str) -> Tuple[List[Dict[str, Any]], str]:
-        """处理上传的文件，根据文件类型调用不同的处理方法"""
+    async def close(self):
+        """关闭Blob Storage客户端"""
+        self.blob_service_client.close()
+        await self.async_blob_service_client.close()
+    
+    async def save_to_disk(self, file, path: str) -> str:
+        """把上传文件按块写入本地路径(任务暂存)，同时计算内容的SHA-256并返回"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        hasher = hashlib.sha256()
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    block = await file.read(BLOB_BLOCK_SIZE)
+                    if not block:
+                        break
+                    hasher.update(block)
+                    await asyncio.to_thread(f.write, block)
+            return hasher.hexdigest()
+        except Exception as e:
+            if os.path.exists(path):
+                os.remove(path)
+            logger.error(f"暂存上传文件失败: {str(e)}")
+            raise
+    
+    async def stream_upload(self, file, file_name: str,
+                            on_block: Optional[Callable[[bytes], Any]] = None) -> str:
+        """从上传文件按固定大小分块读取，并行暂存块后提交块列表，返回文件URL
+        
+        每读到一块先交给 on_block(可以是普通函数或协程函数)，再启动该块的暂存上传，
+        文件只读取一次即可同时完成上传和解析。最多 BLOB_MAX_CONCURRENCY 个块同时在途，
+        内存占用约为 BLOB_BLOCK_SIZE * BLOB_MAX_CONCURRENCY。
+        """
+        blob_client = self.async_container_client.get_blob_client(file_name)
+        semaphore = asyncio.Semaphore(BLOB_MAX_CONCURRENCY)
+        block_ids: List[str] = []
+        uploads: List[asyncio.Task] = []
+        
+        async def stage(block_id: str, block: bytes):
+            try:
+                await blob_client.stage_block(block_id, block, length=len(block))
+            finally:
+                semaphore.release()
+        
+        try:
+            while True:
+                block = await file.read(BLOB_BLOCK_SIZE)
+                if not block:
+                    break
+                if on_block is not None:
+                    result = on_block(block)
+                    if asyncio.iscoroutine(result):
+                        await result
+                
+                # 块ID长度必须一致
+                block_id = f"{len(block_ids):08d}"
+                block_ids.append(block_id)
+                await semaphore.acquire()
+                uploads.append(asyncio.create_task(stage(block_id, block)))
+                # 移除已完成的暂存，失败时尽早抛出
+                for task in [task for task in uploads if task.done()]:
+                    uploads.remove(task)
+                    task.result()
+            
+            await asyncio.gather(*uploads)
+            await blob_client.commit_block_list(block_ids)
+            return blob_client.url
+        except Exception as e:
+            for task in uploads:
+                task.cancel()
+            logger.error(f"上传文件失败: {str(e)}")
+            raise
+    
+    async def spool_upload(self, file, file_name: str) -> Tuple[BinaryIO, str]:
+        """流式上传的同时把内容写入临时文件，供需要随机访问的解析器(Excel、Word)使用
+        
+        返回(已定位到开头的临时文件, 文件URL)，调用方负责关闭临时文件。
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+        try:
+            file_url = await self.stream_upload(file, file_name, spool.write)
+            spool.seek(0)
+            return spool, file_url
+        except Exception:
+            spool.close()
+            raise
+    
+    async def process_file(self, file, file_name: str) -> Tuple[List[Dict[str, Any]], str, str, Optional[str]]:
+        """处理上传的文件，根据文件类型调用不同的处理方法
+        
+        返回(实体列表, 文件URL, 内容类型, 文档文本)，表格文件的文档文本为None。
+        """
+        spool = None
         try:
-            # 保存文件到Blob Storage
-            blob_client = self.container_client.get_blob_client(file_name)
-            file_content = await file.read()
-            blob_client.upload_blob(file_content, overwrite=True)
-            file_url = blob_client.url
+            # 保存文件到Blob Storage，内容同时写入临时文件
+            spool, file_url = await self.spool_upload(file, file_name)
             
             # 根据文件扩展名选择不同的处理方法
             file_ext = file_name.lower().split('.')[-1]
             
             if file_ext in ['csv', 'xlsx', 'xls']:
                 # 处理表格文件
-                entities = await self.process_table_file(BytesIO(file_content), file_ext)
+                entities = await self.process_table_file(spool, file_ext)
+                text_content = None
                 content_type = "table"
             elif file_ext in ['docx', 'doc']:
                 # 处理Word文档
-                text_content = await self.process_word_document(BytesIO(file_content))
+                text_content = await self.process_word_document(spool)
                 entities = []  # 实体将通过AI服务提取，这里先返回空列表
                 content_type = "document"
             elif file_ext == 'txt':
                 # 处理文本文件
-                text_content = file_content.decode('utf-8')
+                text_content = spool.read().decode('utf-8')
                 entities = []  # 实体将通过AI服务提取，这里先返回空列表
                 content_type = "document"
             else:
                 raise ValueError(f"不支持的文件类型: {file_ext}")
             
-            return entities, file_url, content_type
+            return entities, file_url, content_type, text_content
         except Exception as e:
             logger.error(f"处理文件失败: {str(e)}")
             raise
+        finally:
+            if spool is not None:
+                spool.close()
     
     async def process_table_file(self, file_content: BytesIO, file_ext: str) -> List[Dict[str, Any]]:
         """处理表格文件 (CSV或Excel)"""
         try:
             if file_ext == 'csv':
-                df = pd.read_csv(file_content)
+                df = pd.read_csv(file_content, dtype=TEXT_COLUMN_DTYPES)
             else:  # Excel文件
-                df = pd.read_excel(file_content)
-            
-            # 将DataFrame转换为实体列表
-            entities = []
-            for _, row in df.iterrows():
-                entity_data = {}
-                for column in df.columns:
-                    # 跳过NaN值
-                    if pd.notna(row[column]):
-                        # 处理列表类型的字段(如研究领域、技能等)
-                        if column in ['researchFields', 'skills', 'languages', 'personalHonors', 
-                                    'relatedPersons', 'relatedUrls']:
-                            if isinstance(row[column], str):
-                                entity_data[column] = [item.strip() for item in row[column].split(',')]
-                            else:
-                                entity_data[column] = [str(row[column])]
-                        # 处理复杂字段(如工作经历、教育经历等)
-                        elif column in ['workExperience', 'educationExperience', 'volunteerExperience',
-                                      'publications', 'patents', 'projects', 'academicAchievements',
-                                      'socialActivities']:
-                            if isinstance(row[column], str):
-                                # 尝试解析为简单列表
-                                entity_data[column] = [{"description": item.strip()} for item in row[column].split(';')]
-                            else:
-                                entity_data[column] = [{"description": str(row[column])}]
-                        # 处理社交账号(字典类型)
-                        elif column == 'socialAccounts':
-                            if isinstance(row[column], str):
-                                accounts = {}
-                                for account in row[column].split(';'):
-                                    if ':' in account:
-                                        platform, url = account.split(':', 1)
-                                        accounts[platform.strip()] = url.strip()
-                                entity_data[column] = accounts
-                        else:
-                            entity_data[column] = row[column]
-                
-                # 如果有"name"字段，将创建实体
-                if 'name' in entity_data:
-                    entity = Entity(**entity_data)
-                    entities.append(entity.dict())
+                df = pd.read_excel(file_content, dtype=TEXT_COLUMN_DTYPES)
             
-            return entities
+            return dataframe_to_entities(df)
         except Exception as e:
             logger.error(f"处理表格文件失败: {str(e)}")
             raise
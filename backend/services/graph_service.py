@@ -0,0 +1,305 @@
+from array import array
+from collections import deque
+from typing import List, Dict, Any, Optional
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 关系类型编码，边属性以紧凑数组存储
+RELATIONSHIP_TYPE_CODES = {"STRONG": 0, "WEAK": 1}
+RELATIONSHIP_TYPE_NAMES = {code: name for name, code in RELATIONSHIP_TYPE_CODES.items()}
+UNKNOWN_TYPE_CODE = -1
+# 置信度以float32存储，比较时留出精度余量
+CONFIDENCE_EPSILON = 1e-6
+
+class RelationshipGraph:
+    """内存中的人物关系图
+    
+    实体映射为连续整数节点ID，每个节点的出边和入边保存在定长类型数组中
+    (目标节点 int32、关系类型 int8、置信度 float32)，百万级边的多跳遍历无需访问数据库。
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._node_index: Dict[str, int] = {}
+        self._entity_ids: List[Optional[str]] = []
+        self._names: List[Optional[str]] = []
+        self._out_targets: List[array] = []
+        self._out_types: List[array] = []
+        self._out_confidence: List[array] = []
+        self._in_sources: List[array] = []
+        self.edge_count = 0
+        self.ready = False
+    
+    @property
+    def node_count(self) -> int:
+        return len(self._node_index)
+    
+    def _ensure_node(self, entity_id: str, name: Optional[str] = None) -> int:
+        node = self._node_index.get(entity_id)
+        if node is None:
+            node = len(self._entity_ids)
+            self._node_index[entity_id] = node
+            self._entity_ids.append(entity_id)
+            self._names.append(name)
+            self._out_targets.append(array("i"))
+            self._out_types.append(array("b"))
+            self._out_confidence.append(array("f"))
+            self._in_sources.append(array("i"))
+        elif name is not None:
+            self._names[node] = name
+        return node
+    
+    def add_node(self, entity_id: str, name: Optional[str] = None) -> None:
+        with self._lock:
+            self._ensure_node(entity_id, name)
+    
+    def add_edge(self, source_id: str, target_id: str, relationship_type: str, confidence: float,
+                 source_name: Optional[str] = None, target_name: Optional[str] = None) -> None:
+        """添加或更新一条边(同一对源和目标只保留一条)"""
+        type_code = RELATIONSHIP_TYPE_CODES.get(relationship_type, UNKNOWN_TYPE_CODE)
+        with self._lock:
+            source = self._ensure_node(source_id, source_name)
+            target = self._ensure_node(target_id, target_name)
+            targets = self._out_targets[source]
+            for i, existing in enumerate(targets):
+                if existing == target:
+                    self._out_types[source][i] = type_code
+                    self._out_confidence[source][i] = confidence
+                    return
+            targets.append(target)
+            self._out_types[source].append(type_code)
+            self._out_confidence[source].append(confidence)
+            self._in_sources[target].append(source)
+            self.edge_count += 1
+    
+    def _remove_out_edge(self, source: int, target: int) -> bool:
+        targets = self._out_targets[source]
+        for i, existing in enumerate(targets):
+            if existing == target:
+                del targets[i]
+                del self._out_types[source][i]
+                del self._out_confidence[source][i]
+                sources = self._in_sources[target]
+                for j, existing_source in enumerate(sources):
+                    if existing_source == source:
+                        del sources[j]
+                        break
+                self.edge_count -= 1
+                return True
+        return False
+    
+    def remove_edge(self, source_id: str, target_id: str) -> None:
+        with self._lock:
+            source = self._node_index.get(source_id)
+            target = self._node_index.get(target_id)
+            if source is not None and target is not None:
+                self._remove_out_edge(source, target)
+    
+    def remove_node(self, entity_id: str) -> None:
+        """删除节点及其所有边；节点编号不回收，仅解除映射"""
+        with self._lock:
+            node = self._node_index.pop(entity_id, None)
+            if node is None:
+                return
+            for target in list(self._out_targets[node]):
+                self._remove_out_edge(node, target)
+            for source in list(self._in_sources[node]):
+                self._remove_out_edge(source, node)
+            self._entity_ids[node] = None
+            self._names[node] = None
+    
+    def apply_change(self, event: str, document: Dict[str, Any]) -> None:
+        """数据变更监听回调，保持图与存储同步"""
+        if event == "entity_upserted":
+            self.add_node(document["id"], document.get("name"))
+        elif event == "entity_deleted":
+            self.remove_node(document["id"])
+        elif event == "edge_upserted":
+            self.add_edge(
+                document["source_id"], document["target_id"],
+                document.get("relationship_type"), document.get("confidence", 0.0),
+                document.get("source_name"), document.get("target_name")
+            )
+        elif event == "edge_deleted":
+            self.remove_edge(document["source_id"], document["target_id"])
+    
+    def _neighbors(self, node: int, min_confidence: float, type_code: Optional[int],
+                   direction: str):
+        """遍历满足条件的相邻节点，产出(相邻节点, 源节点, 目标节点, 边下标)"""
+        if direction in ("out", "both"):
+            targets = self._out_targets[node]
+            types = self._out_types[node]
+            confidence = self._out_confidence[node]
+            for i in range(len(targets)):
+                if confidence[i] >= min_confidence and (type_code is None or types[i] == type_code):
+                    yield targets[i], node, targets[i], i
+        if direction in ("in", "both"):
+            for source in self._in_sources[node]:
+                targets = self._out_targets[source]
+                for i in range(len(targets)):
+                    if targets[i] != node:
+                        continue
+                    if self._out_confidence[source][i] >= min_confidence and (
+                        type_code is None or self._out_types[source][i] == type_code
+                    ):
+                        yield source, source, node, i
+                    break
+    
+    def _edge_dict(self, source: int, target: int, index: int) -> Dict[str, Any]:
+        return {
+            "source_id": self._entity_ids[source],
+            "target_id": self._entity_ids[target],
+            "relationship_type": RELATIONSHIP_TYPE_NAMES.get(self._out_types[source][index]),
+            "confidence": round(float(self._out_confidence[source][index]), 4)
+        }
+    
+    def _node_dict(self, node: int, **extra) -> Dict[str, Any]:
+        return {"id": self._entity_ids[node], "name": self._names[node], **extra}
+    
+    @staticmethod
+    def _type_code(relationship_type: Optional[str]) -> Optional[int]:
+        if relationship_type is None:
+            return None
+        if relationship_type not in RELATIONSHIP_TYPE_CODES:
+            raise ValueError(f"不支持的关系类型: {relationship_type}")
+        return RELATIONSHIP_TYPE_CODES[relationship_type]
+    
+    def neighborhood(self, entity_id: str, depth: int = 1, min_confidence: float = 0.0,
+                     relationship_type: Optional[str] = None, direction: str = "both",
+                     max_nodes: int = 1000) -> Dict[str, Any]:
+        """广度优先获取实体k跳以内的子图"""
+        type_code = self._type_code(relationship_type)
+        min_confidence -= CONFIDENCE_EPSILON
+        with self._lock:
+            start = self._node_index.get(entity_id)
+            if start is None:
+                raise ValueError(f"实体 {entity_id} 不存在")
+            
+            depths = {start: 0}
+            edges = {}
+            queue = deque([start])
+            truncated = False
+            while queue:
+                node = queue.popleft()
+                if depths[node] >= depth:
+                    continue
+                for neighbor, source, target, index in self._neighbors(node, min_confidence, type_code, direction):
+                    if neighbor not in depths:
+                        if len(depths) >= max_nodes:
+                            truncated = True
+                            continue
+                        depths[neighbor] = depths[node] + 1
+                        queue.append(neighbor)
+                    edges[(source, target)] = index
+            
+            return {
+                "entity_id": entity_id,
+                "nodes": [self._node_dict(node, depth=d) for node, d in depths.items()],
+                "edges": [
+                    self._edge_dict(source, target, index)
+                    for (source, target), index in edges.items()
+                    if source in depths and target in depths
+                ],
+                "truncated": truncated
+            }
+    
+    def shortest_path(self, source_id: str, target_id: str, max_depth: int = 6,
+                      min_confidence: float = 0.0, relationship_type: Optional[str] = None,
+                      direction: str = "both") -> Optional[Dict[str, Any]]:
+        """双向广度优先搜索两个实体之间的最短路径，找不到时返回None"""
+        type_code = self._type_code(relationship_type)
+        min_confidence -= CONFIDENCE_EPSILON
+        reverse_direction = {"out": "in", "in": "out", "both": "both"}[direction]
+        with self._lock:
+            start = self._node_index.get(source_id)
+            goal = self._node_index.get(target_id)
+            if start is None:
+                raise ValueError(f"实体 {source_id} 不存在")
+            if goal is None:
+                raise ValueError(f"实体 {target_id} 不存在")
+            if start == goal:
+                return {"nodes": [self._node_dict(start)], "edges": [], "length": 0}
+            
+            # parents: 节点 -> (前驱节点, 边源, 边目标, 边下标)
+            forward = {start: None}
+            backward = {goal: None}
+            forward_frontier = [start]
+            backward_frontier = [goal]
+            meeting = None
+            hops = 0
+            while forward_frontier and backward_frontier and hops < max_depth and meeting is None:
+                # 优先扩展较小的一侧
+                expand_forward = len(forward_frontier) <= len(backward_frontier)
+                frontier = forward_frontier if expand_forward else backward_frontier
+                parents = forward if expand_forward else backward
+                others = backward if expand_forward else forward
+                step_direction = direction if expand_forward else reverse_direction
+                
+                next_frontier = []
+                for node in frontier:
+                    for neighbor, source, target, index in self._neighbors(
+                        node, min_confidence, type_code, step_direction
+                    ):
+                        if neighbor in parents:
+                            continue
+                        parents[neighbor] = (node, source, target, index)
+                        if neighbor in others:
+                            meeting = neighbor
+                            break
+                        next_frontier.append(neighbor)
+                    if meeting is not None:
+                        break
+                
+                if expand_forward:
+                    forward_frontier = next_frontier
+                else:
+                    backward_frontier = next_frontier
+                hops += 1
+            
+            if meeting is None:
+                return None
+            
+            path = [meeting]
+            edges = []
+            node = meeting
+            while forward[node] is not None:
+                parent, source, target, index = forward[node]
+                edges.insert(0, self._edge_dict(source, target, index))
+                path.insert(0, parent)
+                node = parent
+            node = meeting
+            while backward[node] is not None:
+                parent, source, target, index = backward[node]
+                edges.append(self._edge_dict(source, target, index))
+                path.append(parent)
+                node = parent
+            
+            return {
+                "nodes": [self._node_dict(node) for node in path],
+                "edges": edges,
+                "length": len(edges)
+            }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "nodes": self.node_count, "edges": self.edge_count}
+    
+    async def load(self, cosmos_service) -> None:
+        """从实体容器和关系容器全量加载图"""
+        try:
+            async for item in cosmos_service.iter_entities(fields=["name"]):
+                self.add_node(item["id"], item.get("name"))
+            async for edge in cosmos_service.iter_relationship_edges():
+                self.add_edge(edge["source_id"], edge["target_id"],
+                              edge.get("relationship_type"), edge.get("confidence", 0.0))
+            # 尚未迁移到关系容器的内嵌关系
+            async for item in cosmos_service.iter_embedded_relationships():
+                for rel in item.get("relationships") or []:
+                    self.add_edge(item["id"], rel["target_id"],
+                                  rel.get("relationship_type"), rel.get("confidence", 0.0))
+            self.ready = True
+            logger.info(f"关系图加载完成: {self.node_count} 个节点, {self.edge_count} 条边")
+        except Exception as e:
+            logger.error(f"加载关系图失败: {str(e)}")
+            raise
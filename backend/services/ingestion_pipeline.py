@@ -0,0 +1,459 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from ..config.settings import JOB_POLL_INTERVAL, JOB_STAGING_DIR, JOB_WORKER_CONCURRENCY
+from ..models.entity import Entity, RelationshipEdge
+from .async_cosmos_service import AsyncCosmosDBService
+from .content_index import ContentHashIndex
+from .entity_resolution import EntityResolver
+from .file_processor import FileProcessor, CsvChunker, dataframe_to_entities, iter_table_chunks
+from .job_store import JobStore, JobLeaseLost
+from .openai_service import OpenAIService
+from .text_chunker import name_key
+
+logger = logging.getLogger(__name__)
+
+# 表格文件扩展名
+TABLE_EXTENSIONS = ['csv', 'xlsx', 'xls']
+# 处理阶段，按顺序执行，每个阶段完成后写入检查点
+STAGES = ["parse", "extract", "persist", "relate"]
+# 任务状态中最多保留的未解析姓名数
+MAX_UNRESOLVED_NAMES = 100
+
+def staging_path(job_id: str, filename: str) -> str:
+    """上传文件在暂存目录中的路径(文件名只取最后一段，防止路径穿越)"""
+    return os.path.join(JOB_STAGING_DIR, f"{job_id}_{os.path.basename(filename)}")
+
+def stable_entity_id(job_id: str, *position: Any) -> str:
+    """由任务ID和实体在输入中的位置确定的实体ID，阶段重跑时覆盖已写入的实体而不是重复写入"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "/".join(str(part) for part in (job_id, *position))))
+
+async def save_entities(cosmos_service: AsyncCosmosDBService, job: Dict[str, Any],
+                        entities: List[Dict[str, Any]]) -> List[str]:
+    """批量保存已校验的实体，失败项计入任务状态，返回成功写入的实体ID"""
+    results = await cosmos_service.bulk_upsert_entities(entities)
+    failures = [result for result in results if not result["success"]]
+    if failures:
+        job["failed_count"] = job.get("failed_count", 0) + len(failures)
+        # 只保留少量错误样例，避免任务状态无限增长
+        job.setdefault("errors", []).extend(failures[:max(0, 20 - len(job.get("errors", [])))])
+        logger.warning(f"任务中有 {len(failures)} 个实体保存失败")
+    return [result["id"] for result in results if result["success"]]
+
+def record_content(content_index: ContentHashIndex, job: Dict[str, Any], entity_ids: List[str],
+                   content_type: str, extraction_result: Optional[Dict[str, Any]] = None) -> None:
+    """记录处理结果供重复上传复用；有模型提取失败、实体或关系保存失败时不记录，下次上传会重新处理"""
+    if job.get("extraction_failed_count") or job.get("failed_count") or job.get("relationship_failed_count"):
+        return
+    try:
+        content_index.put(job["content_hash"], job["file_name"], job["file_url"], content_type,
+                          entity_ids, extraction_result)
+    except Exception as e:
+        logger.error(f"记录内容哈希失败: {str(e)}")
+
+class TableImport:
+    """分块导入表格并在每块保存后写入检查点
+    
+    rows_processed 记录已保存的行数，重跑时跳过这些行；实体ID按行号确定，
+    崩溃时正在保存的那一块重跑后覆盖同一批实体。
+    """
+    
+    def __init__(self, pipeline: "IngestionPipeline", job_id: str, job: Dict[str, Any],
+                 checkpoint: Callable[[], None]):
+        self.pipeline = pipeline
+        self.job_id = job_id
+        self.job = job
+        self.checkpoint = checkpoint
+        self.rows_seen = 0
+        job.setdefault("chunks_processed", 0)
+        job.setdefault("rows_processed", 0)
+        job.setdefault("entity_count", 0)
+    
+    async def add(self, chunk: pd.DataFrame, fraction: Optional[float]) -> None:
+        start = self.rows_seen
+        self.rows_seen += len(chunk)
+        skip = self.job["rows_processed"] - start
+        if skip >= len(chunk):
+            return
+        if skip > 0:
+            chunk = chunk.iloc[skip:]
+            start += skip
+        
+        entities = await asyncio.to_thread(dataframe_to_entities, chunk)
+        if 'id' not in chunk.columns and 'name' in chunk.columns:
+            # dataframe_to_entities 跳过没有name的行，按剩余行的行号生成ID
+            for entity, row in zip(entities, np.flatnonzero(chunk['name'].notna().to_numpy())):
+                entity["id"] = stable_entity_id(self.job_id, "row", start + int(row))
+        
+        entity_ids = set((await self.pipeline.save(self.job_id, self.job, entities)).values())
+        self.job["chunks_processed"] += 1
+        self.job["rows_processed"] = start + len(chunk)
+        self.job["entity_count"] += len(entity_ids)
+        if fraction is not None:
+            self.job["progress"] = 10 + int(80 * min(fraction, 1.0))
+        self.job["message"] = f"已导入第 {self.job['chunks_processed']} 块，共 {self.job['entity_count']} 个实体"
+        self.checkpoint()
+
+class IngestionPipeline:
+    """上传文件的分阶段处理流水线: parse → extract → persist → relate
+    
+    - parse: 暂存文件上传到Blob Storage；文档提取文本，CSV在上传的同时分块解析并保存
+    - extract: 文档分块调用模型提取实体和关系，表格跳过
+    - persist: 保存文档实体，Excel在此阶段分块导入
+    - relate: 处理实体关系
+    启用实体消解时，每批实体写入前先与已有实体匹配，同一人合并到已有实体而不是新建。
+    每个阶段完成后写入检查点，工作进程崩溃后其他进程领取任务时从第一个未完成的阶段继续。
+    提取出的文本和模型结果保存在暂存目录，任务结束后与上传文件一起删除。
+    """
+    
+    def __init__(self, store: JobStore, file_processor: FileProcessor, cosmos_service: AsyncCosmosDBService,
+                 openai_service: OpenAIService, content_index: ContentHashIndex,
+                 resolver: Optional[EntityResolver] = None):
+        self.store = store
+        self.file_processor = file_processor
+        self.cosmos_service = cosmos_service
+        self.openai_service = openai_service
+        self.content_index = content_index
+        self.resolver = resolver
+    
+    @staticmethod
+    def _text_path(params: Dict[str, Any]) -> str:
+        return f"{params['path']}.txt"
+    
+    @staticmethod
+    def _analysis_path(params: Dict[str, Any]) -> str:
+        return f"{params['path']}.analysis.json"
+    
+    def _load_analysis(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        path = self._analysis_path(params)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    
+    def _cleanup(self, params: Dict[str, Any]) -> None:
+        for path in (params["path"], self._text_path(params), self._analysis_path(params)):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.error(f"删除暂存文件失败: {str(e)}")
+    
+    async def save(self, job_id: str, job: Dict[str, Any], entities: List[Dict[str, Any]]) -> Dict[str, str]:
+        """消解并批量保存一批实体，记录到任务中
+        
+        返回写入成功的 输入实体ID → 实体ID(合并时为已有实体的ID)。
+        """
+        if self.resolver is None:
+            entity_ids = await save_entities(self.cosmos_service, job, entities)
+            id_map = {entity_id: entity_id for entity_id in entity_ids}
+        else:
+            resolution = await self.resolver.resolve(entities)
+            entity_ids = await save_entities(self.cosmos_service, job, list(resolution.documents.values()))
+            await self.resolver.commit(resolution, entity_ids)
+            totals = job.setdefault("resolution", {"created": 0, "merged": 0, "linked": 0})
+            for name, count in resolution.stats().items():
+                totals[name] += count
+            saved = set(entity_ids)
+            id_map = {source: target for source, target in resolution.id_map.items() if target in saved}
+        self.store.add_entity_ids(job_id, entity_ids)
+        return id_map
+    
+    async def run(self, job_id: str, worker_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> None:
+        """从检查点继续处理任务，结束时把任务标记为completed或failed"""
+        def checkpoint():
+            self.store.save(job_id, worker_id, job)
+        
+        stages = job.setdefault("stages", {})
+        try:
+            try:
+                for stage in STAGES:
+                    if stages.get(stage) in ("completed", "skipped"):
+                        continue
+                    job["stage"] = stage
+                    stages[stage] = "running"
+                    checkpoint()
+                    ran = await getattr(self, f"_{stage}")(job_id, job, params, checkpoint)
+                    stages[stage] = "completed" if ran else "skipped"
+                    checkpoint()
+                
+                entity_ids = self.store.entity_ids(job_id)
+                job["stage"] = None
+                job["progress"] = 100
+                job["message"] = "处理完成"
+                job["entity_count"] = len(entity_ids)
+                record_content(self.content_index, job, entity_ids, job["content_type"], self._load_analysis(params))
+                self.store.finish(job_id, worker_id, "completed", job)
+            except JobLeaseLost:
+                raise
+            except Exception as e:
+                logger.error(f"处理文件失败: {str(e)}")
+                job["message"] = f"处理失败: {str(e)}"
+                self.store.finish(job_id, worker_id, "failed", job)
+        except JobLeaseLost:
+            # 租约已被其他进程接管，由对方继续处理，保留暂存文件
+            logger.warning(f"任务 {job_id} 已被其他工作进程接管，停止处理")
+            return
+        self._cleanup(params)
+    
+    async def _parse(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any],
+                     checkpoint: Callable[[], None]) -> bool:
+        path = params["path"]
+        file_ext = params["filename"].lower().split('.')[-1]
+        with open(path, "rb") as f:
+            upload = UploadFile(file=f, size=os.path.getsize(path), filename=params["filename"])
+            
+            if file_ext in TABLE_EXTENSIONS:
+                job["content_type"] = "table"
+                job["progress"] = 10
+                job["message"] = "正在上传并导入表格..."
+                checkpoint()
+                if file_ext != 'csv':
+                    # Excel需要随机访问，上传完成后在persist阶段从暂存文件逐行读取
+                    job["file_url"] = await self.file_processor.stream_upload(upload, params["blob_name"])
+                    return True
+                
+                # CSV在上传过程中由增量分块器直接解析并保存，文件只读取一次
+                table_import = TableImport(self, job_id, job, checkpoint)
+                chunker = CsvChunker()
+                
+                async def on_block(block: bytes):
+                    # 解析和转换是同步的CPU操作，放到线程中避免阻塞事件循环
+                    for chunk in await asyncio.to_thread(chunker.feed, block):
+                        await table_import.add(chunk, chunker.bytes_fed / upload.size if upload.size else None)
+                
+                job["file_url"] = await self.file_processor.stream_upload(upload, params["blob_name"], on_block)
+                for chunk in chunker.close():
+                    await table_import.add(chunk, 1.0)
+                job["table_imported"] = True
+                return True
+            
+            job["progress"] = 10
+            job["message"] = "正在解析文件..."
+            checkpoint()
+            _, job["file_url"], job["content_type"], text_content = await self.file_processor.process_file(
+                upload, params["blob_name"]
+            )
+        
+        with open(self._text_path(params), "w", encoding="utf-8") as f:
+            f.write(text_content)
+        job["progress"] = 30
+        job["message"] = "文件解析完成，正在提取实体..."
+        return True
+    
+    async def _extract(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any],
+                       checkpoint: Callable[[], None]) -> bool:
+        if job["content_type"] != "document":
+            return False
+        
+        # 分析文档，提取实体和关系(长文档分块并发提取)
+        job["progress"] = 50
+        job["message"] = "正在使用AI分析文档..."
+        checkpoint()
+        
+        with open(self._text_path(params), encoding="utf-8") as f:
+            text_content = f.read()
+        analysis_result = await self.openai_service.analyze_entity_document(
+            text_content, params["use_cache"], params["extraction_mode"], params["tiered"]
+        )
+        job["chunks"] = analysis_result.get("chunks", [])
+        job["usage"] = analysis_result.get("usage")
+        job["routing"] = analysis_result.get("routing")
+        # 出错的窗口按空结果继续，任务仍可完成，但结果不完整
+        job["extraction_failed_count"] = (analysis_result.get("usage") or {}).get("failed_calls", 0)
+        if job["extraction_failed_count"]:
+            logger.warning(f"任务 {job_id} 中有 {job['extraction_failed_count']} 次模型提取调用失败")
+        
+        with open(self._analysis_path(params), "w", encoding="utf-8") as f:
+            json.dump(analysis_result, f, ensure_ascii=False)
+        return True
+    
+    async def _persist(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any],
+                       checkpoint: Callable[[], None]) -> bool:
+        if job["content_type"] == "table":
+            if not job.get("table_imported"):
+                table_import = TableImport(self, job_id, job, checkpoint)
+                with open(params["path"], "rb") as f:
+                    chunks = iter_table_chunks(f, params["filename"].lower().split('.')[-1])
+                    while True:
+                        chunk = await asyncio.to_thread(next, chunks, None)
+                        if chunk is None:
+                            break
+                        await table_import.add(*chunk)
+                job["table_imported"] = True
+            return True
+        
+        job["progress"] = 70
+        job["message"] = "正在保存实体到数据库..."
+        checkpoint()
+        
+        # 创建实体对象
+        entities = []
+        raw_entities = (self._load_analysis(params) or {}).get("entities", [])
+        for index, entity_data in enumerate(raw_entities):
+            entity = Entity(
+                id=stable_entity_id(job_id, "entity", index),
+                name=entity_data.get("name", "未命名"),
+                **{k: v for k, v in entity_data.items() if k not in ("name", "id")}
+            )
+            entities.append(entity.dict())
+        
+        # 实体在上面构造时已校验过，直接批量写入
+        id_map = await self.save(job_id, job, entities)
+        
+        # 姓名 → 实体ID，供relate阶段把关系中的姓名映射到实体；同名的不同实体记为None(无法确定)
+        entity_names: Dict[str, Optional[str]] = {}
+        for entity in entities:
+            entity_id = id_map.get(entity["id"])
+            if entity_id is None:
+                continue
+            key = name_key(entity["name"])
+            entity_names[key] = entity_id if entity_names.get(key, entity_id) == entity_id else None
+        job["entity_names"] = entity_names
+        return True
+    
+    async def _relate(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any],
+                      checkpoint: Callable[[], None]) -> bool:
+        if job["content_type"] != "document":
+            return False
+        
+        job["progress"] = 90
+        job["message"] = "正在处理实体关系..."
+        checkpoint()
+        
+        relationships = (self._load_analysis(params) or {}).get("relationships", [])
+        names: Dict[str, Optional[str]] = dict(job.get("entity_names") or {})
+        
+        # 本文档中没有的姓名到已有实体中查找，只有唯一匹配时采用
+        missing = {
+            name for relationship in relationships
+            for name in (relationship.get("source_name"), relationship.get("target_name"))
+            if name and name_key(name) not in names
+        }
+        if missing:
+            found: Dict[str, set] = {}
+            for name, entity_ids in (await self.cosmos_service.find_entity_ids_by_names(list(missing))).items():
+                found.setdefault(name_key(name), set()).update(entity_ids)
+            for key, entity_ids in found.items():
+                names[key] = next(iter(entity_ids)) if len(entity_ids) == 1 else None
+        
+        edges: Dict[str, RelationshipEdge] = {}
+        unresolved = set()
+        invalid = 0
+        for relationship in relationships:
+            source_name, target_name = relationship.get("source_name"), relationship.get("target_name")
+            source_id = names.get(name_key(source_name)) if source_name else None
+            target_id = names.get(name_key(target_name)) if target_name else None
+            for name, entity_id in ((source_name, source_id), (target_name, target_id)):
+                if entity_id is None and name:
+                    unresolved.add(str(name))
+            if source_id is None or target_id is None or source_id == target_id:
+                continue
+            try:
+                edge = RelationshipEdge(
+                    id=RelationshipEdge.edge_id(source_id, target_id),
+                    source_id=source_id,
+                    source_name=source_name,
+                    target_id=target_id,
+                    target_name=target_name,
+                    relationship_type=str(relationship.get("relationship_type") or "WEAK").upper(),
+                    relationship_description=relationship.get("relationship_description") or "",
+                    confidence=relationship.get("confidence", 0.5)
+                )
+            except Exception as e:
+                invalid += 1
+                logger.warning(f"跳过无效关系 {source_name} → {target_name}: {str(e)}")
+                continue
+            # 同一对实体只保留置信度最高的一条
+            if edge.id not in edges or edge.confidence > edges[edge.id].confidence:
+                edges[edge.id] = edge
+        
+        # 本文档的所有边按源实体分区批量写入
+        results = await self.cosmos_service.bulk_upsert_relationship_edges(list(edges.values()))
+        failures = [result for result in results if not result["success"]]
+        if failures:
+            job.setdefault("errors", []).extend(failures[:max(0, 20 - len(job.get("errors", [])))])
+            logger.warning(f"任务中有 {len(failures)} 条关系保存失败")
+        job["relationship_count"] = len(results) - len(failures)
+        job["relationship_failed_count"] = len(failures)
+        job["invalid_relationship_count"] = invalid
+        job["unresolved_names"] = sorted(unresolved)[:MAX_UNRESOLVED_NAMES]
+        job["unresolved_name_count"] = len(unresolved)
+        return True
+
+class JobWorker:
+    """从任务存储领取任务并运行流水线
+    
+    同时最多处理 concurrency 个任务，处理期间按租约时长的三分之一周期续约；
+    stop() 后不再领取新任务，等待进行中的任务结束。
+    """
+    
+    def __init__(self, store: JobStore, pipeline: IngestionPipeline,
+                 concurrency: int = JOB_WORKER_CONCURRENCY, worker_id: Optional[str] = None):
+        self.store = store
+        self.pipeline = pipeline
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = False
+    
+    def stop(self) -> None:
+        self._stopping = True
+    
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                self.store.heartbeat(job_id, self.worker_id)
+            except JobLeaseLost:
+                return
+            except Exception as e:
+                logger.error(f"任务 {job_id} 续约失败: {str(e)}")
+    
+    async def _process(self, job: Dict[str, Any], semaphore: asyncio.Semaphore) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job["job_id"]))
+        try:
+            await self.pipeline.run(job["job_id"], self.worker_id, job["state"], job["params"])
+        except Exception as e:
+            logger.error(f"任务 {job['job_id']} 处理异常: {str(e)}")
+        finally:
+            heartbeat.cancel()
+            semaphore.release()
+    
+    async def run(self) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        # 连续领取失败的次数，失败时按轮询间隔指数退避(最长30秒)
+        claim_failures = 0
+        logger.info(f"工作进程 {self.worker_id} 开始领取任务")
+        while not self._stopping:
+            await semaphore.acquire()
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.worker_id)
+                claim_failures = 0
+            except Exception as e:
+                logger.error(f"领取任务失败: {str(e)}")
+                semaphore.release()
+                await asyncio.sleep(min(JOB_POLL_INTERVAL * 2 ** claim_failures, 30.0))
+                claim_failures += 1
+                continue
+            if job is None:
+                semaphore.release()
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            logger.info(f"领取任务 {job['job_id']}(第 {job['attempts']} 次)")
+            task = asyncio.create_task(self._process(job, semaphore))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        if tasks:
+            logger.info(f"工作进程 {self.worker_id} 停止领取，等待 {len(tasks)} 个任务完成")
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import json
+import os
+import time
+import logging
+from typing import List, Dict, Any, Optional
+from ..config.settings import JOB_STORE_PATH, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+class JobLeaseLost(Exception):
+    """任务租约已过期并被其他工作进程领取，当前进程应停止处理"""
+
+class JobStore:
+    """持久化的文件处理任务队列(SQLite)
+    
+    Web进程创建任务，工作进程领取任务并按阶段写入检查点，多个进程共享同一个数据库文件。
+    处理中的任务持有租约(worker_id + 心跳时间)，心跳超过 JOB_LEASE_SECONDS 未更新时视为
+    工作进程已崩溃，任务可被其他进程重新领取并从检查点继续；领取次数超过 JOB_MAX_ATTEMPTS 后标记失败。
+    未被领取的任务状态同样为processing，worker_id为空。
+    """
+    
+    def __init__(self, path: str = JOB_STORE_PATH, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # isolation_level=None: 自动提交，领取任务时显式开启写事务
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                state TEXT NOT NULL,
+                params TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                heartbeat_at REAL,
+                created_at REAL,
+                updated_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_entities (
+                job_id TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                UNIQUE (job_id, entity_id)
+            )"""
+        )
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def create(self, job_id: str, state: Dict[str, Any], params: Dict[str, Any],
+               status: str = "processing") -> None:
+        """创建任务；status为processing的任务等待工作进程领取"""
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, status, state, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, status, json.dumps(state, ensure_ascii=False), json.dumps(params, ensure_ascii=False), now, now)
+                )
+        except Exception as e:
+            logger.error(f"创建任务失败: {str(e)}")
+            raise
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务状态"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, state, attempts, worker_id FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, state, attempts, worker_id = row
+        return {**json.loads(state), "status": status, "attempts": attempts, "worker_id": worker_id}
+    
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """领取一个等待中或租约已过期的任务，返回{job_id, state, params, attempts}"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT job_id, state, params, attempts FROM jobs "
+                        "WHERE status = 'processing' AND (worker_id IS NULL OR heartbeat_at < ?) "
+                        "ORDER BY created_at LIMIT 1",
+                        (now - self.lease_seconds,)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job_id, state, params, attempts = row
+                    state = json.loads(state)
+                    if attempts >= self.max_attempts:
+                        # 多次领取后仍未完成(如每次都导致工作进程崩溃)，不再重试
+                        state["message"] = f"处理失败: 已重试 {attempts} 次"
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'failed', state = ?, worker_id = NULL, updated_at = ? WHERE job_id = ?",
+                            (json.dumps(state, ensure_ascii=False), now, job_id)
+                        )
+                        logger.error(f"任务 {job_id} 超过最大尝试次数，标记为失败")
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET worker_id = ?, heartbeat_at = ?, attempts = attempts + 1, updated_at = ? "
+                        "WHERE job_id = ?",
+                        (worker_id, now, now, job_id)
+                    )
+                    self._conn.execute("COMMIT")
+                    return {"job_id": job_id, "state": state, "params": json.loads(params), "attempts": attempts + 1}
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"领取任务失败: {str(e)}")
+                raise
+    
+    def _update(self, job_id: str, worker_id: str, sql: str, args: tuple) -> None:
+        with self._lock:
+            cursor = self._conn.execute(f"{sql} WHERE job_id = ? AND worker_id = ?", (*args, job_id, worker_id))
+        if cursor.rowcount == 0:
+            raise JobLeaseLost(f"任务 {job_id} 的租约已被其他工作进程接管")
+    
+    def save(self, job_id: str, worker_id: str, state: Dict[str, Any]) -> None:
+        """写入任务进度和检查点，同时续约"""
+        now = time.time()
+        self._update(job_id, worker_id, "UPDATE jobs SET state = ?, heartbeat_at = ?, updated_at = ?",
+                     (json.dumps(state, ensure_ascii=False), now, now))
+    
+    def heartbeat(self, job_id: str, worker_id: str) -> None:
+        """续约处理中的任务"""
+        self._update(job_id, worker_id, "UPDATE jobs SET heartbeat_at = ?", (time.time(),))
+    
+    def finish(self, job_id: str, worker_id: str, status: str, state: Dict[str, Any]) -> None:
+        """把任务标记为completed或failed并释放租约"""
+        self._update(job_id, worker_id, "UPDATE jobs SET status = ?, state = ?, worker_id = NULL, updated_at = ?",
+                     (status, json.dumps(state, ensure_ascii=False), time.time()))
+    
+    def add_entity_ids(self, job_id: str, entity_ids: List[str]) -> None:
+        """追加任务写入的实体ID，重复的ID忽略"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_entities (job_id, entity_id) VALUES (?, ?)",
+                [(job_id, entity_id) for entity_id in entity_ids]
+            )
+    
+    def entity_ids(self, job_id: str) -> List[str]:
+        """按写入顺序返回任务的实体ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entity_id FROM job_entities WHERE job_id = ? ORDER BY rowid", (job_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def stats(self) -> Dict[str, int]:
+        """按状态统计任务数，处理中的任务区分等待领取和正在处理"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, worker_id IS NULL, COUNT(*) FROM jobs GROUP BY status, worker_id IS NULL"
+            ).fetchall()
+        stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for status, unclaimed, count in rows:
+            if status == "processing":
+                stats["queued" if unclaimed else "running"] += count
+            else:
+                stats[status] = stats.get(status, 0) + count
+        return stats
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import logging
+from typing import Dict, Any, Optional
+from diskcache import Cache
+from ..config.settings import LLM_CACHE_DIR, LLM_CACHE_SIZE_LIMIT, LLM_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """模型提取结果的持久化缓存(diskcache)
+    
+    键由模型、部署、系统提示、输入文本哈希和温度组成，值为解析后的JSON结果。
+    超过 LLM_CACHE_SIZE_LIMIT 字节时按最近最少使用淘汰，条目在 LLM_CACHE_TTL 秒后过期。
+    """
+    
+    def __init__(self, directory: str = LLM_CACHE_DIR, size_limit: int = LLM_CACHE_SIZE_LIMIT,
+                 ttl: Optional[int] = LLM_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = Cache(directory, size_limit=size_limit, eviction_policy="least-recently-used")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+    
+    def close(self):
+        """关闭磁盘缓存"""
+        self._cache.close()
+    
+    @staticmethod
+    def make_key(model: str, deployment: str, system_prompt: str, text: str, temperature: float) -> str:
+        """构造缓存键；提示和文本只参与哈希，不以明文保存在键中"""
+        payload = json.dumps(
+            [model, deployment, _sha256(system_prompt), _sha256(text), temperature],
+            ensure_ascii=False
+        )
+        return _sha256(payload)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._cache.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            self._cache.set(key, value, expire=self.ttl)
+        except Exception as e:
+            # 缓存写入失败不影响提取结果
+            logger.error(f"写入模型响应缓存失败: {str(e)}")
+    
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+    
+    def clear(self) -> None:
+        """清空缓存条目和计数"""
+        self._cache.clear()
+        with self._lock:
+            self.hits = self.misses = self.bypassed = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, bypassed = self.hits, self.misses, self.bypassed
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "bypassed": bypassed,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._cache),
+            "size_bytes": self._cache.volume(),
+            "size_limit": self._cache.size_limit,
+            "ttl": self.ttl
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from ..config.settings import LLM_DEPLOYMENT_LIMITS, LLM_SCHEDULER_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 调度优先级，数值越小越先获得配额: 交互式对话优先于批量提取
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+T = TypeVar("T")
+
+def rate_limit_delay(error: Exception, attempt: int) -> Optional[float]:
+    """429限流时的等待秒数: 优先使用服务端返回的retry-after-ms/retry-after，否则指数退避加抖动
+    
+    不是限流错误时返回None。
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(1.0 * 2 ** attempt, 60.0) * random.uniform(0.5, 1.0)
+
+def usage_tokens(result: Any) -> Optional[int]:
+    """从模型响应中读取实际消耗的token数(OpenAI ChatCompletion 或 AutoGen CreateResult)"""
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_tokens", None)
+    if total is None:
+        total = (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+    return total
+
+class TokenBucket:
+    """按每分钟配额连续补充的令牌桶"""
+    
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """距离桶中攒够amount个令牌还需等待的秒数；超过容量的请求按容量计"""
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+    
+    def consume(self, amount: float) -> float:
+        charged = min(amount, self.capacity)
+        self.tokens -= charged
+        return charged
+    
+    def adjust(self, amount: float) -> None:
+        """归还(正数)或补扣(负数)令牌，用于按实际用量修正预估值"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class Reservation:
+    """一次已获得配额的调用；settle 记录实际用量，释放时多退少补"""
+    
+    def __init__(self, charged: float):
+        self.charged = charged
+        self.actual: Optional[float] = None
+    
+    def settle(self, actual_tokens: Optional[float]) -> None:
+        self.actual = actual_tokens
+
+class DeploymentLimiter:
+    """单个部署的TPM/RPM配额和按优先级排序的等待队列
+    
+    队首请求的配额不足时整个队列等待(严格优先级)，由定时器在令牌补足时重新调度，
+    不轮询。请求的token数按预估扣除，完成后按实际用量修正。
+    """
+    
+    def __init__(self, name: str, tpm: Optional[int] = None, rpm: Optional[int] = None):
+        self.name = name
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.paused_until = 0.0
+        self._queue: List[Tuple[int, int, float, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.wait = {name: {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0} for name in PRIORITY_NAMES.values()}
+    
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self._queue if not future.done())
+    
+    def _wait_time(self, tokens: float, now: float) -> float:
+        wait = max(0.0, self.paused_until - now)
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.wait_time(1, now))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.wait_time(tokens, now))
+        return wait
+    
+    def _dispatch(self) -> None:
+        """按优先级放行配额足够的请求，队首不足时定时重试"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            priority, _, tokens, enqueued, future = self._queue[0]
+            if future.done():
+                # 等待方已取消
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            wait = self._wait_time(tokens, now)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            charged = self.token_bucket.consume(tokens) if self.token_bucket is not None else 0.0
+            self._record_wait(priority, now - enqueued)
+            self.in_flight += 1
+            future.set_result(Reservation(charged))
+    
+    def _record_wait(self, priority: int, seconds: float) -> None:
+        stats = self.wait[PRIORITY_NAMES.get(priority, "bulk")]
+        stats["count"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+    
+    async def acquire(self, tokens: float, priority: int = PRIORITY_BULK) -> Reservation:
+        """排队等待配额，返回占用的配额"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), tokens, time.monotonic(), future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        self._dispatch()
+        return await future
+    
+    def release(self, reservation: Reservation, failed: bool = False) -> None:
+        """释放配额: 失败的调用退回token预估，成功的调用按实际用量修正"""
+        self.in_flight -= 1
+        if self.token_bucket is None:
+            return
+        if failed:
+            self.token_bucket.adjust(reservation.charged)
+        elif reservation.actual is not None:
+            self.token_bucket.adjust(reservation.charged - reservation.actual)
+        if self._queue:
+            self._dispatch()
+    
+    def pause(self, seconds: float) -> None:
+        """收到429后暂停该部署的调度"""
+        self.rate_limited += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        logger.warning(f"部署 {self.name} 被限流，暂停调度 {seconds:.1f} 秒")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tpm": int(self.token_bucket.capacity) if self.token_bucket is not None else None,
+            "rpm": int(self.request_bucket.capacity) if self.request_bucket is not None else None,
+            "available_tokens": int(self.token_bucket.tokens) if self.token_bucket is not None else None,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "wait": {
+                name: {
+                    "count": stats["count"],
+                    "avg_seconds": round(stats["total_seconds"] / stats["count"], 4) if stats["count"] else 0.0,
+                    "max_seconds": round(stats["max_seconds"], 4)
+                }
+                for name, stats in self.wait.items()
+            }
+        }
+
+class LLMScheduler:
+    """所有模型调用共享的调度器
+    
+    每个部署按 LLM_DEPLOYMENT_LIMITS 的TPM/RPM配额放行请求，交互式请求优先于批量提取；
+    相同key的请求在途时合并为一次调用；遇到429时暂停该部署并重新排队，
+    不让每个请求各自重试形成429风暴。未配置配额的部署不限速，仍统计指标。
+    """
+    
+    def __init__(self, limits: Dict[str, Dict[str, int]] = LLM_DEPLOYMENT_LIMITS,
+                 max_retries: int = LLM_SCHEDULER_MAX_RETRIES):
+        self.limits = limits
+        self.max_retries = max_retries
+        self._limiters: Dict[str, DeploymentLimiter] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+    
+    def limiter(self, deployment: str) -> DeploymentLimiter:
+        limiter = self._limiters.get(deployment)
+        if limiter is None:
+            limits = self.limits.get(deployment) or {}
+            limiter = DeploymentLimiter(deployment, limits.get("tpm"), limits.get("rpm"))
+            self._limiters[deployment] = limiter
+        return limiter
+    
+    @asynccontextmanager
+    async def reserve(self, deployment: str, tokens: float, priority: int = PRIORITY_BULK):
+        """等待并占用配额；调用方通过 reservation.settle 报告实际用量"""
+        limiter = self.limiter(deployment)
+        reservation = await limiter.acquire(tokens, priority)
+        try:
+            yield reservation
+        except BaseException:
+            limiter.release(reservation, failed=True)
+            raise
+        limiter.release(reservation)
+    
+    async def _run(self, deployment: str, call: Callable[[], Awaitable[T]], tokens: float, priority: int) -> T:
+        limiter = self.limiter(deployment)
+        limiter.submitted += 1
+        attempt = 0
+        while True:
+            async with self.reserve(deployment, tokens, priority) as reservation:
+                try:
+                    result = await call()
+                except Exception as e:
+                    delay = rate_limit_delay(e, attempt)
+                    if delay is None or attempt >= self.max_retries:
+                        limiter.failed += 1
+                        raise
+                    # 被拒绝的请求不计token，暂停后重新排队
+                    reservation.settle(0)
+                    limiter.pause(delay)
+                    attempt += 1
+                    continue
+                reservation.settle(usage_tokens(result))
+                limiter.completed += 1
+                return result
+    
+    async def submit(self, deployment: str, call: Callable[[], Awaitable[T]], tokens: float,
+                     priority: int = PRIORITY_BULK, key: Optional[str] = None) -> T:
+        """经配额调度执行一次模型调用
+        
+        tokens为预估的token数(输入加最大输出)；key相同的请求在途时等待同一次调用的结果。
+        """
+        if key is None:
+            return await self._run(deployment, call, tokens, priority)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(deployment, call, tokens, priority))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.limiter(deployment).coalesced += 1
+        # 单个等待方取消时不取消共享的调用
+        return await asyncio.shield(task)
+    
+    def stats(self) -> Dict[str, Any]:
+        """各部署的队列深度、等待时间、合并和限流次数"""
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
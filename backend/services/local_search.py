@@ -0,0 +1,589 @@
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from hashlib import blake2b
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+import numpy as np
+
+from ..config.settings import ENTITY_FIELDS, SEARCH_LOCAL_PATH, SEARCH_LOCAL_MERGE_FACTOR
+from .search_backend import SearchBackend, IndexResult
+
+logger = logging.getLogger(__name__)
+
+# 全文检索的字段(与AI Search索引的可搜索字段一致)，关系只检索对方姓名和描述
+SEARCHABLE_FIELDS = [field for field in ENTITY_FIELDS if field != "photo"]
+RELATIONSHIP_SEARCHABLE_FIELDS = ["target_name", "relationship_description"]
+# 可过滤的字段(与AI Search索引中filterable的字段一致)，按原值建立关键词倒排表
+KEYWORD_FIELDS = [
+    "id", "name", "domain", "gender", "country", "position", "researchFields",
+    "skills", "languages", "relatedPersons", "politicalStance"
+]
+
+# BM25参数(与AI Search默认的相似度算法一致)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 中日韩统一表意文字的连续片段，或字母数字组成的词
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+
+def _runs(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+def _is_cjk(run: str) -> bool:
+    return run[0] > "z"
+
+def tokenize(text: str) -> List[str]:
+    """索引分词: 中文切分为单字和相邻两字，字母数字按词切分(统一为小写半角)"""
+    tokens = []
+    for run in _runs(text):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def query_tokens(text: str) -> List[str]:
+    """查询分词: 两字以上的中文片段只用相邻两字匹配(比单字准确)，单个汉字按单字匹配"""
+    tokens = []
+    for run in _runs(text):
+        if _is_cjk(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def term_hash(term: str) -> int:
+    """词项的64位哈希，跨进程稳定(内置hash()按进程加盐，不能持久化)"""
+    return int.from_bytes(blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def keyword_term(field: str, value: str) -> str:
+    """过滤字段原值对应的词项，以\\x00开头，不会与分词结果冲突"""
+    return f"\x00{field}\x00{value}"
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def _field_texts(document: Dict[str, Any]) -> Iterable[str]:
+    for field in SEARCHABLE_FIELDS:
+        value = document.get(field)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            yield from (_text(item) for item in value if item is not None)
+        else:
+            yield _text(value)
+    for relationship in document.get("relationships") or []:
+        if isinstance(relationship, dict):
+            for key in RELATIONSHIP_SEARCHABLE_FIELDS:
+                if relationship.get(key):
+                    yield _text(relationship[key])
+
+def _keyword_values(document: Dict[str, Any], field: str) -> List[str]:
+    value = document.get(field)
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [_text(item) for item in value if item is not None]
+    return [_text(value)]
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+# OData过滤子集: compile_odata_filter 生成的三种子句，以and连接
+_ODATA_STRING = r"'((?:[^']|'')*)'"
+_FILTER_CLAUSES = [
+    ("any", re.compile(r"(not\s+)?(\w+)/any\(\s*(\w+)\s*:\s*\3\s+eq\s+" + _ODATA_STRING + r"\s*\)")),
+    ("ismatch", re.compile(r"search\.ismatch\(\s*" + _ODATA_STRING + r"\s*,\s*'(\w+)'\s*\)")),
+    ("compare", re.compile(r"(\w+)\s+(eq|ne)\s+" + _ODATA_STRING)),
+]
+_FILTER_AND = re.compile(r"\s+and\s+")
+
+def parse_odata_filter(expression: Optional[str]) -> List[Tuple[str, str, str]]:
+    """解析OData过滤表达式的子集，返回 (运算, 字段, 值) 列表
+    
+    支持可过滤字段的 eq/ne、集合字段的 any(v: v eq '值')(按eq处理，前加not时按ne处理)和 search.ismatch('文本', '字段')，
+    子句之间只支持and；其余写法抛出ValueError。
+    """
+    clauses = []
+    text = (expression or "").strip()
+    position = 0
+    while position < len(text):
+        for kind, pattern in _FILTER_CLAUSES:
+            match = pattern.match(text, position)
+            if match:
+                break
+        else:
+            raise ValueError(f"本地搜索不支持的过滤表达式: {text[position:]}")
+        if kind == "any":
+            op = "ne" if match.group(1) else "eq"
+            field, value = match.group(2), match.group(4).replace("''", "'")
+        elif kind == "ismatch":
+            # 值经过OData和Lucene两层转义
+            op, field = "ismatch", match.group(2)
+            value = re.sub(r"\\(.)", r"\1", match.group(1).replace("''", "'"))
+        else:
+            field, op, value = match.group(1), match.group(2), match.group(3).replace("''", "'")
+        if op == "ismatch" and field not in SEARCHABLE_FIELDS:
+            raise ValueError(f"字段 {field} 不支持全文匹配")
+        if op != "ismatch" and field not in KEYWORD_FIELDS:
+            raise ValueError(f"字段 {field} 不支持过滤")
+        clauses.append((op, field, value))
+        position = match.end()
+        if position < len(text):
+            separator = _FILTER_AND.match(text, position)
+            if separator is None:
+                raise ValueError(f"本地搜索不支持的过滤表达式: {text[position:]}")
+            position = separator.end()
+    return clauses
+
+# 每个段保存的数组
+SEGMENT_ARRAYS = ("terms", "offsets", "docs", "freqs", "lengths", "store", "store_offsets")
+
+def _postings_arrays(terms: np.ndarray, docs: np.ndarray, freqs: np.ndarray, lengths: np.ndarray,
+                     store: np.ndarray, store_offsets: np.ndarray) -> Dict[str, np.ndarray]:
+    """把 (词项, 文档号, 词频) 三元组按词项排序为倒排表；同一词项内保持传入时的文档号顺序"""
+    order = np.argsort(terms, kind="stable")
+    terms = terms[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(terms)) + 1))
+    return {
+        "terms": terms[starts],
+        "offsets": np.append(starts, len(terms)).astype(np.int64),
+        "docs": docs[order],
+        "freqs": freqs[order],
+        "lengths": lengths,
+        "store": store,
+        "store_offsets": store_offsets
+    }
+
+def build_segment_arrays(documents: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """为一批索引文档建立段: 分词、统计词频、加入过滤字段的原值词项并保存文档原文"""
+    hashes: Dict[str, int] = {}
+    terms, docs, freqs, lengths = array("Q"), array("i"), array("H"), array("i")
+    store = bytearray()
+    store_offsets = array("q", [0])
+    for doc, document in enumerate(documents):
+        counts = Counter()
+        for text in _field_texts(document):
+            counts.update(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for field in KEYWORD_FIELDS:
+            for value in _keyword_values(document, field):
+                counts[keyword_term(field, value)] = 1
+        for term, count in counts.items():
+            value = hashes.get(term)
+            if value is None:
+                value = hashes[term] = term_hash(term)
+            terms.append(value)
+            docs.append(doc)
+            freqs.append(min(count, 65535))
+        stored = {key: value for key, value in document.items() if value is not None}
+        store += json.dumps(stored, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        store_offsets.append(len(store))
+    return _postings_arrays(
+        np.frombuffer(terms, dtype=np.uint64), np.frombuffer(docs, dtype=np.int32),
+        np.frombuffer(freqs, dtype=np.uint16), np.frombuffer(lengths, dtype=np.int32),
+        np.frombuffer(bytes(store), dtype=np.uint8), np.frombuffer(store_offsets, dtype=np.int64)
+    )
+
+class Segment:
+    """不可变的索引段，每个数组保存为一个.npy文件，打开时以内存映射方式读取
+    
+    - terms/offsets: 升序的词项哈希，及其倒排表在docs/freqs中的起止位置
+    - docs/freqs: 倒排表(段内文档号、词频)，同一词项内按文档号升序
+    - lengths: 各文档的分词数，用于BM25的长度归一化
+    - store/store_offsets: 各文档的JSON原文
+    """
+    
+    def __init__(self, name: str, arrays: Dict[str, np.ndarray]):
+        self.name = name
+        for key in SEGMENT_ARRAYS:
+            setattr(self, key, arrays[key])
+        self.doc_count = len(self.lengths)
+    
+    @classmethod
+    def open(cls, directory: str, name: str) -> "Segment":
+        path = os.path.join(directory, name)
+        return cls(name, {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in SEGMENT_ARRAYS})
+    
+    @staticmethod
+    def write(directory: str, name: str, arrays: Dict[str, np.ndarray]) -> None:
+        path = os.path.join(directory, name)
+        os.makedirs(path, exist_ok=True)
+        for key in SEGMENT_ARRAYS:
+            np.save(os.path.join(path, f"{key}.npy"), arrays[key])
+    
+    def lookup(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回各词项倒排表的起止位置，段中没有的词项起止相同"""
+        positions = np.minimum(np.searchsorted(self.terms, hashes), len(self.terms) - 1)
+        found = self.terms[positions] == hashes
+        return np.where(found, self.offsets[positions], 0), np.where(found, self.offsets[positions + 1], 0)
+    
+    def matching(self, term: str) -> np.ndarray:
+        """包含词项的文档号"""
+        starts, ends = self.lookup(np.array([term_hash(term)], dtype=np.uint64))
+        return np.asarray(self.docs[starts[0]:ends[0]])
+    
+    def document(self, doc: int) -> Dict[str, Any]:
+        return json.loads(self.store[self.store_offsets[doc]:self.store_offsets[doc + 1]].tobytes())
+
+def merge_segment_arrays(segments: List["SegmentState"]) -> Optional[Dict[str, np.ndarray]]:
+    """合并多个段并丢弃已删除的文档，全部已删除时返回None
+    
+    各段的倒排表展开为三元组、重编文档号后拼接，再按词项稳定排序；段按顺序拼接，
+    同一词项内的文档号仍然升序。
+    """
+    parts: Dict[str, list] = {key: [] for key in ("terms", "docs", "freqs", "lengths", "store", "sizes")}
+    base = 0
+    for state in segments:
+        segment, live = state.segment, ~state.deleted
+        remap = (np.cumsum(live) - 1 + base).astype(np.int32)
+        keep = live[segment.docs]
+        sizes = np.diff(segment.store_offsets)
+        parts["terms"].append(np.repeat(segment.terms, np.diff(segment.offsets))[keep])
+        parts["docs"].append(remap[segment.docs[keep]])
+        parts["freqs"].append(np.asarray(segment.freqs)[keep])
+        parts["lengths"].append(np.asarray(segment.lengths)[live])
+        parts["store"].append(np.asarray(segment.store)[np.repeat(live, sizes)])
+        parts["sizes"].append(sizes[live])
+        base += state.live_docs
+    if not base:
+        return None
+    merged = {key: np.concatenate(values) for key, values in parts.items()}
+    store_offsets = np.concatenate(([0], np.cumsum(merged["sizes"]))).astype(np.int64)
+    return _postings_arrays(
+        merged["terms"], merged["docs"], merged["freqs"], merged["lengths"], merged["store"], store_offsets
+    )
+
+class SegmentState:
+    """段在某个清单版本中的状态: 删除位图(写时复制，查询持有的快照不受后续写入影响)和存活文档统计"""
+    
+    __slots__ = ("segment", "deleted", "deletes_file", "live_docs", "live_length")
+    
+    def __init__(self, segment: Segment, deleted: Optional[np.ndarray] = None, deletes_file: Optional[str] = None):
+        self.segment = segment
+        self.deleted = deleted if deleted is not None else np.zeros(segment.doc_count, dtype=bool)
+        self.deletes_file = deletes_file
+        live = ~self.deleted
+        self.live_docs = int(live.sum())
+        self.live_length = int(np.asarray(segment.lengths)[live].sum())
+
+class LocalSearchBackend(SearchBackend):
+    """本地嵌入式搜索后端: 分段的倒排索引，按BM25相关度排序
+    
+    结构与Lucene类似: 每次 index_documents 把上传的文档写成一个不可变的段，段以内存映射方式打开；
+    更新和删除只在旧段的删除位图中标记。存活文档数处于同一量级(merge_factor 的幂)的段达到
+    merge_factor 个时合并为一个段并清除已删除的文档，段数保持在对数级别。
+    
+    段清单保存在SQLite中，Web进程和工作进程可共享同一目录: 写入在SQLite写事务中串行进行，
+    查询前检查清单是否被其他进程修改并重新加载。上传按完整文档替换(推送队列总是发送全部字段)。
+    """
+    
+    def __init__(self, path: str = SEARCH_LOCAL_PATH, merge_factor: int = SEARCH_LOCAL_MERGE_FACTOR):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.merge_factor = merge_factor
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "manifest.db"), timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS segments (
+                name TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL,
+                deletes TEXT
+            )"""
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._segments: List[SegmentState] = []
+        self._data_version: Optional[int] = None
+        
+        self.searches = 0
+        self.commits = 0
+        self.merges = 0
+    
+    def close(self):
+        """关闭清单数据库，释放段的内存映射"""
+        with self._lock:
+            self._segments = []
+            self._data_version = None
+            self._conn.close()
+    
+    def initialize_search_service(self) -> bool:
+        """打开索引目录中已有的段"""
+        try:
+            with self._lock:
+                self._refresh()
+            logger.info(f"本地搜索索引已打开: {len(self._segments)} 个段, {self.stats()['documents']} 个文档")
+            return True
+        except Exception as e:
+            logger.error(f"打开本地搜索索引失败: {str(e)}")
+            return False
+    
+    def _refresh(self) -> None:
+        """清单被其他连接修改过时重新加载；段文件恰好被其他进程清理时按新清单重试一次"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        for attempt in range(2):
+            rows = self._conn.execute("SELECT name, deletes FROM segments ORDER BY name").fetchall()
+            current = {state.segment.name: state for state in self._segments}
+            try:
+                segments = []
+                for name, deletes_file in rows:
+                    state = current.get(name)
+                    if state is not None and state.deletes_file == deletes_file:
+                        segments.append(state)
+                        continue
+                    segment = state.segment if state is not None else Segment.open(self.path, name)
+                    deleted = np.load(os.path.join(self.path, name, deletes_file)) if deletes_file else None
+                    segments.append(SegmentState(segment, deleted, deletes_file))
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                continue
+            self._segments = segments
+            self._data_version = version
+            return
+    
+    def _next(self, counter: str) -> int:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (counter,)
+        )
+        return self._conn.execute("SELECT value FROM counters WHERE name = ?", (counter,)).fetchone()[0]
+    
+    def _tier(self, docs: int) -> int:
+        tier = 0
+        while docs >= self.merge_factor:
+            docs //= self.merge_factor
+            tier += 1
+        return tier
+    
+    def index_documents(self, uploads: List[Dict[str, Any]], deletes: List[str]) -> list:
+        """写入一个新段并在旧段中标记被替换或删除的文档，必要时合并段，返回逐项的IndexResult"""
+        uploads = list({document["id"]: document for document in uploads}.values())
+        keys = [document["id"] for document in uploads] + list(deletes)
+        if not keys:
+            return []
+        written = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                segments = self._delete(keys, self._next("generation"))
+                if uploads:
+                    segments.append(self._write_segment(build_segment_arrays(uploads), written))
+                segments = self._merge(segments, written)
+                self._conn.execute("DELETE FROM segments")
+                self._conn.executemany(
+                    "INSERT INTO segments (name, doc_count, deletes) VALUES (?, ?, ?)",
+                    [(state.segment.name, state.segment.doc_count, state.deletes_file) for state in segments]
+                )
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                for name in written:
+                    shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                logger.error(f"写入本地搜索索引失败: {str(e)}")
+                raise
+            self._segments = segments
+            self.commits += 1
+            self._collect_garbage()
+        return [IndexResult(key, True, 200) for key in keys]
+    
+    def _write_segment(self, arrays: Dict[str, np.ndarray], written: List[str]) -> SegmentState:
+        name = f"seg-{self._next('segment'):010d}"
+        Segment.write(self.path, name, arrays)
+        written.append(name)
+        return SegmentState(Segment.open(self.path, name))
+    
+    def _delete(self, keys: List[str], generation: int) -> List[SegmentState]:
+        """在已有段中标记这些ID的文档为已删除；有变化的段写入新的删除位图，全部删除的段移出清单"""
+        hashes = np.array([term_hash(keyword_term("id", key)) for key in keys], dtype=np.uint64)
+        segments = []
+        for state in self._segments:
+            starts, ends = state.segment.lookup(hashes)
+            hits = np.flatnonzero(ends > starts)
+            docs = [state.segment.docs[starts[i]:ends[i]] for i in hits]
+            if not docs or state.deleted[np.concatenate(docs)].all():
+                segments.append(state)
+                continue
+            deleted = state.deleted.copy()
+            deleted[np.concatenate(docs)] = True
+            if deleted.all():
+                continue
+            deletes_file = f"deleted-{generation}.npy"
+            np.save(os.path.join(self.path, state.segment.name, deletes_file), deleted)
+            segments.append(SegmentState(state.segment, deleted, deletes_file))
+        return segments
+    
+    def _merge(self, segments: List[SegmentState], written: List[str]) -> List[SegmentState]:
+        """合并存活文档数处于同一量级且数量达到 merge_factor 的段，直到没有可合并的量级"""
+        while True:
+            tiers: Dict[int, List[SegmentState]] = {}
+            for state in segments:
+                tiers.setdefault(self._tier(state.live_docs), []).append(state)
+            group = next((members for _, members in sorted(tiers.items()) if len(members) >= self.merge_factor), None)
+            if group is None:
+                return segments
+            segments = [state for state in segments if all(state is not member for member in group)]
+            arrays = merge_segment_arrays(group)
+            if arrays is not None:
+                segments.append(self._write_segment(arrays, written))
+            self.merges += 1
+    
+    def _collect_garbage(self) -> None:
+        """删除清单不再引用的段目录和删除位图
+        
+        在写事务中进行，不会删除其他进程正在写入、尚未提交的段；其他进程仍在读取的旧段
+        已被内存映射，删除文件不影响其读取。
+        """
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                referenced = dict(self._conn.execute("SELECT name, deletes FROM segments").fetchall())
+                for entry in os.listdir(self.path):
+                    if not entry.startswith("seg-"):
+                        continue
+                    entry_path = os.path.join(self.path, entry)
+                    if entry not in referenced:
+                        shutil.rmtree(entry_path, ignore_errors=True)
+                        continue
+                    for file_name in os.listdir(entry_path):
+                        if file_name.startswith("deleted-") and file_name != referenced[entry]:
+                            os.remove(os.path.join(entry_path, file_name))
+            finally:
+                self._conn.execute("COMMIT")
+        except Exception as e:
+            # 清理失败不影响已提交的写入，下次写入时重试
+            logger.warning(f"清理本地搜索索引文件失败: {str(e)}")
+    
+    def search_entities(self, search_text: str, filter_condition: str = None, top: int = 50) -> List[Dict[str, Any]]:
+        """搜索实体: 查询文本分词后按BM25打分，'*'或空文本返回所有满足过滤条件的文档"""
+        try:
+            clauses = parse_odata_filter(filter_condition)
+            with self._lock:
+                self._refresh()
+                segments = list(self._segments)
+            self.searches += 1
+            
+            hits = self._score(segments, sorted(set(query_tokens(search_text or ""))), clauses, top)
+            results = []
+            for score, index, doc in hits:
+                document = segments[index].segment.document(doc)
+                document["@search.score"] = score
+                results.append(document)
+            return results
+        except Exception as e:
+            logger.error(f"搜索实体失败: {str(e)}")
+            raise
+    
+    def _score(self, segments: List[SegmentState], tokens: List[str], clauses: List[Tuple[str, str, str]],
+               top: int) -> List[Tuple[float, int, int]]:
+        """返回得分最高的 top 个 (得分, 段序号, 段内文档号)"""
+        live_docs = sum(state.live_docs for state in segments)
+        if not live_docs or top <= 0:
+            return []
+        hits = []
+        if not tokens:
+            for index, state in enumerate(segments):
+                docs = np.flatnonzero(self._filter_mask(state, clauses))[:top - len(hits)]
+                hits.extend((1.0, index, int(doc)) for doc in docs)
+                if len(hits) >= top:
+                    break
+            return hits
+        
+        # 文档频率和平均长度按所有段的存活文档统计，各段的得分可以直接比较；
+        # 已删除的文档在合并前仍留在倒排表中，不计入文档频率
+        hashes = np.array([term_hash(token) for token in tokens], dtype=np.uint64)
+        lookups = [state.segment.lookup(hashes) for state in segments]
+        df = np.zeros(len(tokens), dtype=np.int64)
+        postings = []
+        for state, (starts, ends) in zip(segments, lookups):
+            terms = []
+            for term in np.flatnonzero(ends > starts):
+                docs = np.asarray(state.segment.docs[starts[term]:ends[term]])
+                df[term] += np.count_nonzero(~state.deleted[docs])
+                terms.append((term, docs))
+            postings.append(terms)
+        idf = np.maximum(np.log(1 + (live_docs - df + 0.5) / (df + 0.5)), 0)
+        average_length = sum(state.live_length for state in segments) / live_docs
+        for index, (state, (starts, ends), terms) in enumerate(zip(segments, lookups, postings)):
+            segment = state.segment
+            doc_parts, weight_parts = [], []
+            for term, docs in terms:
+                freqs = segment.freqs[starts[term]:ends[term]].astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[docs] / average_length)
+                doc_parts.append(docs)
+                weight_parts.append(idf[term] * freqs * (BM25_K1 + 1) / (freqs + norm))
+            if not doc_parts:
+                continue
+            scores = np.bincount(
+                np.concatenate(doc_parts), weights=np.concatenate(weight_parts), minlength=segment.doc_count
+            )
+            scores[~self._filter_mask(state, clauses)] = 0
+            matched = np.flatnonzero(scores > 0)
+            if len(matched) > top:
+                matched = matched[np.argpartition(-scores[matched], top - 1)[:top]]
+            hits.extend(zip(scores[matched].tolist(), [index] * len(matched), matched.tolist()))
+        hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+        return hits[:top]
+    
+    def _filter_mask(self, state: SegmentState, clauses: List[Tuple[str, str, str]]) -> np.ndarray:
+        """段内满足全部过滤条件的存活文档"""
+        segment = state.segment
+        mask = ~state.deleted
+        for op, field, value in clauses:
+            if op == "ismatch":
+                mask &= self._match_mask(segment, field, value, mask)
+                continue
+            matches = np.zeros(segment.doc_count, dtype=bool)
+            matches[segment.matching(keyword_term(field, value))] = True
+            mask &= ~matches if op == "ne" else matches
+        return mask
+    
+    def _match_mask(self, segment: Segment, field: str, pattern: str, mask: np.ndarray) -> np.ndarray:
+        """search.ismatch: 先用倒排表找出包含全部查询词的文档，再核对该字段原文是否包含查询文本"""
+        candidates = mask.copy()
+        for token in set(query_tokens(pattern)):
+            matches = np.zeros(segment.doc_count, dtype=bool)
+            matches[segment.matching(token)] = True
+            candidates &= matches
+        needle = _normalize(pattern)
+        result = np.zeros(segment.doc_count, dtype=bool)
+        for doc in np.flatnonzero(candidates):
+            value = segment.document(int(doc)).get(field)
+            values = value if isinstance(value, list) else [value]
+            result[doc] = any(needle in _normalize(_text(item)) for item in values if item is not None)
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """段数、存活和已删除的文档数、磁盘占用及查询、写入、合并次数"""
+        with self._lock:
+            segments = list(self._segments)
+        disk_bytes = 0
+        for state in segments:
+            try:
+                disk_bytes += sum(entry.stat().st_size for entry in os.scandir(os.path.join(self.path, state.segment.name)))
+            except FileNotFoundError:
+                # 段已被其他进程合并清理
+                continue
+        return {
+            "segments": len(segments),
+            "documents": sum(state.live_docs for state in segments),
+            "deleted_documents": sum(state.segment.doc_count - state.live_docs for state in segments),
+            "disk_bytes": disk_bytes,
+            "searches": self.searches,
+            "commits": self.commits,
+            "merges": self.merges
+        }
@@ -1,6 +1,10 @@
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+import asyncio
+import httpx
 import json
+import time
 import logging
+from contextvars import ContextVar
 from typing import List, Dict, Any, Optional
 from ..config.settings import (
     AZURE_OPENAI_API_KEY,
@@ -8,20 +12,130 @@ from ..config.settings import (
     AZURE_OPENAI_API_VERSION,
     AZURE_GPT4O_DEPLOYMENT_NAME,
     AZURE_GPT4O_MINI_DEPLOYMENT_NAME,
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_CONNECT_TIMEOUT,
+    LLM_EXTRACTION_MODE,
+    LLM_TIERED_EXTRACTION,
     RELATIONSHIP_TYPES
 )
+from .text_chunker import chunk_text, estimate_tokens, merge_entities, merge_relationships
+from .llm_cache import LLMResponseCache
+from .llm_scheduler import LLMScheduler, PRIORITY_BULK
 
 logger = logging.getLogger(__name__)
 
+# 部署对应的模型名称，参与缓存键，部署更换模型版本时不会误用旧结果
+GPT4O_MODEL = "gpt-4o"
+GPT4O_MINI_MODEL = "gpt-4o-mini"
+
+# 文档提取模式: two_pass 先提取实体再提取关系(两次调用)，single_pass 一次调用同时返回两者
+EXTRACTION_MODES = ("two_pass", "single_pass")
+
+# 当前文档分析的模型用量累计，由 analyze_entity_document 设置，并发的窗口共享同一个字典
+_current_usage: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_usage", default=None)
+
+def _empty_counters() -> Dict[str, Any]:
+    return {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "total_tokens": 0, "seconds": 0.0}
+
+def _empty_usage() -> Dict[str, Any]:
+    """总用量，by_model 按模型(分级提取中即各级)分别累计，failed_calls 为出错后返回空结果的提取调用数"""
+    return {**_empty_counters(), "failed_calls": 0, "by_model": {}}
+
+def _record_usage(model: str, response=None, seconds: float = 0.0) -> None:
+    """累计一次模型调用的用量；response为None表示命中缓存"""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    tier = usage["by_model"].setdefault(model, _empty_counters())
+    for counters in (usage, tier):
+        if response is None:
+            counters["cached_calls"] += 1
+            continue
+        counters["calls"] += 1
+        counters["seconds"] = round(counters["seconds"] + seconds, 3)
+        if response.usage is not None:
+            counters["prompt_tokens"] += response.usage.prompt_tokens
+            counters["completion_tokens"] += response.usage.completion_tokens
+            counters["total_tokens"] += response.usage.total_tokens
+
+def _record_failure() -> None:
+    """累计一次失败的提取调用；调用方已按空结果继续，文档分析据此标记结果不完整"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage["failed_calls"] += 1
+
 class OpenAIService:
-    def __init__(self):
-        self.client = AzureOpenAI(
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None,
+                 cache: Optional[LLMResponseCache] = None,
+                 scheduler: Optional[LLMScheduler] = None):
+        # http_client为共享的httpx.AsyncClient连接池，由服务注册表统一创建
+        # 使用调度器时429由调度器统一暂停和重新排队，客户端不再各自重试
+        self.client = AsyncAzureOpenAI(
             api_key=AZURE_OPENAI_API_KEY,
             api_version=AZURE_OPENAI_API_VERSION,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            http_client=http_client,
+            **({"max_retries": 0} if scheduler is not None else {})
         )
+        self.timeout = httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        self.cache = cache
+        self.scheduler = scheduler
+    
+    async def _create_completion(self, **kwargs):
+        """调用聊天补全接口，等待响应期间让出事件循环；每次调用使用独立的超时"""
+        kwargs.setdefault("timeout", self.timeout)
+        return await self.client.chat.completions.create(**kwargs)
     
-    async def extract_entities_from_text(self, text: str) -> List[Dict[str, Any]]:
+    async def _complete_json(self, system_message: str, text: str, use_cache: bool = True,
+                             model: str = GPT4O_MODEL, deployment: str = AZURE_GPT4O_DEPLOYMENT_NAME,
+                             temperature: float = 0.1, max_tokens: int = 2000) -> Dict[str, Any]:
+        """以JSON模式调用模型并解析结果
+        
+        相同的模型、部署、系统提示、文本和温度命中缓存时直接返回，use_cache=False 时跳过缓存。
+        只缓存成功解析的结果。配置了调度器时按部署配额排队，相同请求在途时合并为一次调用。
+        """
+        key = LLMResponseCache.make_key(model, deployment, system_message, text, temperature)
+        if self.cache is not None:
+            if use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    _record_usage(model)
+                    return cached
+            else:
+                self.cache.record_bypass()
+        
+        async def request():
+            start = time.perf_counter()
+            response = await self._create_completion(
+                model=deployment,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": text}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
+            )
+            _record_usage(model, response, time.perf_counter() - start)
+            return response
+        
+        if self.scheduler is None:
+            response = await request()
+        else:
+            # Azure按输入token加max_tokens计入TPM配额
+            response = await self.scheduler.submit(
+                deployment, request, estimate_tokens(system_message + text) + max_tokens,
+                PRIORITY_BULK, key
+            )
+        result = json.loads(response.choices[0].message.content)
+        
+        if self.cache is not None and use_cache:
+            self.cache.set(key, result)
+        return result
+    
+    async def extract_entities_from_text(self, text: str, use_cache: bool = True) -> List[Dict[str, Any]]:
         """从文本中提取人物实体"""
         try:
             system_message = """
@@ -46,24 +160,15 @@ class OpenAIService:
             请以JSON数组格式返回结果，每个人物为一个对象。如果文本中没有明确提及某个字段，请不要填写该字段。
             """
             
-            response = self.client.chat.completions.create(
-                model=AZURE_GPT4O_DEPLOYMENT_NAME,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.1,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            result = await self._complete_json(system_message, text, use_cache)
             return result.get("entities", [])
         except Exception as e:
             logger.error(f"提取实体失败: {str(e)}")
+            _record_failure()
             return []
     
-    async def extract_relationships(self, text: str, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def extract_relationships(self, text: str, entities: List[Dict[str, Any]],
+                                    use_cache: bool = True) -> List[Dict[str, Any]]:
         """提取文本中实体之间的关系"""
         try:
             # 构建提示
@@ -90,38 +195,165 @@ class OpenAIService:
             只提取文本中明确提及的实体之间的关系。如果文本中没有提及某两个实体之间的关系，请不要生成该关系。
             """
             
-            response = self.client.chat.completions.create(
-                model=AZURE_GPT4O_DEPLOYMENT_NAME,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.1,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            result = await self._complete_json(system_message, text, use_cache)
             return result.get("relationships", [])
         except Exception as e:
             logger.error(f"提取关系失败: {str(e)}")
+            _record_failure()
             return []
     
-    async def analyze_entity_document(self, text: str) -> Dict[str, Any]:
-        """分析包含人物信息的文档，提取实体和关系"""
+    async def extract_entities_and_relationships(self, text: str, use_cache: bool = True) -> Dict[str, Any]:
+        """一次调用同时提取人物实体和实体之间的关系"""
         try:
-            # 1. 提取实体
-            entities = await self.extract_entities_from_text(text)
+            strong_keywords = ", ".join(RELATIONSHIP_TYPES["STRONG"]["keywords"])
+            weak_keywords = ", ".join(RELATIONSHIP_TYPES["WEAK"]["keywords"])
             
-            # 2. 如果找到实体，提取关系
+            system_message = f"""
+            你是一个专业的信息和关系提取助手。请从提供的文本中提取所有人物实体，以及这些人物之间的关系。
+
+            人物实体包括以下字段(如文本中提及):
+            - 姓名(name): 必填
+            - 所属领域(domain)、性别(gender)、出生日期(birthDate)、国家(country)、职位(position): 可选
+            - 地址(address)、电话(phone)、邮箱(email): 可选
+            - 研究领域(researchFields)、技能技巧(skills): 可选，列表形式
+            - 个人简介(personalDescription)、社交账号(socialAccounts)、社会关系(socialRelationships): 可选
+            - 工作经历(workExperience)、教育经历(educationExperience): 可选
+
+            关系分为两类:
+            1. 强关系: 直接指出的关系，如{strong_keywords}。
+            2. 弱关系: 间接关系，如{weak_keywords}。
+            每个关系包含: source_name、target_name(均为上面提取的人物姓名)、
+            relationship_type("STRONG"或"WEAK")、relationship_description、confidence(0-1之间的小数)。
+
+            请以JSON对象返回结果: {{"entities": [人物对象...], "relationships": [关系对象...]}}。
+            如果文本中没有明确提及某个字段，请不要填写该字段；只提取文本中明确提及的关系。
+            """
+            
+            result = await self._complete_json(system_message, text, use_cache, max_tokens=4000)
+            return {
+                "entities": result.get("entities", []),
+                "relationships": result.get("relationships", [])
+            }
+        except Exception as e:
+            logger.error(f"提取实体和关系失败: {str(e)}")
+            _record_failure()
+            return {"entities": [], "relationships": []}
+    
+    async def classify_chunk(self, text: str, use_cache: bool = True) -> Dict[str, bool]:
+        """用GPT-4o-mini判断文本是否提及人物及人物之间的关系
+        
+        分类失败时视为两者都提及，交由GPT-4o正常提取，避免漏掉实体。
+        """
+        try:
+            system_message = """
+            你是一个文本分类助手。请判断提供的文本是否提及具体的人物(有姓名的个人)，
+            以及是否描述了人物之间的关系(如亲属、同事、师生、合作等)。
+            请以JSON对象返回: {"has_people": true或false, "has_relationships": true或false}。
+            """
+            
+            result = await self._complete_json(
+                system_message, text, use_cache,
+                model=GPT4O_MINI_MODEL, deployment=AZURE_GPT4O_MINI_DEPLOYMENT_NAME,
+                temperature=0, max_tokens=50
+            )
+            has_people = bool(result.get("has_people", True))
+            return {
+                "has_people": has_people,
+                "has_relationships": has_people and bool(result.get("has_relationships", True))
+            }
+        except Exception as e:
+            logger.error(f"文本分类失败: {str(e)}")
+            return {"has_people": True, "has_relationships": True}
+    
+    async def _analyze_chunk(self, index: int, chunk: str, semaphore: asyncio.Semaphore,
+                             use_cache: bool = True, mode: str = "two_pass",
+                             tiered: bool = False) -> Dict[str, Any]:
+        """提取单个窗口中的实体和关系，并记录耗时
+        
+        tiered=True 时先由GPT-4o-mini分类，未提及人物的窗口不再调用GPT-4o；
+        two_pass 模式下未提及关系的窗口跳过关系提取。
+        """
+        start = time.perf_counter()
+        classification = None
+        if tiered:
+            async with semaphore:
+                classification = await self.classify_chunk(chunk, use_cache)
+        classify_seconds = round(time.perf_counter() - start, 3)
+        
+        if classification is not None and not classification["has_people"]:
+            entities, relationships = [], []
+        elif mode == "single_pass":
+            async with semaphore:
+                result = await self.extract_entities_and_relationships(chunk, use_cache)
+            entities, relationships = result["entities"], result["relationships"]
+        else:
+            async with semaphore:
+                entities = await self.extract_entities_from_text(chunk, use_cache)
             relationships = []
-            if entities:
-                relationships = await self.extract_relationships(text, entities)
+            if entities and (classification is None or classification["has_relationships"]):
+                async with semaphore:
+                    relationships = await self.extract_relationships(chunk, entities, use_cache)
+        return {
+            "entities": entities,
+            "relationships": relationships,
+            "timing": {
+                "index": index,
+                "tokens": estimate_tokens(chunk),
+                "entities": len(entities),
+                "relationships": len(relationships),
+                "seconds": round(time.perf_counter() - start, 3)
+            },
+            "route": None if classification is None else {
+                "index": index,
+                **classification,
+                "extracted": classification["has_people"],
+                "classify_seconds": classify_seconds,
+                "extract_seconds": round(time.perf_counter() - start - classify_seconds, 3)
+            }
+        }
+    
+    async def analyze_entity_document(self, text: str, use_cache: bool = True,
+                                      mode: str = LLM_EXTRACTION_MODE,
+                                      tiered: bool = LLM_TIERED_EXTRACTION) -> Dict[str, Any]:
+        """分析包含人物信息的文档，提取实体和关系
+        
+        文档按段落切分为有重叠、不超过token预算的窗口，各窗口并发提取
+        (同时在途的请求不超过 LLM_MAX_CONCURRENCY)，再按姓名合并去重。
+        返回结果中的chunks记录每个窗口的token估算、提取数量和耗时。
+        use_cache=False 时跳过模型响应缓存，强制重新调用模型。
+        mode 为 two_pass 或 single_pass，usage 记录模型调用次数、缓存命中次数和token用量。
+        tiered=True 时每个窗口先经GPT-4o-mini分类，routing 记录各窗口的分级决策和各级耗时。
+        """
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"不支持的提取模式: {mode}")
+        
+        usage = _empty_usage()
+        token = _current_usage.set(usage)
+        try:
+            chunks = chunk_text(text)
+            semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._analyze_chunk(index, chunk, semaphore, use_cache, mode, tiered)
+                for index, chunk in enumerate(chunks)
+            ))
             
+            routes = [result["route"] for result in results if result["route"] is not None]
             return {
-                "entities": entities,
-                "relationships": relationships
+                "entities": merge_entities([result["entities"] for result in results]),
+                "relationships": merge_relationships([result["relationships"] for result in results]),
+                "chunks": [result["timing"] for result in results],
+                "mode": mode,
+                "tiered": tiered,
+                "routing": {
+                    "chunks": len(routes),
+                    "extracted": sum(1 for route in routes if route["extracted"]),
+                    "skipped": sum(1 for route in routes if not route["extracted"]),
+                    "decisions": routes
+                } if tiered else None,
+                "usage": usage
             }
         except Exception as e:
             logger.error(f"分析文档失败: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+        finally:
+            _current_usage.reset(token) 
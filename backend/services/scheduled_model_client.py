@@ -0,0 +1,122 @@
+import hashlib
+import json
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelCapabilities, ModelInfo, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+
+from .llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, usage_tokens
+from .text_chunker import estimate_tokens
+
+# 未指定max_tokens时按此估算输出token，计入TPM配额
+DEFAULT_COMPLETION_TOKENS = 1000
+
+class ScheduledChatCompletionClient(ChatCompletionClient):
+    """经 LLMScheduler 调度的AutoGen模型客户端
+    
+    包装 OpenAIChatCompletionClient: 智能体的每次调用先按部署配额排队(默认交互式优先级，
+    先于批量提取获得配额)，不带工具的相同请求在途时合并为一次调用，其余接口委托给被包装的客户端。
+    """
+    
+    def __init__(self, client: ChatCompletionClient, scheduler: LLMScheduler, deployment: str,
+                 priority: int = PRIORITY_INTERACTIVE):
+        self._client = client
+        self._scheduler = scheduler
+        self._deployment = deployment
+        self._priority = priority
+    
+    def _estimate_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema],
+                         extra_create_args: Mapping[str, Any]) -> int:
+        try:
+            prompt_tokens = self._client.count_tokens(messages, tools=tools)
+        except Exception:
+            # 部署名无法映射到分词器时按字符粗略估算
+            prompt_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        return prompt_tokens + int(extra_create_args.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+    
+    def _request_key(self, messages: Sequence[LLMMessage], json_output: Any,
+                     extra_create_args: Mapping[str, Any]) -> str:
+        payload = json.dumps(
+            [
+                self._deployment,
+                [message.model_dump(mode="json") for message in messages],
+                str(json_output),
+                dict(extra_create_args)
+            ],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        async def call() -> CreateResult:
+            return await self._client.create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token
+            )
+        
+        # 工具对象无法稳定序列化，带工具的调用不合并
+        key = None if tools else self._request_key(messages, json_output, extra_create_args)
+        return await self._scheduler.submit(
+            self._deployment, call, self._estimate_tokens(messages, tools, extra_create_args),
+            self._priority, key
+        )
+    
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        limiter = self._scheduler.limiter(self._deployment)
+        limiter.submitted += 1
+        tokens = self._estimate_tokens(messages, tools, extra_create_args)
+        try:
+            async with self._scheduler.reserve(self._deployment, tokens, self._priority) as reservation:
+                async for item in self._client.create_stream(
+                    messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                    extra_create_args=extra_create_args, cancellation_token=cancellation_token
+                ):
+                    if isinstance(item, CreateResult):
+                        reservation.settle(usage_tokens(item))
+                    yield item
+        except Exception:
+            limiter.failed += 1
+            raise
+        limiter.completed += 1
+    
+    async def close(self) -> None:
+        await self._client.close()
+    
+    def actual_usage(self) -> RequestUsage:
+        return self._client.actual_usage()
+    
+    def total_usage(self) -> RequestUsage:
+        return self._client.total_usage()
+    
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._client.count_tokens(messages, tools=tools)
+    
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._client.remaining_tokens(messages, tools=tools)
+    
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        return self._client.capabilities
+    
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._client.model_info
@@ -0,0 +1,31 @@
+from typing import List, Dict, Any, NamedTuple, Optional
+
+class IndexResult(NamedTuple):
+    """单个文档的写入结果，字段与 azure.search.documents 的 IndexingResult 一致"""
+    key: str
+    succeeded: bool
+    status_code: int
+    error_message: Optional[str] = None
+
+class SearchBackend:
+    """实体搜索后端接口
+    
+    由 SEARCH_BACKEND 配置选择实现: AISearchService(Azure AI Search)或 LocalSearchBackend(本地嵌入式索引)。
+    写入由 SearchIndexQueue 调用 index_documents，查询由实体路由调用 search_entities，
+    过滤条件为 compile_odata_filter 生成的OData表达式。
+    """
+    
+    def initialize_search_service(self) -> bool:
+        """创建索引等初始化工作，成功返回True"""
+        raise NotImplementedError
+    
+    def index_documents(self, uploads: List[Dict[str, Any]], deletes: List[str]) -> list:
+        """写入索引文档(to_search_document 的结果)并删除指定ID的文档，返回逐项的写入结果"""
+        raise NotImplementedError
+    
+    def search_entities(self, search_text: str, filter_condition: str = None, top: int = 50) -> List[Dict[str, Any]]:
+        """全文搜索实体，按相关度降序返回文档，文档中的@search.score为相关度得分"""
+        raise NotImplementedError
+    
+    def close(self):
+        """释放客户端或文件句柄"""
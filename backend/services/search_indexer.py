@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+from azure.core.exceptions import HttpResponseError
+
+from ..config.settings import (
+    SEARCH_PUSH_BATCH_SIZE, SEARCH_PUSH_BATCH_BYTES, SEARCH_PUSH_FLUSH_INTERVAL,
+    SEARCH_PUSH_MAX_PENDING, SEARCH_PUSH_MAX_RETRIES
+)
+from .ai_search_service import to_search_document
+from .search_backend import SearchBackend
+
+logger = logging.getLogger(__name__)
+
+# 可重试的状态码: 409/422为并发写同一文档的冲突，429/503为限流，其余为服务端临时错误
+RETRYABLE_STATUS = {409, 422, 429, 500, 502, 503, 504}
+
+class PendingChange:
+    """队列中某个实体待推送的最新变更"""
+    
+    __slots__ = ("action", "document", "size", "enqueued_at", "attempts")
+    
+    def __init__(self, action: str, document: Optional[Dict[str, Any]], enqueued_at: float, attempts: int = 0):
+        self.action = action
+        self.document = document
+        self.size = len(json.dumps(document, ensure_ascii=False).encode("utf-8")) if document else 64
+        self.enqueued_at = enqueued_at
+        self.attempts = attempts
+
+class SearchIndexQueue:
+    """把实体变更推送到搜索索引(AI Search或本地索引)的队列
+    
+    作为 AsyncCosmosDBService 的变更监听器注册: 实体写入排入merge_or_upload，删除排入delete，
+    同一实体在推送前的多次变更只保留最新一次。后台任务在攒满 batch_size 个文档(或 batch_bytes 字节)
+    或最早的变更等待超过 flush_interval 秒时推送一批；积压达到 max_pending 时写入方等待(背压)。
+    推送失败的文档按指数退避重试，超过 max_retries 次后丢弃并计入失败数。
+    """
+    
+    def __init__(self, search_service: SearchBackend, batch_size: int = SEARCH_PUSH_BATCH_SIZE,
+                 batch_bytes: int = SEARCH_PUSH_BATCH_BYTES, flush_interval: float = SEARCH_PUSH_FLUSH_INTERVAL,
+                 max_pending: int = SEARCH_PUSH_MAX_PENDING, max_retries: int = SEARCH_PUSH_MAX_RETRIES):
+        self.search_service = search_service
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending: "OrderedDict[str, PendingChange]" = OrderedDict()
+        self._condition = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        
+        self.enqueued = 0
+        self.batches = 0
+        self.indexed = 0
+        self.deleted = 0
+        self.retried = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.in_flight = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_error: Optional[str] = None
+    
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+    
+    def start(self) -> None:
+        """启动后台推送任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def close(self) -> None:
+        """推送完队列中剩余的变更后停止"""
+        if self._task is None:
+            return
+        async with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        await self._task
+        self._task = None
+    
+    async def enqueue(self, event: str, document: Dict[str, Any]) -> None:
+        """变更监听器: 排入实体的写入或删除，队列已满时等待推送腾出空间"""
+        if event == "entity_upserted":
+            change = ("upload", to_search_document(document))
+        elif event == "entity_deleted":
+            change = ("delete", None)
+        else:
+            return
+        entity_id = document["id"]
+        
+        async with self._condition:
+            while len(self._pending) >= self.max_pending and entity_id not in self._pending:
+                self.backpressure_waits += 1
+                await self._condition.wait()
+            previous = self._pending.pop(entity_id, None)
+            enqueued_at = previous.enqueued_at if previous is not None else time.monotonic()
+            self._pending[entity_id] = PendingChange(*change, enqueued_at)
+            self.enqueued += 1
+            self._condition.notify_all()
+    
+    def _take_batch(self) -> List[Tuple[str, PendingChange]]:
+        batch = []
+        size = 0
+        while self._pending and len(batch) < self.batch_size:
+            entity_id, change = next(iter(self._pending.items()))
+            if batch and size + change.size > self.batch_bytes:
+                break
+            self._pending.popitem(last=False)
+            batch.append((entity_id, change))
+            size += change.size
+        return batch
+    
+    async def _run(self) -> None:
+        while True:
+            async with self._condition:
+                while not self._pending and not self._closing:
+                    await self._condition.wait()
+                if not self._pending:
+                    return
+                # 攒批: 直到批次已满、最早的变更等待超过flush_interval或正在关闭
+                while len(self._pending) < self.batch_size and not self._closing:
+                    oldest = next(iter(self._pending.values())).enqueued_at
+                    remaining = self.flush_interval - (time.monotonic() - oldest)
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch = self._take_batch()
+                self.in_flight = len(batch)
+                self._condition.notify_all()
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # 不让单批的意外错误终止推送任务
+                logger.error(f"推送搜索索引失败: {str(e)}")
+            self.in_flight = 0
+    
+    async def _flush(self, batch: List[Tuple[str, PendingChange]]) -> None:
+        uploads = [change.document for _, change in batch if change.action == "upload"]
+        deletes = [entity_id for entity_id, change in batch if change.action == "delete"]
+        start = time.monotonic()
+        retry: List[Tuple[str, PendingChange]] = []
+        try:
+            results = await asyncio.to_thread(self.search_service.index_documents, uploads, deletes)
+        except HttpResponseError as e:
+            self.last_error = str(e)
+            if e.status_code is not None and e.status_code not in RETRYABLE_STATUS:
+                self._fail(batch, e.status_code)
+                return
+            retry = batch
+        except Exception as e:
+            # 网络错误等，整批重试
+            self.last_error = str(e)
+            retry = batch
+        else:
+            changes = dict(batch)
+            for result in results:
+                change = changes.get(result.key)
+                if change is None:
+                    continue
+                if result.succeeded:
+                    if change.action == "upload":
+                        self.indexed += 1
+                    else:
+                        self.deleted += 1
+                elif result.status_code in RETRYABLE_STATUS:
+                    retry.append((result.key, change))
+                else:
+                    self.last_error = result.error_message
+                    self._fail([(result.key, change)], result.status_code)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_seconds = time.monotonic() - start
+        if retry:
+            await self._retry(retry)
+    
+    def _fail(self, changes: List[Tuple[str, PendingChange]], status_code: Optional[int]) -> None:
+        self.failed += len(changes)
+        logger.error(f"{len(changes)} 个实体推送到搜索索引失败(状态码 {status_code})，例如 {changes[0][0]}")
+    
+    async def _retry(self, changes: List[Tuple[str, PendingChange]]) -> None:
+        """退避后把失败的变更放回队首；期间已有更新的变更时以新变更为准"""
+        attempt = max(change.attempts for _, change in changes)
+        exhausted = [(entity_id, change) for entity_id, change in changes if change.attempts >= self.max_retries]
+        if exhausted:
+            self._fail(exhausted, None)
+        changes = [(entity_id, change) for entity_id, change in changes if change.attempts < self.max_retries]
+        if not changes:
+            return
+        self.retried += len(changes)
+        # 限流时整个队列一起等待，不继续向服务端发送请求
+        await asyncio.sleep(min(self.flush_interval * 2 ** attempt, 30.0) * random.uniform(0.5, 1.0))
+        async with self._condition:
+            for entity_id, change in reversed(changes):
+                if entity_id in self._pending:
+                    continue
+                change.attempts += 1
+                self._pending[entity_id] = change
+                self._pending.move_to_end(entity_id, last=False)
+            self._condition.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        """队列积压、推送批次、成功/重试/失败数和最早变更的等待秒数"""
+        oldest = next(iter(self._pending.values())).enqueued_at if self._pending else None
+        return {
+            "pending": len(self._pending),
+            "in_flight": self.in_flight,
+            "max_pending": self.max_pending,
+            "lag_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "batches": self.batches,
+            "indexed": self.indexed,
+            "deleted": self.deleted,
+            "retried": self.retried,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_seconds": round(self.last_batch_seconds, 3),
+            "last_error": self.last_error
+        }
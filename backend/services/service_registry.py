@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+import httpx
+from requests import Session
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import AioHttpTransport, RequestsTransport
+
+from ..config.settings import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    GRAPH_PRELOAD,
+    LLM_CACHE_ENABLED,
+    LLM_SCHEDULER_ENABLED,
+    JOB_EMBEDDED_WORKER,
+    ENTITY_RESOLUTION_ENABLED,
+    SEARCH_BACKEND,
+    SEARCH_INDEXING_MODE,
+    CHANGE_FEED_ENABLED
+)
+from .cosmos_service import CosmosDBService
+from .async_cosmos_service import AsyncCosmosDBService
+from .search_backend import SearchBackend
+from .ai_search_service import AISearchService
+from .local_search import LocalSearchBackend
+from .search_indexer import SearchIndexQueue
+from .file_processor import FileProcessor
+from .openai_service import OpenAIService
+from .autogen_service import AutoGenService
+from .graph_service import RelationshipGraph
+from .content_index import ContentHashIndex
+from .llm_cache import LLMResponseCache
+from .llm_scheduler import LLMScheduler
+from .job_store import JobStore
+from .entity_resolution import EntityResolutionIndex, EntityResolver
+from .change_feed import ChangeFeedLeaseStore, ChangeFeedProcessor, CosmosChangeFeedSource, listener_handler
+from .ingestion_pipeline import IngestionPipeline, JobWorker
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """应用生命周期内共享的服务实例注册表
+    
+    服务在应用启动时创建一次，所有路由复用同一组客户端和HTTP连接池，
+    应用关闭时统一释放。启动前访问服务时按需懒加载创建。
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._services: Dict[str, Any] = {}
+        self._session = None
+        self._transport = None
+        self._aio_session = None
+        self._async_transport = None
+        self._async_http_client = None
+        self._background_tasks = []
+    
+    @property
+    def transport(self) -> RequestsTransport:
+        """Azure SDK客户端共享的HTTP传输层"""
+        if self._transport is None:
+            with self._lock:
+                if self._transport is None:
+                    session = Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=HTTP_POOL_CONNECTIONS,
+                        pool_maxsize=HTTP_POOL_MAXSIZE
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    # session_owner=False: 客户端关闭时不关闭共享会话，由注册表负责释放
+                    self._transport = RequestsTransport(session=session, session_owner=False)
+        return self._transport
+    
+    @property
+    def async_transport(self) -> AioHttpTransport:
+        """异步Azure SDK客户端共享的aiohttp传输层(须在事件循环中首次访问)"""
+        if self._async_transport is None:
+            with self._lock:
+                if self._async_transport is None:
+                    connector = aiohttp.TCPConnector(
+                        limit=HTTP_POOL_MAXSIZE,
+                        limit_per_host=HTTP_POOL_MAXSIZE
+                    )
+                    self._aio_session = aiohttp.ClientSession(connector=connector)
+                    self._async_transport = AioHttpTransport(session=self._aio_session, session_owner=False)
+        return self._async_transport
+    
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        """OpenAI异步客户端共享的httpx连接池"""
+        if self._async_http_client is None:
+            with self._lock:
+                if self._async_http_client is None:
+                    self._async_http_client = httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=HTTP_POOL_MAXSIZE,
+                            max_keepalive_connections=HTTP_POOL_CONNECTIONS
+                        )
+                    )
+        return self._async_http_client
+    
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = factory()
+                    self._services[name] = service
+                    logger.info(f"服务 {name} 创建成功")
+        return service
+    
+    @property
+    def cosmos_service(self) -> CosmosDBService:
+        return self._get("cosmos", lambda: CosmosDBService(transport=self.transport))
+    
+    @property
+    def async_cosmos_service(self) -> AsyncCosmosDBService:
+        return self._get("async_cosmos", lambda: AsyncCosmosDBService(transport=self.async_transport))
+    
+    @property
+    def relationship_graph(self) -> RelationshipGraph:
+        return self._get("graph", RelationshipGraph)
+    
+    @property
+    def search_service(self) -> SearchBackend:
+        if SEARCH_BACKEND == "local":
+            return self._get("search", LocalSearchBackend)
+        return self._get("search", lambda: AISearchService(transport=self.transport))
+    
+    @property
+    def search_index_queue(self) -> Optional[SearchIndexQueue]:
+        # 本地后端没有索引器，总是由队列推送
+        if SEARCH_INDEXING_MODE != "push" and SEARCH_BACKEND != "local":
+            return None
+        return self._get("search_index_queue", lambda: SearchIndexQueue(self.search_service))
+    
+    @property
+    def file_processor(self) -> FileProcessor:
+        return self._get("file_processor", lambda: FileProcessor(transport=self.transport, async_transport=self.async_transport))
+    
+    @property
+    def content_index(self) -> ContentHashIndex:
+        return self._get("content_index", ContentHashIndex)
+    
+    @property
+    def llm_cache(self) -> Optional[LLMResponseCache]:
+        if not LLM_CACHE_ENABLED:
+            return None
+        return self._get("llm_cache", LLMResponseCache)
+    
+    @property
+    def llm_scheduler(self) -> Optional[LLMScheduler]:
+        if not LLM_SCHEDULER_ENABLED:
+            return None
+        return self._get("llm_scheduler", LLMScheduler)
+    
+    @property
+    def openai_service(self) -> OpenAIService:
+        return self._get("openai", lambda: OpenAIService(
+            http_client=self.async_http_client,
+            cache=self.llm_cache,
+            scheduler=self.llm_scheduler
+        ))
+    
+    @property
+    def autogen_service(self) -> AutoGenService:
+        return self._get("autogen", lambda: AutoGenService(scheduler=self.llm_scheduler))
+    
+    @property
+    def job_store(self) -> JobStore:
+        return self._get("job_store", JobStore)
+    
+    @property
+    def entity_index(self) -> EntityResolutionIndex:
+        return self._get("entity_index", EntityResolutionIndex)
+    
+    @property
+    def entity_resolver(self) -> Optional[EntityResolver]:
+        if not ENTITY_RESOLUTION_ENABLED:
+            return None
+        return self._get("entity_resolver", lambda: EntityResolver(self.entity_index, self.async_cosmos_service))
+    
+    @property
+    def change_feed_leases(self) -> ChangeFeedLeaseStore:
+        return self._get("change_feed_leases", ChangeFeedLeaseStore)
+    
+    @property
+    def ingestion_pipeline(self) -> IngestionPipeline:
+        return self._get("ingestion_pipeline", lambda: IngestionPipeline(
+            store=self.job_store,
+            file_processor=self.file_processor,
+            cosmos_service=self.async_cosmos_service,
+            openai_service=self.openai_service,
+            content_index=self.content_index,
+            resolver=self.entity_resolver
+        ))
+    
+    async def startup(self) -> None:
+        """创建并初始化所有服务"""
+        # 同步客户端仅用于启动时初始化数据库和离线工具，路由使用异步客户端
+        cosmos_service = self.cosmos_service
+        if cosmos_service.initialize_database():
+            logger.info("Cosmos DB 初始化成功")
+        else:
+            logger.error("Cosmos DB 初始化失败")
+        
+        search_service = self.search_service
+        if search_service.initialize_search_service():
+            logger.info(f"搜索后端({SEARCH_BACKEND}) 初始化成功")
+        else:
+            logger.error(f"搜索后端({SEARCH_BACKEND}) 初始化失败")
+        
+        # 其余服务依赖外部资源可能暂不可用，失败时保留懒加载重试的机会
+        for name in ("async_cosmos_service", "file_processor", "openai_service", "autogen_service"):
+            try:
+                getattr(self, name)
+            except Exception as e:
+                logger.error(f"创建服务 {name} 失败: {str(e)}")
+        
+        # 关系图通过写入监听保持同步(独立工作进程的写入由变更源同步)，全量加载在后台进行，不阻塞启动
+        graph = self.relationship_graph
+        async_cosmos_service = self.async_cosmos_service
+        async_cosmos_service.add_change_listener(graph.apply_change)
+        if GRAPH_PRELOAD:
+            self._background_tasks.append(asyncio.create_task(graph.load(async_cosmos_service)))
+        
+        self.start_search_indexing()
+        self.start_change_feed(web=True)
+        
+        # 删除的实体从消解索引中移除
+        entity_resolver = self.entity_resolver
+        if entity_resolver is not None:
+            async_cosmos_service.add_change_listener(entity_resolver.apply_change)
+        
+        # 开发环境可在Web进程内处理上传任务，生产环境运行独立的 backend.worker 进程
+        if JOB_EMBEDDED_WORKER:
+            worker = JobWorker(self.job_store, self.ingestion_pipeline)
+            self._background_tasks.append(asyncio.create_task(worker.run()))
+    
+    def start_search_indexing(self) -> None:
+        """推送模式下把实体写入变更排入搜索索引队列；Web进程和工作进程启动时各调用一次"""
+        queue = self.search_index_queue
+        if queue is None or queue.started:
+            return
+        if CHANGE_FEED_ENABLED:
+            # 写入由变更源处理器排队；删除不出现在变更源中，仍由监听器排队
+            self.async_cosmos_service.add_change_listener(
+                lambda event, document: queue.enqueue(event, document) if event == "entity_deleted" else None
+            )
+        else:
+            self.async_cosmos_service.add_change_listener(queue.enqueue)
+        queue.start()
+    
+    def start_change_feed(self, web: bool = False) -> None:
+        """启动变更源处理器
+        
+        - derived-views(CHANGE_FEED_ENABLED为true时): 实体容器的变更推送到搜索索引、刷新消解索引，
+          Web进程和工作进程共享租约库分摊分区，任何进程(包括外部工具)写入的实体都会同步
+        - 进程内视图(仅Web进程，CHANGE_FEED_ENABLED为true或JOB_EMBEDDED_WORKER为false时): 实体和关系容器的变更
+          更新本进程的关系图和分区路由缓存，租约只在内存中，每个Web进程各自从启动时刻读取全部分区。
+          上传任务由独立工作进程处理时，其写入不会触发Web进程内的监听器，只能从变更源得知
+        """
+        cosmos_service = self.async_cosmos_service
+        
+        def shared_processor() -> ChangeFeedProcessor:
+            processor = ChangeFeedProcessor(
+                "derived-views", CosmosChangeFeedSource(cosmos_service.entities_container), self.change_feed_leases
+            )
+            if self.search_index_queue is not None:
+                processor.add_handler(listener_handler(self.search_index_queue.enqueue, "entity_upserted"))
+            if self.entity_resolver is not None:
+                processor.add_handler(self.entity_resolver.apply_documents)
+            return processor
+        
+        if CHANGE_FEED_ENABLED:
+            self._get("change_feed", shared_processor).start()
+        if not web or (JOB_EMBEDDED_WORKER and not CHANGE_FEED_ENABLED):
+            return
+        
+        graph = self.relationship_graph
+        local_leases = self._get("local_change_feed_leases", lambda: ChangeFeedLeaseStore(":memory:"))
+        
+        async def refresh_partition_index(documents):
+            for document in documents:
+                cosmos_service.partition_index.put(document["id"], document["name"])
+        
+        self._get("entity_view_feed", lambda: ChangeFeedProcessor(
+            "entity-views",
+            CosmosChangeFeedSource(cosmos_service.entities_container, start_from_beginning=False),
+            local_leases,
+            [listener_handler(graph.apply_change, "entity_upserted"), refresh_partition_index]
+        )).start()
+        self._get("edge_view_feed", lambda: ChangeFeedProcessor(
+            "edge-views",
+            CosmosChangeFeedSource(cosmos_service.relationships_container, start_from_beginning=False),
+            local_leases,
+            [listener_handler(graph.apply_change, "edge_upserted")]
+        )).start()
+    
+    def change_feed_processors(self) -> List[ChangeFeedProcessor]:
+        """当前进程中运行的变更源处理器"""
+        return [
+            self._services[name] for name in ("change_feed", "entity_view_feed", "edge_view_feed")
+            if name in self._services
+        ]
+    
+    async def shutdown(self) -> None:
+        """释放所有服务和共享连接池"""
+        for task in self._background_tasks:
+            task.cancel()
+        self._background_tasks = []
+        
+        with self._lock:
+            services = self._services
+            self._services = {}
+        
+        # 按创建的逆序关闭，依赖其他服务的服务(如搜索推送队列)先推送完剩余数据
+        for name, service in reversed(list(services.items())):
+            close = getattr(service, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if hasattr(result, "__await__"):
+                    await result
+            except Exception as e:
+                logger.error(f"关闭服务 {name} 失败: {str(e)}")
+        
+        if self._async_http_client is not None:
+            await self._async_http_client.aclose()
+            self._async_http_client = None
+        if self._aio_session is not None:
+            await self._aio_session.close()
+            self._aio_session = None
+            self._async_transport = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._transport = None
+        logger.info("所有服务已释放")
+
+# 进程级单例
+service_registry = ServiceRegistry()
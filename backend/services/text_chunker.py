@@ -0,0 +1,147 @@
+import re
+import json
+from typing import List, Dict, Any, Tuple
+from ..config.settings import LLM_CHUNK_MAX_TOKENS, LLM_CHUNK_OVERLAP_TOKENS
+
+# 中日韩字符(每个字符约一个token)
+CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# 句末标点，超长段落按句子切分
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？；!?;.])\s*")
+# 判断同名是否为同一人的身份字段，取值冲突时视为不同的人
+IDENTITY_FIELDS = ["birthDate", "email", "phone", "idCard", "passportNumber"]
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数: 中日韩字符按1个token，其余字符按4个字符1个token"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _split_long_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    """超过预算的段落先按句子切分，单个句子仍超长时按字符硬切"""
+    pieces = []
+    current = ""
+    for sentence in SENTENCE_PATTERN.split(paragraph):
+        if not sentence:
+            continue
+        while estimate_tokens(sentence) > max_tokens:
+            # 按估算比例截取，保证每段不超过预算
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if current and estimate_tokens(current + sentence) > max_tokens:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_text(text: str, max_tokens: int = LLM_CHUNK_MAX_TOKENS,
+               overlap_tokens: int = LLM_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """按段落边界把文本切分为有重叠的窗口
+    
+    每个窗口不超过max_tokens(估算值)；相邻窗口之间重复前一窗口末尾不超过
+    overlap_tokens的完整段落，避免跨段落的人物信息被截断。
+    """
+    paragraphs: List[Tuple[str, int]] = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in _split_long_paragraph(paragraph, max_tokens):
+            paragraphs.append((piece, estimate_tokens(piece) + 1))
+    
+    chunks = []
+    window: List[Tuple[str, int]] = []
+    window_tokens = 0
+    for paragraph, tokens in paragraphs:
+        if window and window_tokens + tokens > max_tokens:
+            chunks.append("\n".join(piece for piece, _ in window))
+            # 从窗口末尾保留重叠段落，且保证加入当前段落后不超预算
+            overlap: List[Tuple[str, int]] = []
+            overlap_size = 0
+            for piece, piece_tokens in reversed(window):
+                if overlap_size + piece_tokens > min(overlap_tokens, max_tokens - tokens):
+                    break
+                overlap.insert(0, (piece, piece_tokens))
+                overlap_size += piece_tokens
+            window, window_tokens = overlap, overlap_size
+        window.append((paragraph, tokens))
+        window_tokens += tokens
+    if window:
+        chunks.append("\n".join(piece for piece, _ in window))
+    return chunks
+
+def name_key(name: Any) -> str:
+    """姓名比较键: 去掉空白并忽略大小写"""
+    return re.sub(r"\s+", "", str(name or "")).casefold()
+
+def _conflicts(existing: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+    for field in IDENTITY_FIELDS:
+        a, b = existing.get(field), candidate.get(field)
+        if a and b and str(a).strip() != str(b).strip():
+            return True
+    return False
+
+def merge_into(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    """把source的属性合并到target: 标量保留已有值，列表取并集，字典补充缺失的键"""
+    for key, value in source.items():
+        if value in (None, "", [], {}):
+            continue
+        current = target.get(key)
+        if current in (None, "", [], {}):
+            target[key] = value
+        elif isinstance(current, list) and isinstance(value, list):
+            seen = {json.dumps(item, ensure_ascii=False, sort_keys=True) for item in current}
+            for item in value:
+                marker = json.dumps(item, ensure_ascii=False, sort_keys=True)
+                if marker not in seen:
+                    seen.add(marker)
+                    current.append(item)
+        elif isinstance(current, dict) and isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                current.setdefault(sub_key, sub_value)
+
+def merge_entities(chunk_entities: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """合并各窗口提取的人物，按姓名去重
+    
+    同名且身份字段(出生日期、邮箱、电话、证件号)不冲突时视为同一人并合并属性，
+    冲突时保留为不同的人。结果按首次出现的顺序返回。
+    """
+    merged: List[Dict[str, Any]] = []
+    by_name: Dict[str, List[Dict[str, Any]]] = {}
+    for entities in chunk_entities:
+        for entity in entities:
+            if not isinstance(entity, dict) or not entity.get("name"):
+                continue
+            candidates = by_name.setdefault(name_key(entity["name"]), [])
+            for existing in candidates:
+                if not _conflicts(existing, entity):
+                    merge_into(existing, entity)
+                    break
+            else:
+                copy = json.loads(json.dumps(entity, ensure_ascii=False))
+                candidates.append(copy)
+                merged.append(copy)
+    return merged
+
+def confidence_of(relationship: Dict[str, Any]) -> float:
+    """关系的置信度; 模型可能返回字符串或无法解析的值，无法解析时按0处理"""
+    try:
+        return float(relationship.get("confidence") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def merge_relationships(chunk_relationships: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """合并各窗口提取的关系，同一对人物只保留置信度最高的一条"""
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for relationships in chunk_relationships:
+        for relationship in relationships:
+            if not isinstance(relationship, dict):
+                continue
+            key = (name_key(relationship.get("source_name")), name_key(relationship.get("target_name")))
+            if not all(key):
+                continue
+            existing = merged.get(key)
+            if existing is None or confidence_of(relationship) > confidence_of(existing):
+                merged[key] = relationship
+    return list(merged.values())
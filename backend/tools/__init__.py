@@ -0,0 +1 @@
+# 运维工具模块初始化文件
@@ -0,0 +1,40 @@
+"""从Cosmos DB中的已有实体重建实体消解索引
+
+运行方式:
+    python -m backend.tools.build_entity_index [--batch-size 1000]
+
+首次启用实体消解或索引文件丢失时运行，之后的导入会与这些实体匹配。只读取打分所需的字段，
+重复运行是幂等的。
+"""
+import argparse
+import asyncio
+import logging
+
+from ..services.async_cosmos_service import AsyncCosmosDBService
+from ..services.entity_resolution import EntityResolutionIndex, EntityResolver
+
+logger = logging.getLogger(__name__)
+
+
+async def build(batch_size: int) -> int:
+    cosmos_service = AsyncCosmosDBService()
+    index = EntityResolutionIndex()
+    try:
+        return await EntityResolver(index, cosmos_service).rebuild(batch_size)
+    finally:
+        index.close()
+        await cosmos_service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建实体消解索引")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写入索引的实体数量")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    count = asyncio.run(build(args.batch_size))
+    logger.info(f"索引重建完成: 实体 {count} 个")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""将实体文档中内嵌的relationships数组迁移为关系容器中的边文档
+
+运行方式:
+    python -m backend.tools.migrate_relationships [--batch-size 500] [--clear-embedded] [--dry-run]
+
+边文档ID由源和目标确定，重复运行是幂等的。--clear-embedded 在边写入成功后清空实体中的内嵌数组。
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, Tuple
+
+from ..models.entity import Relationship, RelationshipEdge
+from ..services.async_cosmos_service import AsyncCosmosDBService
+
+logger = logging.getLogger(__name__)
+
+
+async def flush(cosmos_service: AsyncCosmosDBService, edges: List[RelationshipEdge],
+                sources: List[Tuple[str, str]], clear_embedded: bool) -> None:
+    """写入一批边，并按需清空对应源实体的内嵌关系；有边写入失败时中止，不清空内嵌关系"""
+    results = await cosmos_service.bulk_upsert_relationship_edges(edges)
+    failures = [result for result in results if not result["success"]]
+    if failures:
+        raise RuntimeError(f"{len(failures)} 条关系写入失败，例如 {failures[0]['id']}: {failures[0]['error']}")
+    if clear_embedded:
+        await asyncio.gather(*(
+            cosmos_service.clear_embedded_relationships(entity_id, name)
+            for entity_id, name in sources
+        ))
+
+
+async def migrate(batch_size: int, clear_embedded: bool, dry_run: bool) -> dict:
+    cosmos_service = AsyncCosmosDBService()
+    stats = {"entities": 0, "edges": 0, "invalid": 0}
+    edges: List[RelationshipEdge] = []
+    sources: List[Tuple[str, str]] = []
+
+    try:
+        async for item in cosmos_service.iter_embedded_relationships():
+            stats["entities"] += 1
+            for raw in item.get("relationships") or []:
+                try:
+                    relationship = Relationship(**raw)
+                except Exception as e:
+                    stats["invalid"] += 1
+                    logger.warning(f"跳过实体 {item['id']} 的无效关系: {str(e)}")
+                    continue
+                edges.append(RelationshipEdge.from_relationship(item["id"], relationship, item["name"]))
+            sources.append((item["id"], item["name"]))
+
+            if len(edges) >= batch_size:
+                if not dry_run:
+                    await flush(cosmos_service, edges, sources, clear_embedded)
+                stats["edges"] += len(edges)
+                logger.info(f"已迁移 {stats['entities']} 个实体, {stats['edges']} 条关系")
+                edges, sources = [], []
+
+        if edges or sources:
+            if not dry_run:
+                await flush(cosmos_service, edges, sources, clear_embedded)
+            stats["edges"] += len(edges)
+    finally:
+        await cosmos_service.close()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移内嵌关系到关系容器")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批写入的边数量")
+    parser.add_argument("--clear-embedded", action="store_true", help="迁移后清空实体中的内嵌关系")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    stats = asyncio.run(migrate(args.batch_size, args.clear_embedded, args.dry_run))
+    logger.info(
+        f"迁移完成: 实体 {stats['entities']} 个, 关系 {stats['edges']} 条, 无效关系 {stats['invalid']} 条"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""文件处理工作进程
+
+从任务存储(JOB_STORE_PATH)领取上传任务，按 parse → extract → persist → relate 阶段处理并写入检查点。
+与Web进程分离运行；同一台机器上的多个工作进程共享SQLite任务库和暂存目录，可按需增加进程数。
+工作进程崩溃后，其任务在租约(JOB_LEASE_SECONDS)过期后由其他进程领取并从检查点继续。
+
+运行方式:
+    python -m backend.worker --processes 4 --concurrency 2
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+
+from .config.settings import JOB_WORKER_PROCESSES, JOB_WORKER_CONCURRENCY
+from .services.service_registry import service_registry
+from .services.ingestion_pipeline import JobWorker
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+async def run_worker(concurrency: int):
+    """在当前进程中领取并处理任务，收到SIGTERM/SIGINT后处理完进行中的任务再退出"""
+    worker = JobWorker(service_registry.job_store, service_registry.ingestion_pipeline, concurrency)
+    # 工作进程写入的实体同样推送到搜索索引
+    service_registry.start_search_indexing()
+    service_registry.start_change_feed()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await service_registry.shutdown()
+
+def worker_process(concurrency: int):
+    asyncio.run(run_worker(concurrency))
+
+def main():
+    parser = argparse.ArgumentParser(description="文件处理工作进程")
+    parser.add_argument("--processes", type=int, default=JOB_WORKER_PROCESSES, help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="每个进程同时处理的任务数")
+    args = parser.parse_args()
+    
+    if args.processes <= 1:
+        worker_process(args.concurrency)
+        return
+    
+    def start(index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(target=worker_process, args=(args.concurrency,), name=f"worker-{index}")
+        process.start()
+        return process
+    
+    processes = [start(index) for index in range(args.processes)]
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    # 意外退出的工作进程自动重启，其任务由租约机制交给其他进程或重启后的进程继续
+    while any(process.is_alive() for process in processes) or not stopping:
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                logger.error(f"工作进程 {process.name} 退出(退出码 {process.exitcode})，正在重启")
+                processes[index] = start(index)
+        time.sleep(1)
+    logger.info("所有工作进程已退出")
+
+if __name__ == "__main__":
+    main()